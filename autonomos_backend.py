@@ -4,7 +4,7 @@ Python-based AI Agent System using LangChain, CrewAI, and OpenAI
 
 Setup Instructions:
 1. Install dependencies:
-   pip install fastapi uvicorn langchain langchain-openai crewai pandas python-dotenv resend
+   pip install fastapi uvicorn langchain langchain-openai crewai pandas pyarrow python-dotenv resend
 
 2. Create .env file:
    OPENAI_API_KEY=your_openai_key
@@ -14,30 +14,274 @@ Setup Instructions:
    uvicorn autonomos_backend:app --reload --port 8000
 """
 
-from fastapi import FastAPI, HTTPException
+# Startup import time is measured from here (see IMPORT_TIME_BUDGET_MS)
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Literal, TYPE_CHECKING
 import os
 from datetime import datetime
 import json
+import html
+import re
+import asyncio
+import contextvars
+import hashlib
+import sqlite3
+import threading
+import random
+import uuid
+import logging
+import importlib
+import tempfile
+from collections import OrderedDict
+from types import SimpleNamespace
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+
+# LangChain, CrewAI, Resend and the HTTP clients are heavy to import, so
+# they are loaded on first use (see LAZY IMPORTS below)
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+logger = logging.getLogger("autonomos")
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Maximum number of per-item LLM calls in flight at once for a single request
+ANALYSIS_CONCURRENCY = int(os.getenv("AUTONOMOS_ANALYSIS_CONCURRENCY", "8"))
+
+# Seconds to wait for each LLM reply (time queued for rate limits excluded);
+# a reply that does not arrive in time is not retried and the item is
+# escalated for review
+ANALYSIS_ITEM_TIMEOUT = float(os.getenv("AUTONOMOS_ANALYSIS_ITEM_TIMEOUT", "60"))
+
+# Orders at or under this cost are routine and may be auto-approved
+AUTO_APPROVE_LIMIT = float(os.getenv("AUTONOMOS_AUTO_APPROVE_LIMIT", "500"))
+
+# Fraction of the limit on either side of it where the LLM makes the call
+RULES_AMBIGUITY_BAND = float(os.getenv("AUTONOMOS_RULES_AMBIGUITY_BAND", "0.1"))
+
+# Set to 0 to send every item to the LLM
+RULES_ENABLED = os.getenv("AUTONOMOS_RULES_ENABLED", "1") != "0"
+
+# Model cascade: items the rules cannot settle go to the small model. When a
+# large model is set, a small-model decision is re-checked by it if its
+# confidence is below CASCADE_MIN_CONFIDENCE, or if it auto-approves a hard
+# case (cost over the auto-approve limit, CRITICAL urgency, first order)
+LLM_SMALL_MODEL = os.getenv("AUTONOMOS_LLM_SMALL_MODEL", "gpt-4o-mini")
+LLM_LARGE_MODEL = os.getenv("AUTONOMOS_LLM_LARGE_MODEL") or None
+CASCADE_MIN_CONFIDENCE = float(os.getenv("AUTONOMOS_CASCADE_MIN_CONFIDENCE", "0.7"))
+
+# Sampling temperature of the decision models
+LLM_TEMPERATURE = float(os.getenv("AUTONOMOS_LLM_TEMPERATURE", "0.3"))
+
+# Model behind the three CrewAI agents
+CREW_MODEL = os.getenv("AUTONOMOS_CREW_MODEL", LLM_SMALL_MODEL)
+
+# Approximate input-token budget for one batched multi-item prompt
+BATCH_TOKEN_BUDGET = int(os.getenv("AUTONOMOS_BATCH_TOKEN_BUDGET", "3000"))
+
+# Upper bound on items per batched prompt (keeps the reply size in check)
+BATCH_MAX_ITEMS = int(os.getenv("AUTONOMOS_BATCH_MAX_ITEMS", "20"))
+
+# Input-token budget for the item table in the crew's analysis task; items
+# beyond it are decided by the per-item agent instead
+CREW_TOKEN_BUDGET = int(os.getenv("AUTONOMOS_CREW_TOKEN_BUDGET", "6000"))
+
+# Per-API-key OpenAI quota: requests and tokens per minute (LLM_RPM=0 disables limiting)
+LLM_RPM = float(os.getenv("AUTONOMOS_LLM_RPM", "500"))
+LLM_TPM = float(os.getenv("AUTONOMOS_LLM_TPM", "200000"))
+
+# Times a governed call is retried after backing off: HTTP 429s pause the
+# key; timeouts, connection errors and 408/409/5xx back off exponentially
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("AUTONOMOS_LLM_RATE_LIMIT_RETRIES", "3"))
+
+# Output tokens reserved per item decided by a call
+LLM_REPLY_TOKENS = int(os.getenv("AUTONOMOS_LLM_REPLY_TOKENS", "250"))
+
+# Ask the model for JSON-mode replies (set to 0 for models without it)
+LLM_JSON_MODE = os.getenv("AUTONOMOS_LLM_JSON_MODE", "1") != "0"
+
+# Follow-up requests asking the LLM to fix a reply that failed validation
+LLM_REPAIR_ATTEMPTS = int(os.getenv("AUTONOMOS_LLM_REPAIR_ATTEMPTS", "1"))
+
+# Token counting: "tiktoken" (falls back to an estimate if unavailable) or "estimate"
+TOKENIZER = os.getenv("AUTONOMOS_TOKENIZER", "tiktoken")
+
+# Decision cache backend: "memory", "sqlite" or "none"
+CACHE_BACKEND = os.getenv("AUTONOMOS_CACHE_BACKEND", "memory")
+
+# SQLite file used when CACHE_BACKEND is "sqlite"
+CACHE_PATH = os.getenv("AUTONOMOS_CACHE_PATH", "autonomos_cache.sqlite3")
+
+# Seconds a cached LLM decision stays valid
+CACHE_TTL = float(os.getenv("AUTONOMOS_CACHE_TTL", "3600"))
+
+# Maximum number of cached decisions before least recently used are evicted
+CACHE_MAX_ENTRIES = int(os.getenv("AUTONOMOS_CACHE_MAX_ENTRIES", "10000"))
+
+# Set to 0 to stop concurrent identical requests and item analyses from
+# sharing one in-flight computation
+COALESCING_ENABLED = os.getenv("AUTONOMOS_COALESCING", "1") != "0"
+
+# OpenAI-compatible endpoint to call instead of api.openai.com (e.g. a proxy
+# or the mock server in benchmark.py)
+OPENAI_BASE_URL = os.getenv("AUTONOMOS_OPENAI_BASE_URL") or None
+
+# Maximum number of distinct (API key, model) LLM clients kept warm
+LLM_POOL_MAX_CLIENTS = int(os.getenv("AUTONOMOS_LLM_POOL_MAX_CLIENTS", "64"))
+
+# Connection limits for the HTTP pool shared by all LLM clients
+HTTP_MAX_CONNECTIONS = int(os.getenv("AUTONOMOS_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("AUTONOMOS_HTTP_MAX_KEEPALIVE", "20"))
+
+# Idle crews kept per API key for reuse
+CREW_POOL_SIZE = int(os.getenv("AUTONOMOS_CREW_POOL_SIZE", "2"))
 
-# LangChain imports
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers import PydanticOutputParser
-from langchain.schema import HumanMessage, SystemMessage
+# Set to 1 for CrewAI's step-by-step agent logging
+CREW_VERBOSE = os.getenv("AUTONOMOS_CREW_VERBOSE", "0") == "1"
 
-# CrewAI imports
-from crewai import Agent, Task, Crew, Process
+# Crew analyses run at once in job mode, and seconds before a job is abandoned
+CREW_JOB_WORKERS = int(os.getenv("AUTONOMOS_CREW_JOB_WORKERS", "2"))
+CREW_JOB_TIMEOUT = float(os.getenv("AUTONOMOS_CREW_JOB_TIMEOUT", "900"))
+
+# Outbound email delivery: "resend", or "file" to write to a local outbox
+EMAIL_TRANSPORT = os.getenv("AUTONOMOS_EMAIL_TRANSPORT", "resend")
+
+# NDJSON file the "file" transport appends messages to
+EMAIL_OUTBOX_PATH = os.getenv("AUTONOMOS_EMAIL_OUTBOX_PATH", "autonomos_outbox.ndjson")
+
+# Background workers draining the email queue
+EMAIL_QUEUE_WORKERS = int(os.getenv("AUTONOMOS_EMAIL_QUEUE_WORKERS", "4"))
+
+# Messages submitted to the provider in one batch call (Resend allows 100)
+EMAIL_BATCH_SIZE = int(os.getenv("AUTONOMOS_EMAIL_BATCH_SIZE", "50"))
+
+# Delivery attempts per message and the base of the exponential backoff
+EMAIL_MAX_ATTEMPTS = int(os.getenv("AUTONOMOS_EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_DELAY = float(os.getenv("AUTONOMOS_EMAIL_RETRY_BASE_DELAY", "1.0"))
+
+# Combine auto-approved items for the same vendor into one multi-line PO email
+PO_CONSOLIDATION = os.getenv("AUTONOMOS_PO_CONSOLIDATION", "1") != "0"
+
+# Cover text of a multi-line PO: "template", or "llm" for one LLM call per vendor
+PO_MESSAGE_MODE = os.getenv("AUTONOMOS_PO_MESSAGE", "template")
+
+# Default seconds between scheduled reorder checks of CRITICAL items, and the
+# shortest interval a schedule may ask for
+SCHEDULE_INTERVAL = float(os.getenv("AUTONOMOS_SCHEDULE_INTERVAL", "300"))
+SCHEDULE_MIN_INTERVAL = float(os.getenv("AUTONOMOS_SCHEDULE_MIN_INTERVAL", "10"))
+
+# Interval multipliers for CRITICAL, HIGH, MEDIUM and LOW items (by default
+# LOW items are checked 8 times less often than CRITICAL ones)
+SCHEDULE_TIER_MULTIPLIERS = [
+    float(m) for m in os.getenv("AUTONOMOS_SCHEDULE_TIER_MULTIPLIERS", "1,2,4,8").split(",")
+]
+
+# Up to this fraction of the interval is added at random to each next run so
+# schedules created together do not fire in lockstep
+SCHEDULE_JITTER = float(os.getenv("AUTONOMOS_SCHEDULE_JITTER", "0.1"))
+
+# Scheduled checks running at once across all tenants
+SCHEDULE_MAX_CONCURRENT = int(os.getenv("AUTONOMOS_SCHEDULE_MAX_CONCURRENT", "4"))
+
+# Inventories at least this large are triaged with vectorized NumPy/pandas
+TRIAGE_VECTORIZE_MIN = int(os.getenv("AUTONOMOS_TRIAGE_VECTORIZE_MIN", "500"))
+
+# Directory uploaded inventory files are spooled to (system temp dir if unset)
+INGEST_SPOOL_DIR = os.getenv("AUTONOMOS_INGEST_SPOOL_DIR") or None
+
+# Largest accepted inventory upload, in bytes
+INGEST_MAX_BYTES = int(os.getenv("AUTONOMOS_INGEST_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Inventory snapshots kept in memory before the least recently used is dropped
+SNAPSHOT_MAX_COUNT = int(os.getenv("AUTONOMOS_SNAPSHOT_MAX_COUNT", "16"))
+
+# SQLite file recording decisions, purchase orders and email status ("" disables it)
+LEDGER_PATH = os.getenv("AUTONOMOS_LEDGER_PATH", "autonomos_ledger.sqlite3")
+
+# Largest page the decision and order list endpoints return
+LEDGER_PAGE_MAX = int(os.getenv("AUTONOMOS_LEDGER_PAGE_MAX", "500"))
+
+# Set to 0 to turn off stage timings, counters and the /metrics endpoint
+METRICS_ENABLED = os.getenv("AUTONOMOS_METRICS", "1") != "0"
+
+# Set to 1 to log one structured JSON trace line per request ("autonomos.trace" logger)
+TRACE_LOG = os.getenv("AUTONOMOS_TRACE_LOG", "0") == "1"
+
+# Set to 1 to import the heavy SDKs in the background right after startup
+WARMUP_ON_STARTUP = os.getenv("AUTONOMOS_WARMUP", "0") == "1"
+
+# Module import time above which a warning is logged at startup
+IMPORT_TIME_BUDGET_MS = float(os.getenv("AUTONOMOS_IMPORT_TIME_BUDGET_MS", "1000"))
+
+# Worker threads for blocking agent work (CrewAI kickoff)
+AGENT_WORKERS = int(os.getenv("AUTONOMOS_AGENT_WORKERS", "4"))
+
+# Worker threads for blocking email delivery (Resend SDK)
+EMAIL_WORKERS = int(os.getenv("AUTONOMOS_EMAIL_WORKERS", "8"))
+
+# Worker threads for procurement ledger (SQLite) queries; the ledger runs one at a time
+LEDGER_WORKERS = int(os.getenv("AUTONOMOS_LEDGER_WORKERS", "1"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background services around the server's lifetime"""
+    if WARMUP_ON_STARTUP:
+        asyncio.create_task(blocking_executor.run("agent", warm_up))
+    yield
+    await reorder_scheduler.stop()
+    await crew_jobs.stop()
+    await email_queue.stop()
+    blocking_executor.shutdown()
+    await llm_client_pool.aclose()
+
+
+# HTTP request whose LLM calls are being made; calls are queued fairly per flow
+current_flow: contextvars.ContextVar = contextvars.ContextVar("autonomos_flow", default="default")
+
+
+class RequestFlowMiddleware:
+    """Tag each HTTP request with a flow id (for fair LLM queuing) and trace it"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        flow = uuid.uuid4().hex
+        current_flow.set(flow)
+        if not metrics.enabled:
+            return await self.app(scope, receive, send)
+        
+        trace = start_trace(flow, method=scope["method"], path=scope["path"])
+        status = {"code": 500}
+        
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.inc("autonomos_http_requests_total", path=route, status=str(status["code"]))
+            finish_trace(trace, route=route, status=status["code"])
 
-# Resend for email
-try:
-    import resend
-except ImportError:
-    resend = None
 
-app = FastAPI(title="AUTONOMOS API")
+app = FastAPI(title="AUTONOMOS API", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -47,6 +291,295 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestFlowMiddleware)
+
+# ============================================================================
+# LAZY IMPORTS
+# ============================================================================
+
+# Milliseconds each lazily imported SDK took to load, by name
+lazy_import_timings: Dict[str, float] = {}
+
+
+def _timed_import(name: str, loader):
+    started = time.perf_counter()
+    result = loader()
+    lazy_import_timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def langchain_sdk() -> SimpleNamespace:
+    """LangChain chat model and message classes, imported on first use"""
+    
+    def load():
+        from langchain_openai import ChatOpenAI
+        from langchain.schema import AIMessage, HumanMessage, SystemMessage
+        return SimpleNamespace(
+            ChatOpenAI=ChatOpenAI,
+            AIMessage=AIMessage,
+            HumanMessage=HumanMessage,
+            SystemMessage=SystemMessage
+        )
+    
+    return _timed_import("langchain", load)
+
+
+@functools.lru_cache(maxsize=None)
+def crewai_sdk():
+    """The crewai package, imported on first use"""
+    return _timed_import("crewai", lambda: importlib.import_module("crewai"))
+
+
+@functools.lru_cache(maxsize=None)
+def resend_sdk():
+    """The Resend SDK (or None when it is not installed), imported on first use"""
+    
+    def load():
+        try:
+            import resend
+        except ImportError:
+            return None
+        use_pooled_resend_connections(resend)
+        return resend
+    
+    return _timed_import("resend", load)
+
+
+@functools.lru_cache(maxsize=None)
+def pandas_sdk() -> SimpleNamespace:
+    """NumPy and pandas, imported on first use"""
+    
+    def load():
+        import numpy
+        import pandas
+        return SimpleNamespace(np=numpy, pd=pandas)
+    
+    return _timed_import("pandas", load)
+
+
+@functools.lru_cache(maxsize=None)
+def tiktoken_encoding(model: str):
+    """tiktoken encoding for a model, or None when tiktoken is unavailable"""
+    
+    def load():
+        try:
+            import tiktoken
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                return tiktoken.get_encoding("o200k_base")
+        except Exception as e:  # not installed, or its BPE file cannot be fetched
+            logger.info("Counting tokens by estimate: %s", e)
+            return None
+    
+    return _timed_import("tiktoken", load)
+
+
+def warm_up():
+    """Import the heavy SDKs ahead of the first request that needs them"""
+    for name, loader in (("langchain", langchain_sdk), ("crewai", crewai_sdk), ("resend", resend_sdk)):
+        try:
+            loader()
+        except ImportError as e:
+            logger.warning("Warm-up could not import %s: %s", name, e)
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+# Per-request trace (a dict) that stage timings, tokens and errors are added to
+current_trace: contextvars.ContextVar = contextvars.ContextVar("autonomos_trace", default=None)
+
+trace_logger = logging.getLogger("autonomos.trace")
+
+
+class MetricsRegistry:
+    """In-process counters and latency histograms rendered as Prometheus text.
+    
+    Everything is keyed by (metric name, sorted label pairs). Stage timings
+    also accumulate on the current request's trace, which the middleware
+    logs as one JSON line when trace logging is on. When disabled, every
+    method returns immediately and ``instrumented`` leaves functions
+    unwrapped, so the hot path pays nothing.
+    """
+    
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+    
+    HELP = {
+        "autonomos_stage_seconds": ("histogram", "Time spent in each processing stage"),
+        "autonomos_errors_total": ("counter", "Errors raised in each stage, by exception type"),
+        "autonomos_llm_tokens_total": ("counter", "LLM tokens reported by the provider"),
+        "autonomos_cascade_seconds": ("histogram", "Time each decision-cascade tier took per lookup or call"),
+        "autonomos_decisions_total": ("counter", "Decisions returned, by outcome and source"),
+        "autonomos_purchase_orders_total": ("counter", "Vendor PO emails queued, the item lines they carry, and lines received on restock"),
+        "autonomos_http_requests_total": ("counter", "HTTP requests handled, by path template and status")
+    }
+    
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._counters: Dict[tuple, float] = {}
+        self._histograms: Dict[tuple, List] = {}
+        self._collectors: List = []
+        self._lock = threading.Lock()
+    
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+    
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.BUCKETS), 0.0, 0]
+            for i, bound in enumerate(self.BUCKETS):
+                if value <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+    
+    def error(self, stage: str, error: BaseException):
+        if not self.enabled:
+            return
+        kind = type(error).__name__
+        self.inc("autonomos_errors_total", stage=stage, type=kind)
+        trace = current_trace.get()
+        if trace is not None:
+            trace["errors"].append({"stage": stage, "type": kind})
+    
+    @contextmanager
+    def _timed(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error(stage, e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe("autonomos_stage_seconds", elapsed, stage=stage)
+            trace = current_trace.get()
+            if trace is not None:
+                totals = trace["stages"].setdefault(stage, {"count": 0, "ms": 0.0})
+                totals["count"] += 1
+                totals["ms"] += elapsed * 1000
+    
+    def stage(self, stage: str):
+        """Context manager timing a block as one occurrence of stage"""
+        return self._timed(stage) if self.enabled else nullcontext()
+    
+    def record_tokens(self, response, model: str):
+        """Count the input/output tokens in a LangChain response's usage metadata"""
+        if not self.enabled:
+            return
+        usage = getattr(response, "usage_metadata", None) or {}
+        trace = current_trace.get()
+        for kind in ("input", "output"):
+            tokens = usage.get(f"{kind}_tokens")
+            if tokens:
+                self.inc("autonomos_llm_tokens_total", tokens, model=model, kind=kind)
+                if trace is not None:
+                    trace["tokens"][kind] = trace["tokens"].get(kind, 0) + tokens
+    
+    def register_collector(self, collect):
+        """Add a callable returning (name, type, help, value) gauges read at scrape time"""
+        self._collectors.append(collect)
+    
+    @staticmethod
+    def _labels(pairs, extra: tuple = ()) -> str:
+        pairs = tuple(pairs) + extra
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._histograms.items())
+        
+        lines, described = [], set()
+        
+        def describe(name: str, kind: str, text: str):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+        
+        for (name, labels), value in counters:
+            describe(name, *self.HELP.get(name, ("counter", name)))
+            lines.append(f"{name}{self._labels(labels)} {value:g}")
+        for (name, labels), (buckets, total, count) in histograms:
+            describe(name, *self.HELP.get(name, ("histogram", name)))
+            cumulative = 0
+            for bound, hits in zip(self.BUCKETS, buckets):
+                cumulative += hits
+                lines.append(f"{name}_bucket{self._labels(labels, (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{name}_bucket{self._labels(labels, (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{self._labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{self._labels(labels)} {count}")
+        for collect in self._collectors:
+            for name, kind, text, value in collect():
+                describe(name, kind, text)
+                lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry(METRICS_ENABLED)
+
+
+def instrumented(stage: str):
+    """Time every call of the decorated (sync or async) function as a stage"""
+    
+    def decorate(func):
+        if not metrics.enabled:
+            return func
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with metrics.stage(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    
+    return decorate
+
+
+def start_trace(trace_id: str, **fields) -> Optional[Dict]:
+    """Begin collecting a trace for the current request or job"""
+    if not (metrics.enabled and TRACE_LOG):
+        current_trace.set(None)
+        return None
+    trace = {"trace": trace_id, **fields, "stages": {}, "tokens": {}, "errors": [], "_started": time.perf_counter()}
+    current_trace.set(trace)
+    return trace
+
+
+def finish_trace(trace: Optional[Dict], **fields):
+    """Log a finished trace as one structured JSON line"""
+    if trace is None:
+        return
+    trace.update(fields)
+    trace["durationMs"] = round((time.perf_counter() - trace.pop("_started")) * 1000, 1)
+    for totals in trace["stages"].values():
+        totals["ms"] = round(totals["ms"], 1)
+    trace_logger.info(json.dumps(trace))
+
 
 # ============================================================================
 # DATA MODELS
@@ -71,311 +604,3542 @@ class AgentDecision(BaseModel):
     cost: float
     urgency: str  # LOW, MEDIUM, HIGH, CRITICAL
 
+class LLMDecision(BaseModel):
+    """The part of an AgentDecision the LLM supplies; its replies are validated against this"""
+    decision: Literal["AUTO_APPROVE", "ESCALATE"]
+    reasoning: str
+    vendorEmail: str
+    confidence: Optional[float] = None  # 0-1, drives escalation in the model cascade
+
+class BatchLLMDecision(LLMDecision):
+    ref: int
+
+class InventoryDelta(BaseModel):
+    id: int
+    name: Optional[str] = None
+    stock: Optional[int] = None
+    reorderPoint: Optional[int] = None
+    price: Optional[float] = None
+    vendor: Optional[str] = None
+    vendorEmail: Optional[str] = None
+    lastOrder: Optional[str] = None
+    salesPerDay: Optional[float] = None
+    remove: bool = False  # drop the item from the snapshot
+
+class DeltaRequest(BaseModel):
+    updates: List[InventoryDelta]
+    openai_api_key: str
+    resend_api_key: Optional[str] = None
+    user_email: Optional[str] = None
+    batch: bool = False
+
+class ScheduleRequest(BaseModel):
+    snapshot_id: str
+    openai_api_key: str
+    resend_api_key: Optional[str] = None
+    user_email: Optional[str] = None
+    batch: bool = False
+    interval: Optional[float] = None  # seconds between CRITICAL checks (SCHEDULE_INTERVAL if unset)
+
+class CrewItemDecision(AgentDecision):
+    id: int  # InventoryItem.id the decision applies to
+
+class CrewAssessment(BaseModel):
+    summary: str
+    decisions: List[CrewItemDecision]
+
 class AnalysisRequest(BaseModel):
-    inventory: List[InventoryItem]
+    inventory: List[InventoryItem] = []
+    snapshot_id: Optional[str] = None  # analyze an ingested snapshot instead
     openai_api_key: str
     resend_api_key: Optional[str] = None
     user_email: Optional[str] = None
+    batch: bool = False  # pack several items into each LLM request
+
+# ============================================================================
+# DECISION CACHE
+# ============================================================================
+
+class InMemoryCacheBackend:
+    """LRU-ordered in-process store for cached decisions"""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+    
+    def set(self, key: str, value: Dict, stored_at: float) -> int:
+        """Store an entry and return how many entries were evicted"""
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+    
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """On-disk store for cached decisions that survives restarts"""
+    
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS decision_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            stored_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_decision_cache_accessed ON decision_cache (accessed_at)"
+        )
+        self._conn.commit()
+    
+    def get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stored_at, value FROM decision_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE decision_cache SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return row[0], json.loads(row[1])
+    
+    def set(self, key: str, value: Dict, stored_at: float) -> int:
+        """Store an entry and return how many entries were evicted"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO decision_cache (key, value, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), stored_at, stored_at)
+            )
+            evicted = self._conn.execute(
+                "DELETE FROM decision_cache WHERE key IN ("
+                "SELECT key FROM decision_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            self._conn.commit()
+            return evicted
+    
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM decision_cache WHERE key = ?", (key,))
+            self._conn.commit()
+    
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM decision_cache")
+            self._conn.commit()
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM decision_cache").fetchone()[0]
+
+
+class DecisionCache:
+    """TTL cache of LLM decisions keyed on the prompt-relevant item state"""
+    
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def make_key(fields: Dict) -> str:
+        """Hash a canonical JSON encoding of the given fields"""
+        canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self.backend.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            if time.time() - stored_at <= self.ttl:
+                self.hits += 1
+                return value
+            self.backend.delete(key)
+            self.expirations += 1
+        self.misses += 1
+        return None
+    
+    def set(self, key: str, value: Dict):
+        self.evictions += self.backend.set(key, value, time.time())
+    
+    def clear(self):
+        self.backend.clear()
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "size": len(self.backend),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "hitRate": self.hits / lookups if lookups else 0.0
+        }
+
+
+def create_decision_cache(backend: str) -> Optional[DecisionCache]:
+    """Build the decision cache selected by AUTONOMOS_CACHE_BACKEND"""
+    if backend == "memory":
+        return DecisionCache(InMemoryCacheBackend(CACHE_MAX_ENTRIES), CACHE_TTL)
+    if backend == "sqlite":
+        return DecisionCache(SQLiteCacheBackend(CACHE_PATH, CACHE_MAX_ENTRIES), CACHE_TTL)
+    return None
+
+
+decision_cache = create_decision_cache(CACHE_BACKEND)
+
+
+# ============================================================================
+# REQUEST COALESCING
+# ============================================================================
+
+class SingleFlight:
+    """Let concurrent callers with the same key share one in-flight computation.
+    
+    The first caller (the leader) starts the work as its own task; callers
+    arriving while it runs await the same task. A caller that is cancelled
+    stops waiting without cancelling the work for the others; the work is
+    cancelled only once every caller has gone. Errors reach every caller.
+    Keys are forgotten as soon as the work finishes, so nothing is cached.
+    """
+    
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._calls: Dict[str, Dict] = {}
+        self.leaders = 0
+        self.followers = 0
+    
+    async def do(self, key: str, work) -> tuple:
+        """Run work() once per key at a time; returns (result, shared with a leader)"""
+        
+        if not self.enabled:
+            return await work(), False
+        
+        call = self._calls.get(key)
+        shared = call is not None
+        if shared:
+            self.followers += 1
+        else:
+            call = self._calls[key] = {"task": asyncio.ensure_future(work()), "waiters": 0}
+            call["task"].add_done_callback(lambda _: self._forget(key, call))
+            self.leaders += 1
+        
+        call["waiters"] += 1
+        try:
+            return await asyncio.shield(call["task"]), shared
+        finally:
+            call["waiters"] -= 1
+            if call["waiters"] == 0 and not call["task"].done():
+                self._forget(key, call)  # late arrivals must not join cancelled work
+                call["task"].cancel()
+    
+    def _forget(self, key: str, call: Dict):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+    
+    def stats(self) -> Dict:
+        return {"inFlight": len(self._calls), "leaders": self.leaders, "coalesced": self.followers}
+
+
+# Whole analysis requests, and item analyses keyed by API key and decision cache key
+inflight_requests = SingleFlight(COALESCING_ENABLED)
+inflight_items = SingleFlight(COALESCING_ENABLED)
+
 
 # ============================================================================
 # AI AGENT SYSTEM - Using LangChain & CrewAI
 # ============================================================================
 
-class InventoryAnalysisAgent:
-    """LangChain-based agent for inventory analysis"""
+def get_low_stock_items(items: List[InventoryItem]) -> List[InventoryItem]:
+    """Return the items that have fallen to or below their reorder point"""
+    return [item for item in items if item.stock <= item.reorderPoint]
+
+
+def strip_code_fences(content: str) -> str:
+    """Remove a Markdown code fence (```json ... ```) around an LLM reply"""
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.strip("`").strip()
+        if content.startswith("json"):
+            content = content[4:].strip()
+    return content
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English/JSON)"""
+    return len(text) // 4 + 1
+
+
+class DecisionRules:
+    """Deterministic fast path for items the decision thresholds already settle.
     
-    def __init__(self, api_key: str):
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.3,
-            openai_api_key=api_key
+    Mirrors the rules in the agent's system prompt. ``decide`` returns the
+    decision locally when they are unambiguous, or None when the item is
+    close to the cost limit or otherwise unusual and the LLM should decide.
+    """
+    
+    VENDOR_EMAIL_TEMPLATE = (
+        "Dear {vendor} team,\n\n"
+        "Please accept this purchase order for {quantity} units of {item} "
+        "at ${price:.2f} per unit (estimated total ${cost:.2f}). Our current stock "
+        "of {stock} units covers about {days:.1f} days of sales, so we would "
+        "appreciate delivery at your earliest convenience.\n\n"
+        "Please confirm availability and the expected delivery date.\n\n"
+        "Thank you."
+    )
+    
+    def __init__(self, auto_approve_limit: float = 500, ambiguity_band: float = 0.1,
+                 defer_urgencies: tuple = ("CRITICAL",)):
+        self.auto_approve_limit = auto_approve_limit
+        self.ambiguity_band = ambiguity_band
+        self.defer_urgencies = defer_urgencies
+    
+    def vendor_email(self, item: InventoryItem, metrics: Dict) -> str:
+        return self.VENDOR_EMAIL_TEMPLATE.format(
+            vendor=item.vendor,
+            quantity=metrics["recommended_quantity"],
+            item=item.name,
+            price=item.price,
+            cost=metrics["total_cost"],
+            stock=item.stock,
+            days=metrics["days_until_stockout"]
         )
     
-    def analyze_item(self, item: InventoryItem) -> Dict:
-        """Analyze a single inventory item and make decision"""
+    def decide(self, item: InventoryItem, metrics: Dict) -> Optional[Dict]:
+        """Return the decision data for a rule-decidable item, else None"""
         
-        days_until_stockout = item.stock / item.salesPerDay if item.salesPerDay > 0 else 999
-        recommended_quantity = int(item.salesPerDay * 30)  # 30-day supply
-        total_cost = recommended_quantity * item.price
+        cost = metrics["total_cost"]
+        limit = self.auto_approve_limit
         
-        # Determine urgency
-        if days_until_stockout <= 2:
-            urgency = "CRITICAL"
-        elif days_until_stockout <= 5:
-            urgency = "HIGH"
-        elif days_until_stockout <= 10:
-            urgency = "MEDIUM"
+        # No sales history or nothing to order is unusual; let the LLM look
+        if item.salesPerDay <= 0 or metrics["recommended_quantity"] <= 0:
+            return None
+        
+        if not item.lastOrder.strip():
+            decision = "ESCALATE"
+            reasoning = ("No previous order is on record for this item. "
+                         "First-time orders need manual approval.")
+        elif cost > limit * (1 + self.ambiguity_band):
+            decision = "ESCALATE"
+            reasoning = (f"Order cost of ${cost:.2f} exceeds the ${limit:.0f} "
+                         "auto-approval limit and needs manual approval.")
+        elif cost < limit * (1 - self.ambiguity_band) and metrics["urgency"] not in self.defer_urgencies:
+            decision = "AUTO_APPROVE"
+            reasoning = (f"Routine reorder of {metrics['recommended_quantity']} units "
+                         f"costing ${cost:.2f}, under the ${limit:.0f} auto-approval limit. "
+                         f"Current stock covers {metrics['days_until_stockout']:.1f} days "
+                         f"at {item.salesPerDay} units/day.")
         else:
-            urgency = "LOW"
+            return None
         
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content="""You are AUTONOMOS, an AI operations manager for MSMEs. 
+        return {
+            "decision": decision,
+            "reasoning": reasoning,
+            "vendorEmail": self.vendor_email(item, metrics)
+        }
+
+
+decision_rules = DecisionRules(AUTO_APPROVE_LIMIT, RULES_AMBIGUITY_BAND) if RULES_ENABLED else None
+
+
+class PromptCompiler:
+    """Builds compact, token-budgeted prompts around a fixed system prefix.
+    
+    System messages are built once and sent verbatim on every call so that
+    provider-side prompt caching can match the prefix. Items are sent as
+    rows of a "|"-separated table under one header, not as labelled prose
+    or indented JSON. Tokens are counted with tiktoken when it is available
+    and estimated from the text length otherwise.
+    """
+    
+    # AUTO_APPROVE_LIMIT as written in prompts, e.g. "$500"
+    APPROVAL_LIMIT = f"${AUTO_APPROVE_LIMIT:,.2f}".rstrip("0").rstrip(".")
+    
+    DECISION_RULES = f"""You are AUTONOMOS, an AI operations manager for MSMEs. 
 Your role is to make intelligent inventory decisions.
 
-Decision Rules:
-- AUTO_APPROVE: Routine reorders under $500, normal sales patterns
-- ESCALATE: High cost (>$500), unusual situations, first-time orders
+Decision Rules:
+- AUTO_APPROVE: Routine reorders under {APPROVAL_LIMIT}, normal sales patterns
+- ESCALATE: High cost (>{APPROVAL_LIMIT}), unusual situations, first-time orders
+
+Items are given as a table: a header row, then one row per item with fields
+separated by "|". An empty lastOrder means the item was never ordered before.
+"""
+    
+    SYSTEM_PROMPT = DECISION_RULES + """
+Respond ONLY with valid JSON in this format:
+{
+  "decision": "AUTO_APPROVE" or "ESCALATE",
+  "reasoning": "brief 2-3 sentence explanation",
+  "vendorEmail": "professional email body for purchase order",
+  "confidence": number from 0 to 1, how sure you are of the decision
+}"""
+    
+    BATCH_SYSTEM_PROMPT = DECISION_RULES + """
+Decide on every item independently.
+
+Respond ONLY with a valid JSON object holding one decision per item:
+{
+  "decisions": [
+    {
+      "ref": the item's ref number,
+      "decision": "AUTO_APPROVE" or "ESCALATE",
+      "reasoning": "brief 2-3 sentence explanation",
+      "vendorEmail": "professional email body for purchase order",
+      "confidence": number from 0 to 1, how sure you are of the decision
+    }
+  ]
+}"""
+    
+    PO_SYSTEM_PROMPT = """You are AUTONOMOS, an AI operations manager for MSMEs.
+Write the cover message of a purchase order to one supplier. The order lines
+are given as a table: a header row, then one row per line with fields
+separated by "|". The lines are listed in the email itself, so do not repeat
+them; mention the most urgent items and ask for a delivery date.
+
+Respond ONLY with valid JSON in this format:
+{
+  "message": "professional email body of 3-5 sentences"
+}"""
+    
+    PO_HEADER = "item|quantity|cost|urgency"
+    
+    ITEM_HEADER = ("ref|item|stock|reorderPoint|salesPerDay|daysUntilStockout|"
+                   "orderQty|totalCost|vendor|lastOrder|urgency")
+    
+    # Tokens for the wording and message framing around the item table
+    FRAME_TOKENS = 20
+    
+    # Changes whenever the instructions or the item layout change
+    VERSION = hashlib.sha256((SYSTEM_PROMPT + ITEM_HEADER).encode("utf-8")).hexdigest()[:12]
+    
+    def __init__(self, model: str, tokenizer: str = "tiktoken"):
+        self.model = model
+        self.tokenizer = tokenizer
+        self._system_messages: Dict[str, object] = {}
+        self._system_tokens: Dict[str, int] = {}
+        self.prompts = 0
+        self.prompt_tokens = 0
+    
+    def encoding(self):
+        return tiktoken_encoding(self.model) if self.tokenizer == "tiktoken" else None
+    
+    def count(self, text: str) -> int:
+        """Tokens in text for the configured model"""
+        encoding = self.encoding()
+        if encoding is None:
+            return estimate_tokens(text)
+        return len(encoding.encode(text))
+    
+    @staticmethod
+    def _cell(value) -> str:
+        if isinstance(value, float):
+            return f"{value:.2f}".rstrip("0").rstrip(".")
+        return " ".join(str(value).replace("|", "/").split())
+    
+    def item_row(self, ref: int, item: InventoryItem, metrics: Dict) -> str:
+        """One table row with the item's facts and computed metrics"""
+        return "|".join(self._cell(value) for value in (
+            ref, item.name, item.stock, item.reorderPoint, float(item.salesPerDay),
+            round(metrics["days_until_stockout"], 1), metrics["recommended_quantity"],
+            float(metrics["total_cost"]), item.vendor, item.lastOrder, metrics["urgency"]
+        ))
+    
+    def table(self, rows: List[str]) -> str:
+        return "\n".join([self.ITEM_HEADER, *rows])
+    
+    def _messages(self, system_prompt: str, human: str) -> List:
+        lc = langchain_sdk()
+        system = self._system_messages.get(system_prompt)
+        if system is None:
+            system = self._system_messages[system_prompt] = lc.SystemMessage(content=system_prompt)
+            self._system_tokens[system_prompt] = self.count(system_prompt)
+        self.prompts += 1
+        self.prompt_tokens += self._system_tokens[system_prompt] + self.count(human)
+        return [system, lc.HumanMessage(content=human)]
+    
+    def item_messages(self, row: str) -> List:
+        """Chat messages asking for a decision on one item"""
+        return self._messages(
+            self.SYSTEM_PROMPT,
+            f"Analyze this inventory situation:\n{self.table([row])}\nMake your decision now."
+        )
+    
+    def batch_messages(self, rows: List[str]) -> List:
+        """Chat messages asking for a decision on each of several items"""
+        return self._messages(
+            self.BATCH_SYSTEM_PROMPT,
+            f"Analyze these inventory situations:\n{self.table(rows)}\nMake your decisions now."
+        )
+    
+    def po_messages(self, vendor: str, lines: List[Dict]) -> List:
+        """Chat messages asking for the cover text of a vendor's multi-line PO"""
+        rows = ["|".join(self._cell(line[field]) for field in ("item", "quantity", "cost", "urgency"))
+                for line in lines]
+        return self._messages(
+            self.PO_SYSTEM_PROMPT,
+            f"Supplier: {self._cell(vendor)}\n" + "\n".join([self.PO_HEADER, *rows]) + "\nWrite the message now."
+        )
+    
+    def chunk(self, entries: List[tuple], budget: int, max_items: int,
+              system_prompt: str = "") -> List[List[tuple]]:
+        """Split entries (whose last element is a table row) into prompt-sized chunks.
+        
+        Each chunk's system prompt, header and rows fit within budget tokens
+        and hold at most max_items rows. A row too large on its own still
+        gets a chunk to itself.
+        """
+        
+        base = self.count(system_prompt) + self.count(self.ITEM_HEADER) + self.FRAME_TOKENS
+        chunks, chunk, used = [], [], base
+        for entry in entries:
+            cost = self.count(entry[-1]) + 1
+            if chunk and (used + cost > budget or len(chunk) >= max_items):
+                chunks.append(chunk)
+                chunk, used = [], base
+            chunk.append(entry)
+            used += cost
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+    
+    def stats(self) -> Dict:
+        return {
+            "version": self.VERSION,
+            "tokenizer": "tiktoken" if self.encoding() is not None else "estimate",
+            "prompts": self.prompts,
+            "promptTokens": self.prompt_tokens,
+            "averagePromptTokens": self.prompt_tokens / self.prompts if self.prompts else 0.0
+        }
+
+
+prompt_compiler = PromptCompiler(LLM_SMALL_MODEL, TOKENIZER)
+
+
+class CascadeStats:
+    """How often each cascade tier decides, and how long its lookups or calls take.
+    
+    Decisions are counted by decidedBy (rules, cache, llm for the small
+    model, llm_large, plus crew, error and timeout), so shares add up to
+    all decisions made. Latency is tracked for the rules, cache, small and
+    large tiers.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.decisions: Dict[str, int] = {}
+        self.latency: Dict[str, List[float]] = {}  # tier -> [count, total seconds, max seconds]
+        self.escalations: Dict[str, int] = {}
+    
+    def decided(self, decided_by: str):
+        with self._lock:
+            self.decisions[decided_by] = self.decisions.get(decided_by, 0) + 1
+    
+    def escalated(self, reason: str):
+        with self._lock:
+            self.escalations[reason] = self.escalations.get(reason, 0) + 1
+    
+    @contextmanager
+    def timer(self, tier: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.observe("autonomos_cascade_seconds", elapsed, tier=tier)
+            with self._lock:
+                totals = self.latency.setdefault(tier, [0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += elapsed
+                totals[2] = max(totals[2], elapsed)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            total = sum(self.decisions.values())
+            return {
+                "models": {"small": LLM_SMALL_MODEL, "large": LLM_LARGE_MODEL, "crew": CREW_MODEL},
+                "minConfidence": CASCADE_MIN_CONFIDENCE,
+                "decisions": total,
+                "share": {tier: count / total for tier, count in self.decisions.items()},
+                "decisionsByTier": dict(self.decisions),
+                "latency": {
+                    tier: {"calls": count, "meanMs": round(seconds / count * 1000, 2), "maxMs": round(longest * 1000, 2)}
+                    for tier, (count, seconds, longest) in self.latency.items()
+                },
+                "escalations": dict(self.escalations)
+            }
+
+
+cascade_stats = CascadeStats()
+
+
+class InventoryAnalysisAgent:
+    """LangChain-based agent for inventory analysis.
+    
+    Items go through a cascade of deciders, cheapest first: the rules, the
+    decision cache, the small model and, for the cases review_reason picks
+    out, the large model.
+    """
+    
+    # Cached decisions are invalidated whenever the prompts change
+    PROMPT_VERSION = PromptCompiler.VERSION
+    
+    def __init__(self, api_key: str, rules: Optional[DecisionRules] = decision_rules,
+                 cache: Optional[DecisionCache] = decision_cache,
+                 prompts: Optional[PromptCompiler] = None,
+                 model: str = LLM_SMALL_MODEL, large_model: Optional[str] = LLM_LARGE_MODEL):
+        self.model = model
+        self.large_model = large_model
+        self.api_key = api_key
+        self.prompts = prompts or prompt_compiler
+        self.llm = llm_client_pool.get(api_key, model, temperature=LLM_TEMPERATURE, json_mode=LLM_JSON_MODE)
+        self.large_llm = llm_client_pool.get(
+            api_key, large_model, temperature=LLM_TEMPERATURE, json_mode=LLM_JSON_MODE
+        ) if large_model else None
+        self.rules = rules
+        self.cache = cache
+    
+    @staticmethod
+    def compute_metrics(item: InventoryItem) -> Dict:
+        """Compute stockout horizon, order size, cost and urgency for an item"""
+        
+        days_until_stockout = item.stock / item.salesPerDay if item.salesPerDay > 0 else 999
+        recommended_quantity = int(item.salesPerDay * 30)  # 30-day supply
+        total_cost = recommended_quantity * item.price
+        
+        # Determine urgency
+        if days_until_stockout <= 2:
+            urgency = "CRITICAL"
+        elif days_until_stockout <= 5:
+            urgency = "HIGH"
+        elif days_until_stockout <= 10:
+            urgency = "MEDIUM"
+        else:
+            urgency = "LOW"
+        
+        return {
+            "days_until_stockout": days_until_stockout,
+            "recommended_quantity": recommended_quantity,
+            "total_cost": total_cost,
+            "urgency": urgency
+        }
+    
+    @instrumented("prompt_build")
+    def build_messages(self, item: InventoryItem, metrics: Dict) -> List:
+        """Build the chat messages asking the LLM to decide on one item"""
+        return self.prompts.item_messages(self.prompts.item_row(0, item, metrics))
+    
+    def reserved_tokens(self, messages: List, replies: int = 1) -> int:
+        """Prompt tokens plus room for the replies, reserved against the TPM limit"""
+        return sum(self.prompts.count(message.content) for message in messages) + replies * LLM_REPLY_TOKENS
+    
+    async def ainvoke(self, messages: List, replies: int = 1, timeout: Optional[float] = None,
+                      large: bool = False):
+        """Call the small (or large) LLM within the API key's rate limits.
+        
+        timeout applies to the provider call only, not to waiting for budget.
+        """
+        llm, model = (self.large_llm, self.large_model) if large else (self.llm, self.model)
+        response = await llm_governor.call(
+            self.api_key, self.reserved_tokens(messages, replies), lambda: llm.ainvoke(messages), timeout
+        )
+        metrics.record_tokens(response, model)
+        return response
+    
+    @instrumented("prompt_build")
+    def build_batch_messages(self, rows: List[str]) -> List:
+        """Build the chat messages asking the LLM to decide on several items"""
+        return self.prompts.batch_messages(rows)
+    
+    def plan_batches(self, pending: List[tuple], token_budget: Optional[int] = None) -> List[List[tuple]]:
+        """Split (ref, item, metrics) entries into chunks that fit the token budget"""
+        
+        entries = [(ref, item, metrics, self.prompts.item_row(ref, item, metrics))
+                   for ref, item, metrics in pending]
+        return self.prompts.chunk(entries, token_budget or BATCH_TOKEN_BUDGET, BATCH_MAX_ITEMS,
+                                  self.prompts.BATCH_SYSTEM_PROMPT)
+    
+    @instrumented("parse")
+    def parse_batch_response(self, response) -> Dict[int, Dict]:
+        """Parse a batched reply into decision data keyed by ref.
+        
+        Entries that are missing, malformed or carry an unknown decision are
+        left out so the caller can retry those items one at a time.
+        """
+        
+        entries = json.loads(strip_code_fences(response.content))
+        if isinstance(entries, dict):
+            entries = entries.get("decisions", [])
+        
+        parsed = {}
+        for entry in entries if isinstance(entries, list) else []:
+            try:
+                decision_data = BatchLLMDecision(**entry).dict()
+            except (TypeError, ValueError):
+                continue
+            parsed[decision_data.pop("ref")] = decision_data
+        return parsed
+    
+    def build_decision(self, item: InventoryItem, metrics: Dict, decision_data: Dict,
+                       decided_by: str = "llm") -> Dict:
+        """Combine the LLM's (or rules') decision with the computed item metrics"""
+        
+        cascade_stats.decided(decided_by)
+        return {
+            "itemId": item.id,
+            "item": item.name,
+            "decision": decision_data["decision"],
+            "reasoning": decision_data["reasoning"],
+            "vendorEmail": decision_data["vendorEmail"],
+            "quantity": metrics["recommended_quantity"],
+            "cost": metrics["total_cost"],
+            "urgency": metrics["urgency"],
+            "vendor": item.vendor,
+            "vendorEmailAddress": item.vendorEmail,
+            "daysUntilStockout": metrics["days_until_stockout"],
+            "confidence": decision_data.get("confidence"),
+            "decidedBy": decided_by
+        }
+    
+    @instrumented("parse")
+    def parse_response(self, response) -> Dict:
+        """Parse and validate the LLM's JSON reply into decision data.
+        
+        Raises ValueError when the reply is not JSON or does not match
+        LLMDecision.
+        """
+        
+        decision_data = json.loads(strip_code_fences(response.content))
+        if not isinstance(decision_data, dict):
+            raise ValueError("Expected a JSON object")
+        return LLMDecision(**decision_data).dict()
+    
+    def repair_messages(self, messages: List, response, error: Exception) -> List:
+        """Extend a conversation with the invalid reply and a request to fix it"""
+        
+        lc = langchain_sdk()
+        return [
+            *messages,
+            lc.AIMessage(content=response.content),
+            lc.HumanMessage(content=f"That reply was invalid: {str(error)[:300]}\n"
+                                    "Respond again with ONLY the JSON object in the required format.")
+        ]
+    
+    async def acompose_po_message(self, vendor: str, lines: List[Dict]) -> str:
+        """Have the LLM write the cover text of a multi-line PO (one call)"""
+        
+        response = await self.ainvoke(self.prompts.po_messages(vendor, lines), timeout=ANALYSIS_ITEM_TIMEOUT)
+        message = json.loads(strip_code_fences(response.content)).get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise ValueError("Reply has no message text")
+        return message.strip()
+    
+    def cache_key(self, item: InventoryItem) -> str:
+        """Key an item on the fields its prompt depends on plus the model"""
+        
+        return DecisionCache.make_key({
+            "name": item.name.strip(),
+            "stock": item.stock,
+            "reorderPoint": item.reorderPoint,
+            "price": float(item.price),
+            "salesPerDay": float(item.salesPerDay),
+            "vendor": item.vendor.strip(),
+            "lastOrder": item.lastOrder.strip(),  # in the prompt, and empty means a first order
+            "model": self.model,
+            "reviewModel": self.large_model,
+            "prompt": self.PROMPT_VERSION
+        })
+    
+    def timeout_decision(self, item: InventoryItem, timeout: float) -> Dict:
+        """Escalate an item whose analysis did not finish in time"""
+        
+        decision = self.build_decision(item, self.compute_metrics(item), {
+            "decision": "ESCALATE",
+            "reasoning": f"The LLM did not reply within {timeout:g} seconds. Manual review required.",
+            "vendorEmail": ""
+        }, decided_by="timeout")
+        decision["error"] = "timeout"
+        return decision
+    
+    def error_decision(self, item: InventoryItem, error: Exception) -> Dict:
+        """Escalate an item whose analysis failed, so the rest of the batch still returns"""
+        
+        summary = f"{type(error).__name__}: {str(error).splitlines()[0] if str(error) else ''}"
+        logger.warning("Analysis of %r failed: %s", item.name, summary)
+        decision = self.build_decision(item, self.compute_metrics(item), {
+            "decision": "ESCALATE",
+            "reasoning": "Automated analysis failed for this item. Manual review required.",
+            "vendorEmail": ""
+        }, decided_by="error")
+        decision["error"] = summary
+        return decision
+    
+    def decide_locally(self, item: InventoryItem, metrics: Dict) -> Optional[Dict]:
+        """Return a rules-based decision when no LLM call is needed"""
+        
+        if self.rules is None:
+            return None
+        with cascade_stats.timer("rules"):
+            decision_data = self.rules.decide(item, metrics)
+        if decision_data is None:
+            return None
+        return self.build_decision(item, metrics, decision_data, decided_by="rules")
+    
+    def cached(self, item: InventoryItem) -> Optional[Dict]:
+        """Decision data cached for the item's current state, if any"""
+        if self.cache is None:
+            return None
+        with cascade_stats.timer("cache"):
+            return self.cache.get(self.cache_key(item))
+    
+    def lookup(self, item: InventoryItem, metrics: Dict) -> Optional[Dict]:
+        """Return a decision from the rules or the cache, if either has one"""
+        
+        local = self.decide_locally(item, metrics)
+        if local:
+            return local
+        
+        cached = self.cached(item)
+        if cached is not None:
+            return self.build_decision(item, metrics, cached, decided_by="cache")
+        
+        return None
+    
+    def store(self, item: InventoryItem, metrics: Dict, decision_data: Dict, decided_by: str = "llm") -> Dict:
+        """Cache fresh LLM decision data and build the item's decision"""
+        
+        if self.cache is not None:
+            self.cache.set(self.cache_key(item), decision_data)
+        return self.build_decision(item, metrics, decision_data, decided_by)
+    
+    def review_reason(self, item: InventoryItem, metrics: Dict, decision_data: Dict) -> Optional[str]:
+        """Why a small-model decision needs the large model's review, or None.
+        
+        Low confidence always does. An auto-approval does when the order
+        costs more than the limit, is CRITICAL or is the item's first.
+        Escalations already go to a person, so they are not reviewed.
+        """
+        
+        if self.large_llm is None:
+            return None
+        confidence = decision_data.get("confidence")
+        if confidence is not None and confidence < CASCADE_MIN_CONFIDENCE:
+            return "low_confidence"
+        if decision_data["decision"] != "AUTO_APPROVE":
+            return None
+        if metrics["total_cost"] > AUTO_APPROVE_LIMIT:
+            return "cost"
+        if metrics["urgency"] == "CRITICAL":
+            return "critical"
+        if not item.lastOrder.strip():
+            return "first_order"
+        return None
+    
+    async def arequest_decision(self, messages: List, timeout: Optional[float] = None,
+                                large: bool = False) -> Dict:
+        """Ask one model for a decision, with LLM_REPAIR_ATTEMPTS follow-ups for invalid replies"""
+        
+        with cascade_stats.timer("large" if large else "small"):
+            for repairs in range(LLM_REPAIR_ATTEMPTS + 1):
+                response = await self.ainvoke(messages, timeout=timeout, large=large)
+                try:
+                    return self.parse_response(response)
+                except ValueError as e:
+                    if repairs == LLM_REPAIR_ATTEMPTS:
+                        raise
+                    messages = self.repair_messages(messages, response, e)
+    
+    async def areview(self, item: InventoryItem, metrics: Dict, decision_data: Dict,
+                      timeout: Optional[float] = None) -> tuple:
+        """Escalate a small-model decision to the large model if needed; returns (data, decided by)"""
+        
+        reason = self.review_reason(item, metrics, decision_data)
+        if reason is None:
+            return decision_data, "llm"
+        cascade_stats.escalated(reason)
+        return await self.arequest_decision(self.build_messages(item, metrics), timeout, large=True), "llm_large"
+    
+    @instrumented("analyze_item")
+    async def aanalyze_item(self, item: InventoryItem, timeout: Optional[float] = None) -> Dict:
+        """Analyze a single inventory item and make a decision.
+        
+        Concurrent analyses of the same item state for the same API key
+        share one cache lookup and LLM call; the callers that joined it are
+        marked coalesced.
+        """
+        
+        metrics = self.compute_metrics(item)
+        local = self.decide_locally(item, metrics)
+        if local:
+            return local
+        
+        # Only calls made with the same API key may share one; the call is billed to that key
+        (decision_data, decided_by), shared = await inflight_items.do(
+            f"{key_fingerprint(self.api_key)}:{self.cache_key(item)}",
+            lambda: self.aresolve_item(item, metrics, timeout)
+        )
+        decision = self.build_decision(item, metrics, decision_data, decided_by=decided_by)
+        if shared:
+            decision["coalesced"] = True
+        return decision
+    
+    async def aresolve_item(self, item: InventoryItem, metrics: Dict, timeout: Optional[float]) -> tuple:
+        """Cached or fresh LLM decision data for an item, and who decided it"""
+        
+        cached = self.cached(item)
+        if cached is not None:
+            return cached, "cache"
+        
+        decision_data = await self.arequest_decision(self.build_messages(item, metrics), timeout)
+        decision_data, decided_by = await self.areview(item, metrics, decision_data, timeout)
+        if self.cache is not None:
+            self.cache.set(self.cache_key(item), decision_data)
+        return decision_data, decided_by
+    
+    def resolve_known(self, items: List[InventoryItem]) -> tuple:
+        """Split items into already-known decisions and LLM work.
+        
+        Returns a results list (None where the LLM is still needed) and the
+        pending (ref, item, metrics) entries, where ref is the input index.
+        """
+        
+        results: List[Optional[Dict]] = [None] * len(items)
+        pending = []
+        for ref, item in enumerate(items):
+            metrics = self.compute_metrics(item)
+            known = self.lookup(item, metrics)
+            if known:
+                results[ref] = known
+            else:
+                pending.append((ref, item, metrics))
+        return results, pending
+    
+    async def aanalyze_items(self, items: List[InventoryItem], token_budget: Optional[int] = None,
+                             timeout: Optional[float] = None, on_decided=None) -> List[Dict]:
+        """Batch mode: decide many items with one LLM request per chunk.
+        
+        Chunks run concurrently. Items the reply leaves out or garbles fan
+        out to per-item analyses. Results are returned in input order;
+        on_decided(ref, decision), if given, is called as each one is ready.
+        """
+        
+        results, pending = self.resolve_known(items)
+        semaphore = asyncio.Semaphore(max(1, ANALYSIS_CONCURRENCY))
+        timeout = timeout or ANALYSIS_ITEM_TIMEOUT
+        fallback: List[int] = []
+        
+        def decided(ref: int, decision: Dict):
+            results[ref] = decision
+            if on_decided is not None:
+                on_decided(ref, decision)
+        
+        if on_decided is not None:
+            for ref, decision in enumerate(results):
+                if decision is not None:
+                    on_decided(ref, decision)
+        
+        async def review(ref: int, item: InventoryItem, metrics: Dict, decision_data: Dict):
+            try:
+                decided(ref, self.store(item, metrics, *await self.areview(item, metrics, decision_data, timeout)))
+            except asyncio.TimeoutError:
+                decided(ref, self.timeout_decision(item, timeout))
+            except Exception as e:
+                decided(ref, self.error_decision(item, e))
+        
+        async def run_chunk(chunk: List[tuple]):
+            async with semaphore:
+                try:
+                    with cascade_stats.timer("small"):
+                        response = await self.ainvoke(
+                            self.build_batch_messages([line for *_, line in chunk]), len(chunk), timeout
+                        )
+                    parsed = self.parse_batch_response(response)
+                except Exception as e:  # every item in the chunk is retried on its own
+                    logger.warning("Batch of %d items failed: %s", len(chunk), e)
+                    parsed = {}
+            fallback.extend(ref for ref, *_ in chunk if ref not in parsed)
+            await asyncio.gather(*(
+                review(ref, item, metrics, parsed[ref]) for ref, item, metrics, _ in chunk if ref in parsed
+            ))
+        
+        await asyncio.gather(*(run_chunk(chunk) for chunk in self.plan_batches(pending, token_budget)))
+        
+        if fallback:
+            fallback.sort()
+            retried = await analyze_items_concurrently(self, [items[ref] for ref in fallback], timeout=timeout)
+            for ref, decision in zip(fallback, retried):
+                decided(ref, decision)
+        return results
+
+
+async def analyze_item_bounded(agent: InventoryAnalysisAgent, item: InventoryItem,
+                               semaphore: asyncio.Semaphore, timeout: float) -> Dict:
+    """Analyze one item under a shared concurrency limit and timeout"""
+    async with semaphore:
+        try:
+            return await agent.aanalyze_item(item, timeout)
+        except asyncio.TimeoutError:
+            return agent.timeout_decision(item, timeout)
+        except Exception as e:
+            return agent.error_decision(item, e)
+
+
+async def analyze_items_concurrently(
+    agent: InventoryAnalysisAgent,
+    items: List[InventoryItem],
+    concurrency: Optional[int] = None,
+    timeout: Optional[float] = None
+) -> List[Dict]:
+    """Fan item analyses out over the async LLM client.
+    
+    At most ``concurrency`` LLM calls are in flight at once. An item that
+    takes longer than ``timeout`` seconds, or whose analysis fails, is
+    escalated for manual review instead of failing the run. Results are
+    returned in input order.
+    """
+    
+    semaphore = asyncio.Semaphore(max(1, concurrency or ANALYSIS_CONCURRENCY))
+    timeout = timeout or ANALYSIS_ITEM_TIMEOUT
+    
+    return list(await asyncio.gather(*(
+        analyze_item_bounded(agent, item, semaphore, timeout) for item in items
+    )))
+
+
+async def iter_item_analyses(
+    agent: InventoryAnalysisAgent,
+    items: List[InventoryItem],
+    concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+    batch: bool = False
+):
+    """Yield (index, decision) pairs in completion order.
+    
+    Same limits as analyze_items_concurrently, or with batch the items are
+    packed into batched prompts and yielded as each chunk's reply comes in.
+    Analyses still running when the consumer stops iterating (e.g. a client
+    disconnect) are cancelled.
+    """
+    
+    if batch:
+        ready: asyncio.Queue = asyncio.Queue()
+        analysis = asyncio.create_task(agent.aanalyze_items(
+            items, timeout=timeout, on_decided=lambda ref, decision: ready.put_nowait((ref, decision))
+        ))
+        analysis.add_done_callback(lambda _: ready.put_nowait(None))
+        try:
+            while True:
+                entry = await ready.get()
+                if entry is None:
+                    break
+                yield entry
+            analysis.result()  # re-raise if the batch run itself failed
+        finally:
+            analysis.cancel()
+        return
+    
+    semaphore = asyncio.Semaphore(max(1, concurrency or ANALYSIS_CONCURRENCY))
+    timeout = timeout or ANALYSIS_ITEM_TIMEOUT
+    
+    async def run(index: int, item: InventoryItem) -> tuple:
+        return index, await analyze_item_bounded(agent, item, semaphore, timeout)
+    
+    tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def run_item_analysis(agent: InventoryAnalysisAgent, items: List[InventoryItem],
+                            batch: bool = False) -> List[Dict]:
+    """Analyze items one request per item, or packed into batched prompts"""
+    if batch:
+        return await agent.aanalyze_items(items)
+    return await analyze_items_concurrently(agent, items)
+
+
+async def merge_crew_decisions(agent: InventoryAnalysisAgent, items: List[InventoryItem],
+                               crew_decisions: Dict[int, Dict], batch: bool = False) -> List[Dict]:
+    """Use the crew's per-item decisions where the rules do not settle the item.
+    
+    The rules go first, as in the agent, so a crew AUTO_APPROVE can never
+    override a rules ESCALATE. Items neither decides are analyzed by the agent.
+    """
+    
+    decisions: List[Optional[Dict]] = []
+    for item in items:
+        metrics = agent.compute_metrics(item)
+        decision = agent.decide_locally(item, metrics)
+        if decision is None and item.id in crew_decisions:
+            decision = agent.build_decision(item, metrics, crew_decisions[item.id], decided_by="crew")
+        decisions.append(decision)
+    
+    missing = [item for item, decision in zip(items, decisions) if decision is None]
+    fallback = iter(await run_item_analysis(agent, missing, batch) if missing else [])
+    return [decision if decision is not None else next(fallback) for decision in decisions]
+
+
+class ProcurementCrew:
+    """CrewAI-based multi-agent system for procurement"""
+    
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        crewai = crewai_sdk()
+        
+        # Define agents
+        self.inventory_analyst = crewai.Agent(
+            role='Inventory Analyst',
+            goal='Analyze inventory levels and predict stockouts',
+            backstory="""You are an expert in inventory management with 15 years 
+            of experience in retail operations. You excel at predicting demand 
+            and optimizing stock levels.""",
+            verbose=CREW_VERBOSE,
+            allow_delegation=False,
+            llm=llm_client_pool.get(api_key, CREW_MODEL, governed=False)
+        )
+        
+        self.procurement_manager = crewai.Agent(
+            role='Procurement Manager',
+            goal='Make cost-effective purchasing decisions',
+            backstory="""You are a procurement specialist who negotiates with 
+            vendors and ensures timely deliveries while minimizing costs.""",
+            verbose=CREW_VERBOSE,
+            allow_delegation=False,
+            llm=llm_client_pool.get(api_key, CREW_MODEL, governed=False)
+        )
+        
+        self.risk_assessor = crewai.Agent(
+            role='Risk Assessment Officer',
+            goal='Evaluate financial and operational risks',
+            backstory="""You assess risks in business decisions, focusing on 
+            cash flow, vendor reliability, and operational continuity.""",
+            verbose=CREW_VERBOSE,
+            allow_delegation=False,
+            llm=llm_client_pool.get(api_key, CREW_MODEL, governed=False)
+        )
+    
+    @staticmethod
+    def cancellation_check(cancel_event: Optional[threading.Event]):
+        """Step callback that stops the kickoff once cancel_event is set"""
+        
+        def check(_step):
+            if cancel_event is not None and cancel_event.is_set():
+                raise JobCancelled("Crew analysis cancelled")
+        return check
+    
+    @instrumented("crew_kickoff")
+    def analyze_inventory_situation(self, items: List[InventoryItem],
+                                    cancel_event: Optional[threading.Event] = None) -> Dict:
+        """Use crew to analyze entire inventory situation"""
+        
+        low_stock_items = get_low_stock_items(items)
+        
+        if not low_stock_items:
+            return {
+                "summary": "All inventory levels are healthy",
+                "critical_items": [],
+                "recommended_actions": []
+            }
+        
+        crewai = crewai_sdk()
+        
+        # Give the crew the same computed figures the per-item agent uses, as
+        # a compact table keyed by item id. Rows past the token budget (the
+        # least urgent, as the worklist is sorted) are left to the agent.
+        entries = [
+            (item, prompt_compiler.item_row(item.id, item, InventoryAnalysisAgent.compute_metrics(item)))
+            for item in low_stock_items
+        ]
+        included = prompt_compiler.chunk(entries, CREW_TOKEN_BUDGET, len(entries))[0]
+        item_table = prompt_compiler.table([row for _, row in included])
+        
+        # Create analysis task
+        analysis_task = crewai.Task(
+            description=f"""Analyze these low-stock items and provide recommendations.
+            Fields are separated by "|"; ref is the item id.
+            
+{item_table}
+            
+            Provide:
+            1. Overall inventory health assessment
+            2. Critical items requiring immediate action
+            3. Recommended procurement strategy""",
+            agent=self.inventory_analyst,
+            expected_output="Detailed inventory analysis with recommendations"
+        )
+        
+        # Create procurement task
+        procurement_task = crewai.Task(
+            description="""Based on the inventory analysis, create a procurement plan with:
+            1. Items to order immediately
+            2. Quantities and estimated costs
+            3. Vendor communication strategy""",
+            agent=self.procurement_manager,
+            expected_output="Procurement plan with action items"
+        )
+        
+        # Create risk assessment task
+        risk_task = crewai.Task(
+            description=f"""Assess risks in the procurement plan:
+            1. Financial risks (cash flow impact)
+            2. Operational risks (stockout probability)
+            3. Vendor risks (reliability, delivery times)
+            
+            Recommend which decisions can be auto-approved vs need escalation.
+            
+            Decision Rules:
+            - AUTO_APPROVE: Routine reorders under {PromptCompiler.APPROVAL_LIMIT}, normal sales patterns
+            - ESCALATE: High cost (>{PromptCompiler.APPROVAL_LIMIT}), unusual situations, first-time orders
+            
+            Return a short overall summary plus one decision for every item id,
+            each with a brief 2-3 sentence reasoning and a professional email
+            body for the purchase order.""",
+            agent=self.risk_assessor,
+            expected_output="Risk assessment summary with a structured decision per item",
+            output_pydantic=CrewAssessment
+        )
+        
+        # Create and run crew
+        crew = crewai.Crew(
+            agents=[self.inventory_analyst, self.procurement_manager, self.risk_assessor],
+            tasks=[analysis_task, procurement_task, risk_task],
+            process=crewai.Process.sequential,
+            verbose=CREW_VERBOSE,
+            step_callback=self.cancellation_check(cancel_event)
+        )
+        
+        # The crew makes its own LLM calls, so budget for one per task up front
+        llm_governor.reserve_blocking(
+            self.api_key, len(crew.tasks),
+            len(crew.tasks) * (prompt_compiler.count(item_table) + LLM_REPLY_TOKENS)
+        )
+        result = crew.kickoff()
+        assessment = self.parse_assessment(result)
+        
+        item_ids = {item.id for item, _ in included}
+        item_decisions = {}
+        if assessment is not None:
+            for entry in assessment.decisions:
+                if entry.id in item_ids and entry.decision in ("AUTO_APPROVE", "ESCALATE"):
+                    item_decisions[entry.id] = {
+                        "decision": entry.decision,
+                        "reasoning": entry.reasoning,
+                        "vendorEmail": entry.vendorEmail
+                    }
+        
+        return {
+            "summary": assessment.summary if assessment is not None else str(result),
+            "critical_items": [item.name for item in low_stock_items],
+            "analysis_timestamp": datetime.now().isoformat(),
+            "item_decisions": item_decisions
+        }
+    
+    @staticmethod
+    def parse_assessment(result) -> Optional[CrewAssessment]:
+        """Extract the structured assessment from a kickoff result, if any"""
+        
+        structured = getattr(result, "pydantic", None)
+        if isinstance(structured, CrewAssessment):
+            return structured
+        
+        raw = getattr(result, "raw", None) or str(result)
+        try:
+            return CrewAssessment(**json.loads(strip_code_fences(raw)))
+        except (ValueError, TypeError):
+            return None
+
+
+# ============================================================================
+# INVENTORY TRIAGE
+# ============================================================================
+
+INVENTORY_COLUMNS = ["id", "name", "stock", "reorderPoint", "price",
+                     "vendor", "vendorEmail", "lastOrder", "salesPerDay"]
+
+URGENCY_LEVELS = ["CRITICAL", "HIGH", "MEDIUM", "LOW"]
+
+
+def inventory_frame(inventory):
+    """Columnar (pandas) view of an inventory of InventoryItems or dicts"""
+    
+    pd = pandas_sdk().pd
+    if isinstance(inventory, pd.DataFrame):
+        return inventory
+    if inventory and isinstance(inventory[0], dict):
+        return pd.DataFrame.from_records(inventory, columns=INVENTORY_COLUMNS)
+    return pd.DataFrame({
+        column: [getattr(item, column) for item in inventory] for column in INVENTORY_COLUMNS
+    })
+
+
+def triage_inventory(inventory):
+    """Vectorized low-stock filter and reorder metrics for a whole catalog.
+    
+    Computes the same days-until-stockout, 30-day order quantity, cost and
+    urgency as InventoryAnalysisAgent.compute_metrics, in one pass over
+    columns instead of per object. Returns only the low-stock rows, most
+    urgent first (ties broken by days until stockout, then input order).
+    """
+    
+    sdk = pandas_sdk()
+    np = sdk.np
+    frame = inventory_frame(inventory)
+    
+    low = frame[frame["stock"].to_numpy() <= frame["reorderPoint"].to_numpy()]
+    stock = low["stock"].to_numpy(dtype=float)
+    sales = low["salesPerDay"].to_numpy(dtype=float)
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days = np.where(sales > 0, stock / np.where(sales > 0, sales, 1.0), 999.0)
+    quantity = np.trunc(sales * 30).astype(np.int64)  # 30-day supply
+    cost = quantity * low["price"].to_numpy(dtype=float)
+    rank = np.select([days <= 2, days <= 5, days <= 10], [0, 1, 2], default=3)
+    
+    worklist = low.assign(
+        daysUntilStockout=days,
+        recommendedQuantity=quantity,
+        totalCost=cost,
+        urgency=np.array(URGENCY_LEVELS)[rank],
+        urgencyRank=rank
+    )
+    return worklist.sort_values(["urgencyRank", "daysUntilStockout"], kind="stable")
+
+
+@instrumented("triage")
+def build_worklist(inventory) -> List[InventoryItem]:
+    """Low-stock items for the agent stage, most urgent first.
+    
+    Small inventories are triaged in plain Python; from
+    TRIAGE_VECTORIZE_MIN items on (or for DataFrames) the vectorized path
+    is used and InventoryItems are only built for the low-stock rows.
+    """
+    
+    is_list = isinstance(inventory, list)
+    if is_list and len(inventory) < TRIAGE_VECTORIZE_MIN and all(isinstance(i, InventoryItem) for i in inventory):
+        def priority(item: InventoryItem) -> tuple:
+            metrics = InventoryAnalysisAgent.compute_metrics(item)
+            return URGENCY_LEVELS.index(metrics["urgency"]), metrics["days_until_stockout"]
+        return sorted(get_low_stock_items(inventory), key=priority)
+    
+    if is_list and not inventory:
+        return []
+    
+    worklist = triage_inventory(inventory)
+    if is_list and isinstance(inventory[0], InventoryItem):
+        return [inventory[position] for position in worklist.index]
+    return [InventoryItem(**record) for record in worklist[INVENTORY_COLUMNS].to_dict("records")]
+
+
+# ============================================================================
+# INVENTORY SNAPSHOTS
+# ============================================================================
+
+INGEST_FORMATS = {
+    "csv": "csv",
+    "text/csv": "csv",
+    "parquet": "parquet",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+    "ndjson": "ndjson",
+    "jsonl": "ndjson",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson"
+}
+
+
+@instrumented("ingest")
+def load_inventory_file(path: str, file_format: str):
+    """Read a CSV, Parquet or NDJSON inventory file into a typed DataFrame"""
+    
+    sdk = pandas_sdk()
+    pd = sdk.pd
+    if file_format == "parquet":
+        frame = pd.read_parquet(path, columns=INVENTORY_COLUMNS, memory_map=True)
+    elif file_format == "csv":
+        frame = pd.read_csv(path, usecols=INVENTORY_COLUMNS)
+    elif file_format == "ndjson":
+        frame = pd.read_json(path, lines=True, dtype=False)
+    else:
+        raise ValueError(f"Unsupported inventory format: {file_format}")
+    
+    missing = [column for column in INVENTORY_COLUMNS if column not in frame.columns]
+    if missing:
+        raise ValueError(f"Inventory file is missing columns: {', '.join(missing)}")
+    
+    np = sdk.np
+    columns = {}
+    for column in INVENTORY_COLUMNS:
+        values = frame[column]
+        if column in ("id", "stock", "reorderPoint"):
+            columns[column] = pd.to_numeric(values, errors="raise").astype(np.int64)
+        elif column in ("price", "salesPerDay"):
+            columns[column] = pd.to_numeric(values, errors="raise").astype(np.float64)
+        else:
+            columns[column] = values.fillna("").astype(str)
+    
+    # Deltas and decisions address items by id, so each id may appear only once
+    duplicated = columns["id"][columns["id"].duplicated()].unique()
+    if len(duplicated):
+        shown = ", ".join(str(item_id) for item_id in duplicated[:10])
+        raise ValueError(f"Inventory file has {len(duplicated)} duplicate item ids: {shown}")
+    return pd.DataFrame(columns).reset_index(drop=True)
+
+
+class InventorySnapshotStore:
+    """Server-side inventory snapshots that analysis calls can refer to by ID"""
+    
+    def __init__(self, max_snapshots: int):
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def add(self, frame, source: str) -> Dict:
+        snapshot = {
+            "snapshotId": uuid.uuid4().hex,
+            "frame": frame,
+            "rows": len(frame),
+            "source": source,
+            "createdAt": datetime.now().isoformat(),
+            "updatedAt": None,
+            "positions": None,  # item id -> row, built on first delta
+            "decisions": {},  # item id -> latest decision for a low-stock item
+            "lock": asyncio.Lock()
+        }
+        with self._lock:
+            self._snapshots[snapshot["snapshotId"]] = snapshot
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return self.describe(snapshot)
+    
+    def get(self, snapshot_id: str) -> Optional[Dict]:
+        with self._lock:
+            snapshot = self._snapshots.get(snapshot_id)
+            if snapshot is not None:
+                self._snapshots.move_to_end(snapshot_id)
+            return snapshot
+    
+    def delete(self, snapshot_id: str) -> bool:
+        with self._lock:
+            return self._snapshots.pop(snapshot_id, None) is not None
+    
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return [self.describe(snapshot) for snapshot in self._snapshots.values()]
+    
+    @staticmethod
+    def describe(snapshot: Dict) -> Dict:
+        hidden = ("frame", "positions", "decisions", "lock")
+        return {**{k: v for k, v in snapshot.items() if k not in hidden},
+                "decisionsTracked": len(snapshot["decisions"])}
+    
+    @staticmethod
+    def record_decisions(snapshot: Dict, decisions: List[Dict]):
+        """Remember the latest decision per item as the baseline for deltas"""
+        for decision in decisions:
+            snapshot["decisions"][decision["itemId"]] = decision
+    
+    @staticmethod
+    def item_at(frame, position: int) -> InventoryItem:
+        row = frame.iloc[position]
+        return InventoryItem(**{
+            column: row[column].item() if hasattr(row[column], "item") else row[column]
+            for column in INVENTORY_COLUMNS
+        })
+    
+    def apply_deltas(self, snapshot: Dict, updates: List[InventoryDelta]) -> Dict[int, tuple]:
+        """Apply item updates, additions and removals to a snapshot in place.
+        
+        Work is proportional to the number of updates (removals and
+        additions rebuild the frame once per call). Returns
+        {item id: (item before, item after)}, with None for a missing side.
+        """
+        
+        pd = pandas_sdk().pd
+        frame = snapshot["frame"]
+        if snapshot["positions"] is None:
+            snapshot["positions"] = {int(item_id): pos for pos, item_id in enumerate(frame["id"].to_numpy())}
+        positions = snapshot["positions"]
+        
+        # Validate additions before touching the frame so a bad request changes nothing
+        added: Dict[int, InventoryItem] = {}
+        new_fields: Dict[int, Dict] = {}
+        for delta in updates:
+            if delta.id not in positions:
+                if delta.remove:
+                    new_fields.pop(delta.id, None)
+                else:
+                    new_fields.setdefault(delta.id, {}).update(delta.dict(exclude_unset=True, exclude={"remove"}))
+        for item_id, fields in new_fields.items():
+            try:
+                added[item_id] = InventoryItem(**fields)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"New item {item_id} is incomplete: {e}")
+        
+        touched: Dict[int, tuple] = {item_id: (None, item) for item_id, item in added.items()}
+        removed = set()
+        for delta in updates:
+            position = positions.get(delta.id)
+            if position is None:
+                continue
+            before = touched[delta.id][0] if delta.id in touched else self.item_at(frame, position)
+            if delta.remove:
+                removed.add(position)
+                touched[delta.id] = (before, None)
+                continue
+            for column, value in delta.dict(exclude_unset=True, exclude={"id", "remove"}).items():
+                frame.at[position, column] = value
+            touched[delta.id] = (before, self.item_at(frame, position))
+        
+        if removed or added:
+            keep = frame.drop(index=sorted(removed)) if removed else frame
+            if added:
+                keep = pd.concat([keep, inventory_frame(list(added.values()))], ignore_index=True)
+            frame = keep.reset_index(drop=True)
+            snapshot["frame"] = frame
+            snapshot["positions"] = {int(item_id): pos for pos, item_id in enumerate(frame["id"].to_numpy())}
+        
+        snapshot["rows"] = len(frame)
+        snapshot["updatedAt"] = datetime.now().isoformat()
+        return touched
+    
+    def resolve(self, request: AnalysisRequest) -> Optional[Dict]:
+        """The snapshot a request refers to, or None when it sends inline items"""
+        if request.snapshot_id is None:
+            return None
+        snapshot = self.get(request.snapshot_id)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail=f"Unknown snapshot: {request.snapshot_id}")
+        return snapshot
+
+
+inventory_snapshots = InventorySnapshotStore(SNAPSHOT_MAX_COUNT)
+
+
+DECISION_OUTCOME_FIELDS = ("decision", "quantity", "cost", "urgency")
+
+
+async def analyze_snapshot_deltas(snapshot: Dict, request: DeltaRequest) -> Dict:
+    """Apply deltas and re-analyze only items whose reorder inputs changed.
+    
+    An item is re-analyzed when it is low on stock and either is new to
+    the worklist or any of its fields changed. Items that left the worklist
+    (restocked or removed) are reported as resolved, and open POs of
+    restocked items are received. Returns a diff against the snapshot's
+    previous decisions.
+    """
+    
+    tenant = key_fingerprint(request.openai_api_key)
+    async with snapshot["lock"]:
+        touched = inventory_snapshots.apply_deltas(snapshot, request.updates)
+        await receive_restocked(tenant, [after for _, after in touched.values() if after is not None])
+        previous = snapshot["decisions"]
+        
+        to_analyze: List[InventoryItem] = []
+        resolved, unchanged = [], 0
+        for item_id, (before, after) in touched.items():
+            is_low = after is not None and after.stock <= after.reorderPoint
+            if not is_low:
+                if item_id in previous:
+                    resolved.append({"itemId": item_id, "previous": previous.pop(item_id)})
+            elif item_id in previous and before == after:
+                unchanged += 1
+            else:
+                to_analyze.append(after)
+        
+        added, changed = [], []
+        if to_analyze:
+            agent = agent_factory.inventory_agent(request.openai_api_key)
+            decisions = await run_item_analysis(agent, build_worklist(to_analyze), request.batch)
+            await place_orders(decisions, tenant, request.user_email, request.resend_api_key, "delta", agent)
+            for decision in decisions:
+                before_decision = previous.get(decision["itemId"])
+                if before_decision is None:
+                    added.append(decision)
+                elif any(before_decision[f] != decision[f] for f in DECISION_OUTCOME_FIELDS):
+                    changed.append({"before": before_decision, "after": decision})
+                else:
+                    unchanged += 1
+            inventory_snapshots.record_decisions(snapshot, decisions)
+        
+        return {
+            "success": True,
+            "snapshotId": snapshot["snapshotId"],
+            "rows": snapshot["rows"],
+            "applied": len(request.updates),
+            "analyzed": len(to_analyze),
+            "added": added,
+            "changed": changed,
+            "resolved": resolved,
+            "unchanged": unchanged,
+            "timestamp": datetime.now().isoformat()
+        }
+
+
+async def load_worklist(request: AnalysisRequest) -> tuple:
+    """Resolve the request's inventory and triage it into the agent worklist.
+    
+    Returns (inventory size, low-stock items). Open POs of items seen
+    restocked are received on the way. A snapshot is read under its lock,
+    so deltas cannot change it mid-triage. Large inventories are triaged
+    on the agent pool so the event loop stays responsive.
+    """
+    
+    snapshot = inventory_snapshots.resolve(request)
+    async with snapshot["lock"] if snapshot is not None else nullcontext():
+        inventory = snapshot["frame"] if snapshot is not None else request.inventory
+        await receive_restocked(key_fingerprint(request.openai_api_key), inventory)
+        if len(inventory) >= TRIAGE_VECTORIZE_MIN:
+            return len(inventory), await blocking_executor.run("agent", build_worklist, inventory)
+        return len(inventory), build_worklist(inventory)
+
+
+async def record_snapshot_decisions(request: AnalysisRequest, decisions: List[Dict]):
+    """Keep a full analysis of a snapshot as the baseline for later deltas.
+    
+    Waits for the snapshot's lock, so a delta analysis in progress keeps
+    the baseline it started from.
+    """
+    if request.snapshot_id is not None:
+        snapshot = inventory_snapshots.get(request.snapshot_id)
+        if snapshot is not None:
+            async with snapshot["lock"]:
+                snapshot["decisions"].clear()
+                inventory_snapshots.record_decisions(snapshot, decisions)
+
+
+# ============================================================================
+# CLIENT POOLING
+# ============================================================================
+
+def key_fingerprint(api_key: str) -> str:
+    """Short, non-reversible identifier for an API key (safe to log or report)"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+class LLMClientPool:
+    """Shared ChatOpenAI clients keyed by API key, model and temperature.
+    
+    All clients share one pair of httpx connection pools; the API key is
+    sent per request, so warm TLS connections are reused across tenants.
+    """
+    
+    def __init__(self, max_clients: int, max_connections: int, max_keepalive: int):
+        self.max_clients = max_clients
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.http_client = None
+        self.http_async_client = None
+        self._clients: "OrderedDict[tuple, ChatOpenAI]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+    
+    def _ensure_http_clients(self):
+        if self.http_client is None:
+            import httpx
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive
+            )
+            self.http_client = httpx.Client(limits=limits, timeout=None)
+            self.http_async_client = httpx.AsyncClient(limits=limits, timeout=None)
+    
+    def get(self, api_key: str, model: str, temperature: Optional[float] = None,
+            json_mode: bool = False, governed: bool = True) -> "ChatOpenAI":
+        """A pooled client; governed clients leave retries to llm_governor.
+        
+        Pass governed=False for clients whose calls do not go through the
+        governor (the crew's), so the SDK keeps retrying them itself.
+        """
+        
+        governed = governed and LLM_RPM > 0
+        key = (key_fingerprint(api_key), model, temperature, json_mode, governed)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self.reused += 1
+                return client
+            
+            self._ensure_http_clients()
+            options = {"temperature": temperature} if temperature is not None else {}
+            if json_mode:
+                options["model_kwargs"] = {"response_format": {"type": "json_object"}}
+            if governed:
+                options["max_retries"] = 0  # the rate governor backs off and retries
+            if OPENAI_BASE_URL:
+                options["base_url"] = OPENAI_BASE_URL
+            client = langchain_sdk().ChatOpenAI(
+                model=model,
+                openai_api_key=api_key,
+                http_client=self.http_client,
+                http_async_client=self.http_async_client,
+                **options
+            )
+            self._clients[key] = client
+            self.created += 1
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+                self.evicted += 1
+            return client
+    
+    async def aclose(self):
+        self._clients.clear()
+        if self.http_client is not None:
+            self.http_client.close()
+            await self.http_async_client.aclose()
+            self.http_client = self.http_async_client = None
+    
+    def stats(self) -> Dict:
+        return {
+            "clients": len(self._clients),
+            "maxClients": self.max_clients,
+            "created": self.created,
+            "reused": self.reused,
+            "evicted": self.evicted
+        }
+
+
+class AgentFactory:
+    """Reuses analysis agents and procurement crews across requests.
+    
+    ``InventoryAnalysisAgent`` holds no per-call state, so one instance per
+    API key is shared. Crews keep agent state while a kickoff runs, so they
+    are checked out of a small per-key pool and returned afterwards.
+    """
+    
+    def __init__(self, max_agents: int, crews_per_key: int):
+        self.max_agents = max_agents
+        self.crews_per_key = crews_per_key
+        self._agents: "OrderedDict[str, InventoryAnalysisAgent]" = OrderedDict()
+        self._idle_crews: Dict[str, List[ProcurementCrew]] = {}
+        self._lock = threading.Lock()
+        self.counters = {
+            "agentsCreated": 0,
+            "agentsReused": 0,
+            "crewsCreated": 0,
+            "crewsReused": 0
+        }
+    
+    def inventory_agent(self, api_key: str) -> InventoryAnalysisAgent:
+        fingerprint = key_fingerprint(api_key)
+        with self._lock:
+            agent = self._agents.get(fingerprint)
+            if agent is not None:
+                self._agents.move_to_end(fingerprint)
+                self.counters["agentsReused"] += 1
+                return agent
+            agent = InventoryAnalysisAgent(api_key)
+            self._agents[fingerprint] = agent
+            self.counters["agentsCreated"] += 1
+            while len(self._agents) > self.max_agents:
+                self._agents.popitem(last=False)
+            return agent
+    
+    @contextmanager
+    def procurement_crew(self, api_key: str):
+        """Check a crew out for the duration of one kickoff"""
+        fingerprint = key_fingerprint(api_key)
+        with self._lock:
+            idle = self._idle_crews.get(fingerprint)
+            crew = idle.pop() if idle else None
+            self.counters["crewsReused" if crew else "crewsCreated"] += 1
+        if crew is None:
+            crew = ProcurementCrew(api_key)
+        # A crew whose kickoff raised (e.g. was cancelled) is not reused
+        yield crew
+        with self._lock:
+            idle = self._idle_crews.setdefault(fingerprint, [])
+            if len(idle) < self.crews_per_key:
+                idle.append(crew)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            idle_crews = sum(len(crews) for crews in self._idle_crews.values())
+            return {"agents": len(self._agents), "idleCrews": idle_crews, **self.counters}
+
+
+def run_crew_analysis(api_key: str, items: List[InventoryItem],
+                      cancel_event: Optional[threading.Event] = None) -> Dict:
+    """Run a pooled crew over the inventory (blocking; call from a worker thread)"""
+    with agent_factory.procurement_crew(api_key) as crew:
+        return crew.analyze_inventory_situation(items, cancel_event)
+
+
+# resend.api_key is process-global; these keep concurrent sends for
+# different tenants from trampling each other's credentials
+_resend_lock = threading.Lock()
+_resend_auth = threading.local()
+
+
+class _SessionHTTPClient:
+    """Resend HTTP client backed by a keep-alive requests.Session"""
+    
+    def __init__(self, timeout: int = 30):
+        import requests
+        self._requests = requests
+        self._timeout = timeout
+        self._session = requests.Session()
+    
+    def request(self, method, url, headers, json=None, files=None, data=None):
+        api_key = getattr(_resend_auth, "api_key", None)
+        if api_key:
+            headers = {**headers, "Authorization": f"Bearer {api_key}"}
+        try:
+            resp = self._session.request(
+                method=method,
+                url=url,
+                headers=headers,
+                json=json if data is None and files is None else None,
+                files=files,
+                data=data,
+                timeout=self._timeout
+            )
+            return resp.content, resp.status_code, resp.headers
+        except self._requests.RequestException as e:
+            raise RuntimeError(f"Request failed: {e}") from e
+
+
+def call_resend(api_key: str, func, *args):
+    """Call a Resend SDK function with the given tenant's API key"""
+    resend = resend_sdk()
+    if isinstance(getattr(resend, "default_http_client", None), _SessionHTTPClient):
+        _resend_auth.api_key = api_key
+        try:
+            return func(*args)
+        finally:
+            _resend_auth.api_key = None
+    with _resend_lock:
+        resend.api_key = api_key
+        return func(*args)
+
+
+def use_pooled_resend_connections(resend):
+    """Make the Resend SDK reuse connections (SDK versions with pluggable clients)"""
+    if hasattr(resend, "default_http_client"):
+        resend.default_http_client = _SessionHTTPClient()
+
+
+llm_client_pool = LLMClientPool(LLM_POOL_MAX_CLIENTS, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE)
+agent_factory = AgentFactory(LLM_POOL_MAX_CLIENTS, CREW_POOL_SIZE)
+
+
+# ============================================================================
+# RATE LIMITING
+# ============================================================================
+
+class TokenBucket:
+    """Allowance refilled continuously at per_minute, holding a short burst"""
+    
+    BURST_SECONDS = 10
+    
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = max(1.0, per_minute * self.BURST_SECONDS / 60)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+    
+    def refill(self, now: float, scale: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.per_minute * scale / 60)
+        self.updated = now
+    
+    def wait_time(self, amount: float, scale: float) -> float:
+        """Seconds until amount (capped at the burst size) is available"""
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / (self.per_minute * scale))
+    
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+    
+    def give_back(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class TenantRateLimiter:
+    """Requests/min and tokens/min budgets for one API key.
+    
+    Calls from concurrent HTTP requests (flows) are granted fairly: a call
+    may go ahead only while its flow has had no more grants than any other
+    waiting flow, so one large batch cannot starve a small request. A
+    provider 429 pauses the key for its retry-after and scales the refill
+    rate down; each success scales it back up (AIMD), so throughput settles
+    just under the real quota instead of oscillating.
+    """
+    
+    POLL_SECONDS = 0.02
+    MAX_SLEEP_SECONDS = 0.25
+    MIN_SCALE = 0.1
+    
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.scale = 1.0
+        self.paused_until = 0.0
+        self.flows: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self.counters = {"granted": 0, "throttled": 0, "rateLimited": 0, "waitSeconds": 0.0}
+    
+    def _join(self, flow: str):
+        with self._lock:
+            state = self.flows.get(flow)
+            if state is None:
+                # Start level with the least-served flow, like a fair queue's virtual time
+                start = min((s["granted"] for s in self.flows.values()), default=0)
+                state = self.flows[flow] = {"waiting": 0, "granted": start}
+            state["waiting"] += 1
+    
+    def _leave(self, flow: str, waited: float):
+        with self._lock:
+            state = self.flows[flow]
+            state["waiting"] -= 1
+            if state["waiting"] == 0:
+                del self.flows[flow]
+            self.counters["waitSeconds"] += waited
+    
+    def _try_acquire(self, flow: str, tokens: int) -> float:
+        """Take budget for one call, or return how long to wait before retrying"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.flows[flow]["granted"] > min(s["granted"] for s in self.flows.values()):
+                return self.POLL_SECONDS
+            
+            self.requests.refill(now, self.scale)
+            wait = self.requests.wait_time(1, self.scale)
+            if self.tokens is not None:
+                self.tokens.refill(now, self.scale)
+                wait = max(wait, self.tokens.wait_time(tokens, self.scale))
+            if wait > 0:
+                return wait
+            
+            self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            self.flows[flow]["granted"] += 1
+            self.counters["granted"] += 1
+            return 0.0
+    
+    async def acquire(self, flow: str, tokens: int):
+        self._join(flow)
+        started = time.monotonic()
+        try:
+            delay = self._try_acquire(flow, tokens)
+            if delay > 0:
+                self.counters["throttled"] += 1
+            while delay > 0:
+                await asyncio.sleep(min(delay, self.MAX_SLEEP_SECONDS))
+                delay = self._try_acquire(flow, tokens)
+        finally:
+            self._leave(flow, time.monotonic() - started)
+    
+    def acquire_blocking(self, flow: str, tokens: int):
+        """acquire() for worker threads (e.g. a crew kickoff)"""
+        self._join(flow)
+        started = time.monotonic()
+        try:
+            delay = self._try_acquire(flow, tokens)
+            if delay > 0:
+                self.counters["throttled"] += 1
+            while delay > 0:
+                time.sleep(min(delay, self.MAX_SLEEP_SECONDS))
+                delay = self._try_acquire(flow, tokens)
+        finally:
+            self._leave(flow, time.monotonic() - started)
+    
+    def rate_limited(self, retry_after: float):
+        """Back off after a provider 429"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            self.scale = max(self.MIN_SCALE, self.scale * 0.7)
+            self.counters["rateLimited"] += 1
+    
+    def succeeded(self, reserved: int, used: Optional[int]):
+        """Recover the rate after a success and settle the token estimate"""
+        with self._lock:
+            self.scale = min(1.0, self.scale + 0.05)
+            if self.tokens is not None and used is not None:
+                self.tokens.give_back(reserved - used)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "queueDepth": sum(s["waiting"] for s in self.flows.values()),
+                "activeFlows": len(self.flows),
+                "rateScale": round(self.scale, 3),
+                "pausedFor": round(max(0.0, self.paused_until - time.monotonic()), 3),
+                **self.counters
+            }
+
+
+def retry_after_seconds(error: Exception, attempt: int) -> Optional[float]:
+    """Back-off for a provider rate-limit error (None for any other error)"""
+    
+    if getattr(error, "status_code", None) != 429:
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for header, unit in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers[header]) * unit
+        except (KeyError, TypeError, ValueError):
+            continue
+    return min(60.0, 2.0 ** attempt) + random.uniform(0, 1)
+
+
+def transient_backoff_seconds(error: Exception, attempt: int) -> Optional[float]:
+    """Back-off for an error the OpenAI SDK would retry (None for any other error).
+    
+    That is a dropped connection or an HTTP 408, 409 or 5xx. Timeouts are
+    not included: the governor's own timeout is the caller's deadline.
+    """
+    
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        transient = status in (408, 409) or status >= 500
+    else:
+        transient = isinstance(error, ConnectionError) or any(
+            cls.__name__ in ("APIConnectionError", "TransportError") for cls in type(error).__mro__
+        )
+    if not transient:
+        return None
+    return min(8.0, 0.5 * 2 ** attempt) + random.uniform(0, 0.25)
+
+
+def response_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None) or {}
+    return usage.get("total_tokens")
+
+
+class LLMRateGovernor:
+    """Per-API-key rate limiters shared by the analysis agents and crews"""
+    
+    def __init__(self, rpm: float, tpm: float, max_retries: int, max_tenants: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max(0, max_retries)
+        self.max_tenants = max_tenants
+        self._limiters: "OrderedDict[str, TenantRateLimiter]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self) -> bool:
+        return self.rpm > 0
+    
+    def retry_delay(self, limiter: Optional[TenantRateLimiter], error: Exception,
+                    attempt: int) -> Optional[float]:
+        """Seconds to sleep before retrying a failed call, or None to give up.
+        
+        A 429 pauses the key's limiter instead, so the wait happens in acquire.
+        """
+        
+        if limiter is None or attempt == self.max_retries:
+            return None
+        delay = retry_after_seconds(error, attempt)
+        if delay is not None:
+            limiter.rate_limited(delay)
+            return 0.0
+        return transient_backoff_seconds(error, attempt)
+    
+    def limiter(self, api_key: str) -> Optional[TenantRateLimiter]:
+        if not self.enabled:
+            return None
+        tenant = key_fingerprint(api_key or "")
+        with self._lock:
+            limiter = self._limiters.get(tenant)
+            if limiter is None:
+                limiter = self._limiters[tenant] = TenantRateLimiter(self.rpm, self.tpm)
+                idle = [t for t, l in self._limiters.items() if not l.flows and t != tenant]
+                for stale in idle[:max(0, len(self._limiters) - self.max_tenants)]:
+                    del self._limiters[stale]
+            self._limiters.move_to_end(tenant)
+            return limiter
+    
+    async def call(self, api_key: str, tokens: int, invoke, timeout: Optional[float] = None):
+        """Run invoke() (returning an awaitable LLM call) within the key's limits.
+        
+        Waiting for budget does not count towards timeout, which applies to
+        each provider call; a call that times out is not retried. Rate-limit
+        and transient errors are retried after backing off (see retry_delay).
+        """
+        
+        limiter = self.limiter(api_key)
+        for attempt in range(self.max_retries + 1):
+            if limiter is not None:
+                with metrics.stage("rate_limit_wait"):
+                    await limiter.acquire(current_flow.get(), tokens)
+            try:
+                with metrics.stage("llm"):
+                    response = await asyncio.wait_for(invoke(), timeout)
+            except asyncio.TimeoutError:
+                raise
+            except Exception as e:
+                delay = self.retry_delay(limiter, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            if limiter is not None:
+                limiter.succeeded(tokens, response_tokens(response))
+            return response
+    
+    def reserve_blocking(self, api_key: str, requests: int, tokens: int):
+        """Take budget for a batch of calls made outside the governor (a crew run)"""
+        
+        limiter = self.limiter(api_key)
+        if limiter is None:
+            return
+        per_call = tokens // max(1, requests)
+        for _ in range(requests):
+            limiter.acquire_blocking(current_flow.get(), per_call)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            limiters = list(self._limiters.items())
+        return {
+            "enabled": self.enabled,
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "queueDepth": sum(limiter.stats()["queueDepth"] for _, limiter in limiters),
+            "tenants": {tenant: limiter.stats() for tenant, limiter in limiters}
+        }
+
+
+llm_governor = LLMRateGovernor(LLM_RPM, LLM_TPM, LLM_RATE_LIMIT_RETRIES, LLM_POOL_MAX_CLIENTS)
+
+
+# ============================================================================
+# EMAIL AUTOMATION
+# ============================================================================
+
+def escape_html(value: str) -> str:
+    """Escape text for an HTML body, keeping its line breaks"""
+    return html.escape(value, quote=True).replace("\r\n", "\n").replace("\n", "<br>\n")
+
+
+def escape_header(value: str) -> str:
+    """Collapse whitespace (including newlines) so text is safe in a mail header"""
+    return " ".join(value.split())
+
+
+def escape_text(value: str) -> str:
+    return value.replace("\r\n", "\n")
+
+
+class CompiledTemplate:
+    """A template parsed once into static text and {{ field }} slots.
+    
+    Rendering joins the static fragments with the escaped field values, so
+    it costs a few string operations per slot. Mark a slot {{ field|safe }}
+    to insert markup that another template has already rendered.
+    """
+    
+    SLOT = re.compile(r"\{\{\s*(\w+)(\|safe)?\s*\}\}")
+    
+    def __init__(self, source: str, escape):
+        self.static: List[str] = []
+        self.slots: List[tuple] = []
+        position = 0
+        for match in self.SLOT.finditer(source):
+            self.static.append(source[position:match.start()])
+            self.slots.append((match.group(1), match.group(2) is not None))
+            position = match.end()
+        self.static.append(source[position:])
+        self.escape = escape
+    
+    def render(self, values: Dict) -> str:
+        escape = self.escape
+        parts = [self.static[0]]
+        for (name, safe), static in zip(self.slots, self.static[1:]):
+            value = str(values[name])
+            parts.append(value if safe else escape(value))
+            parts.append(static)
+        return "".join(parts)
+
+
+class POEmailTemplates:
+    """Purchase order emails (subject, HTML and plain text) from templates compiled once.
+    
+    The header, footer and styling are vendor-independent, so they live in
+    the compiled static fragments and are never rebuilt. Every interpolated
+    value (including LLM-written text) is escaped for where it goes.
+    """
+    
+    SENDER = "AUTONOMOS <onboarding@resend.dev>"
+    
+    HEADER_HTML = """
+        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 20px; border-radius: 10px 10px 0 0;">
+                <h1 style="color: white; margin: 0;">AUTONOMOS Purchase Order</h1>
+            </div>
+            <div style="background: white; padding: 30px; border: 1px solid #e5e7eb; border-top: none; border-radius: 0 0 10px 10px;">
+                <h2 style="color: #1f2937;">Purchase Order Request</h2>
+                <p style="color: #4b5563;">Dear {{ vendor }},</p>
+                """
+    
+    MESSAGE_HTML = """
+                <div style="background: #eff6ff; padding: 15px; border-left: 4px solid #3b82f6; margin: 20px 0;">
+                    <p style="margin: 0; color: #1e40af; font-size: 14px;">
+                        <strong>Message:</strong><br>
+                        {{ message }}
+                    </p>
+                </div>
+                """
+    
+    FOOTER_HTML = """
+                <p style="color: #4b5563; margin-top: 30px;">
+                    Please confirm availability and estimated delivery timeline at your earliest convenience.
+                </p>
+                
+                <p style="color: #4b5563;">
+                    Best regards,<br>
+                    <strong>AUTONOMOS AI Operations Manager</strong>
+                </p>
+                
+                <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 30px 0;">
+                
+                <p style="color: #9ca3af; font-size: 12px; text-align: center;">
+                    This email was automatically generated by AUTONOMOS<br>
+                    Agentic Operations Manager for MSMEs
+                </p>
+            </div>
+        </div>
+        """
+    
+    ITEM_HTML = HEADER_HTML + """
+                <div style="background: #f3f4f6; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                    <table style="width: 100%; border-collapse: collapse;">
+                        <tr>
+                            <td style="padding: 10px 0; color: #6b7280; font-weight: bold;">Item:</td>
+                            <td style="padding: 10px 0; color: #1f2937;">{{ item }}</td>
+                        </tr>
+                        <tr>
+                            <td style="padding: 10px 0; color: #6b7280; font-weight: bold;">Quantity:</td>
+                            <td style="padding: 10px 0; color: #1f2937;">{{ quantity }} units</td>
+                        </tr>
+                        <tr>
+                            <td style="padding: 10px 0; color: #6b7280; font-weight: bold;">Estimated Cost:</td>
+                            <td style="padding: 10px 0; color: #1f2937; font-size: 18px; font-weight: bold;">${{ cost }}</td>
+                        </tr>
+                        <tr>
+                            <td style="padding: 10px 0; color: #6b7280; font-weight: bold;">Urgency:</td>
+                            <td style="padding: 10px 0;">
+                                <span style="background: #ef4444; color: white; padding: 4px 12px; border-radius: 12px; font-size: 12px;">
+                                    {{ urgency }}
+                                </span>
+                            </td>
+                        </tr>
+                    </table>
+                </div>
+                """ + MESSAGE_HTML + FOOTER_HTML
+    
+    ORDER_ROW_HTML = """
+                        <tr>
+                            <td style="padding: 8px 0; color: #1f2937;">{{ item }}</td>
+                            <td style="padding: 8px 0; color: #1f2937; text-align: right;">{{ quantity }}</td>
+                            <td style="padding: 8px 0; color: #1f2937; text-align: right;">${{ cost }}</td>
+                            <td style="padding: 8px 0; color: #6b7280; text-align: right;">{{ urgency }}</td>
+                        </tr>"""
+    
+    ORDER_HTML = HEADER_HTML + """
+                <div style="background: #f3f4f6; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                    <table style="width: 100%; border-collapse: collapse;">
+                        <tr>
+                            <th style="padding: 8px 0; color: #6b7280; text-align: left;">Item</th>
+                            <th style="padding: 8px 0; color: #6b7280; text-align: right;">Quantity</th>
+                            <th style="padding: 8px 0; color: #6b7280; text-align: right;">Estimated Cost</th>
+                            <th style="padding: 8px 0; color: #6b7280; text-align: right;">Urgency</th>
+                        </tr>{{ rows|safe }}
+                        <tr style="border-top: 1px solid #d1d5db;">
+                            <td style="padding: 10px 0; color: #1f2937; font-weight: bold;">Total</td>
+                            <td style="padding: 10px 0; color: #1f2937; font-weight: bold; text-align: right;">{{ quantity }}</td>
+                            <td style="padding: 10px 0; color: #1f2937; font-size: 18px; font-weight: bold; text-align: right;">${{ cost }}</td>
+                            <td></td>
+                        </tr>
+                    </table>
+                </div>
+                """ + MESSAGE_HTML + FOOTER_HTML
+    
+    ITEM_TEXT = """AUTONOMOS Purchase Order Request
+
+Dear {{ vendor }},
+
+Item: {{ item }}
+Quantity: {{ quantity }} units
+Estimated Cost: ${{ cost }}
+Urgency: {{ urgency }}
+
+Message:
+{{ message }}
+
+Please confirm availability and estimated delivery timeline at your earliest convenience.
+
+Best regards,
+AUTONOMOS AI Operations Manager
+
+--
+This email was automatically generated by AUTONOMOS, Agentic Operations Manager for MSMEs
+"""
+    
+    ORDER_ROW_TEXT = "- {{ item }}: {{ quantity }} units, ${{ cost }} ({{ urgency }})\n"
+    
+    ORDER_TEXT = """AUTONOMOS Purchase Order Request
+
+Dear {{ vendor }},
+
+{{ rows|safe }}
+Total: {{ quantity }} units, ${{ cost }}
+
+Message:
+{{ message }}
+
+Please confirm availability and estimated delivery timeline at your earliest convenience.
+
+Best regards,
+AUTONOMOS AI Operations Manager
+
+--
+This email was automatically generated by AUTONOMOS, Agentic Operations Manager for MSMEs
+"""
+    
+    ITEM_SUBJECT = "Purchase Order: {{ item }} - {{ urgency }} Priority"
+    ORDER_SUBJECT = "Purchase Order: {{ lines }} items from {{ vendor }} - {{ urgency }} Priority"
+    
+    def __init__(self):
+        self.item_html = CompiledTemplate(self.ITEM_HTML, escape_html)
+        self.item_text = CompiledTemplate(self.ITEM_TEXT, escape_text)
+        self.item_subject = CompiledTemplate(self.ITEM_SUBJECT, escape_header)
+        self.order_html = CompiledTemplate(self.ORDER_HTML, escape_html)
+        self.order_text = CompiledTemplate(self.ORDER_TEXT, escape_text)
+        self.order_subject = CompiledTemplate(self.ORDER_SUBJECT, escape_header)
+        self.row_html = CompiledTemplate(self.ORDER_ROW_HTML, escape_html)
+        self.row_text = CompiledTemplate(self.ORDER_ROW_TEXT, escape_text)
+    
+    @staticmethod
+    def line_values(line: Dict) -> Dict:
+        return {
+            "item": line["item"],
+            "quantity": line["quantity"],
+            "cost": f"{line['cost']:.2f}",
+            "urgency": line["urgency"]
+        }
+    
+    def message(self, subject: str, html_body: str, text_body: str, user_email: str) -> Dict:
+        return {"from": self.SENDER, "to": [user_email], "subject": subject, "html": html_body, "text": text_body}
+    
+    def render_item(self, decision: Dict, user_email: str) -> Dict:
+        """The email for a single decision"""
+        values = self.line_values(decision)
+        values["vendor"] = decision["vendor"]
+        values["message"] = decision["vendorEmail"]
+        return self.message(self.item_subject.render(values), self.item_html.render(values),
+                            self.item_text.render(values), user_email)
+    
+    def render_order(self, order: Dict, user_email: str) -> Dict:
+        """The email for a vendor order; single-line orders use the item layout"""
+        
+        if len(order["lines"]) == 1:
+            return self.render_item(order["lines"][0], user_email)
+        
+        lines = [self.line_values(line) for line in order["lines"]]
+        values = {
+            "vendor": order["vendor"],
+            "lines": len(lines),
+            "quantity": order["quantity"],
+            "cost": f"{order['cost']:.2f}",
+            "urgency": order["urgency"],
+            "message": order["message"]
+        }
+        subject = self.order_subject.render(values)
+        values["rows"] = "".join(self.row_html.render(line) for line in lines)
+        html_body = self.order_html.render(values)
+        values["rows"] = "".join(self.row_text.render(line) for line in lines)
+        return self.message(subject, html_body, self.order_text.render(values), user_email)
+    
+    def render_batch(self, orders: List[Dict], user_email: str) -> List[Dict]:
+        """Emails for many vendor orders to the same recipient"""
+        render = self.render_order
+        return [render(order, user_email) for order in orders]
+
+
+po_email_templates = POEmailTemplates()
+
+
+class EmailAutomation:
+    """Handle automated email sending via Resend"""
+    
+    ORDER_MESSAGE_TEMPLATE = (
+        "Please supply the {lines} items listed above, {quantity} units in total with an "
+        "estimated value of ${total:.2f}. {urgent}Kindly confirm availability and your "
+        "expected delivery date."
+    )
+    
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key
+    
+    @instrumented("email_send")
+    def send_vendor_email(self, decision: Dict, user_email: str) -> Dict:
+        """Send email to vendor (or user for demo)"""
+        
+        resend = resend_sdk()
+        if not self.api_key or not resend:
+            return {
+                "success": True,
+                "simulated": True,
+                "message": "Email simulated (Resend not configured)"
+            }
+        
+        try:
+            email = call_resend(self.api_key, resend.Emails.send, self.build_email(decision, user_email))
+            
+            return {
+                "success": True,
+                "simulated": False,
+                "email_id": email.get('id'),
+                "message": "Email sent successfully"
+            }
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "simulated": False,
+                "error": str(e),
+                "message": f"Email failed: {str(e)}"
+            }
+    
+    def build_email(self, decision: Dict, user_email: str) -> Dict:
+        """Build the Resend parameters for a purchase order email"""
+        return po_email_templates.render_item(decision, user_email)
+    
+    @classmethod
+    def order_message(cls, order: Dict) -> str:
+        """Cover text for a multi-line PO written without an LLM call"""
+        urgent = [line["item"] for line in order["lines"] if line["urgency"] in ("CRITICAL", "HIGH")]
+        return cls.ORDER_MESSAGE_TEMPLATE.format(
+            lines=len(order["lines"]),
+            quantity=order["quantity"],
+            total=order["cost"],
+            urgent=f"{', '.join(urgent)} {'is' if len(urgent) == 1 else 'are'} needed urgently. " if urgent else ""
+        )
+
+
+# ============================================================================
+# EXECUTION LAYER
+# ============================================================================
+
+class BlockingExecutor:
+    """Bounded thread pools that keep blocking SDK calls off the event loop.
+    
+    CrewAI's kickoff, the Resend SDK and SQLite are synchronous. Each kind of work
+    gets its own pool so a burst of emails cannot starve crew runs (and vice
+    versa), and neither can stall unrelated requests on the same worker.
+    """
+    
+    def __init__(self, sizes: Dict[str, int]):
+        self.sizes = {name: max(1, size) for name, size in sizes.items()}
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+    
+    def pool(self, name: str) -> ThreadPoolExecutor:
+        """Return the named pool, creating it on first use"""
+        if name not in self._pools:
+            self._pools[name] = ThreadPoolExecutor(
+                max_workers=self.sizes[name],
+                thread_name_prefix=f"autonomos-{name}"
+            )
+        return self._pools[name]
+    
+    async def run(self, pool_name: str, func, *args, **kwargs):
+        """Run ``func`` on the named pool and await its result"""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self.pool(pool_name), ctx.run, call)
+    
+    def shutdown(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pools.clear()
+
+
+blocking_executor = BlockingExecutor({
+    "agent": AGENT_WORKERS,
+    "email": EMAIL_WORKERS,
+    "ledger": LEDGER_WORKERS
+})
+
+
+# ============================================================================
+# PROCUREMENT LEDGER
+# ============================================================================
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """Parse an ISO date or datetime query parameter into epoch seconds"""
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp: {value}")
+
+
+class ProcurementLedger:
+    """Durable record of agent decisions, purchase orders and their emails.
+    
+    Backed by SQLite in WAL mode so audit queries do not block writers.
+    Rows belong to a tenant (the fingerprint of the OpenAI API key the
+    analysis ran with) and every query is scoped to one. Every decision is
+    appended, and each reorder that actually goes out opens a purchase
+    order that stays open until it is received (explicitly, or once an
+    analysis sees the item back above its reorder point) or cancelled. An
+    item with an open PO whose email did not fail is not reordered for
+    that tenant.
+    List queries are newest first with keyset pagination on the row id, so
+    deep pages cost the same as the first one.
+    """
+    
+    # Stay under SQLite's default limit of 999 bound parameters
+    MAX_PARAMS = 900
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS decisions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tenant TEXT,
+                item_id INTEGER,
+                item TEXT NOT NULL,
+                vendor TEXT,
+                decision TEXT NOT NULL,
+                urgency TEXT,
+                quantity INTEGER,
+                cost REAL,
+                decided_by TEXT,
+                source TEXT,
+                created_at REAL NOT NULL,
+                payload TEXT NOT NULL
+            );
+            
+            CREATE TABLE IF NOT EXISTS purchase_orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tenant TEXT,
+                decision_id INTEGER REFERENCES decisions (id),
+                item_id INTEGER,
+                item TEXT NOT NULL,
+                vendor TEXT,
+                vendor_email TEXT,
+                quantity INTEGER,
+                cost REAL,
+                status TEXT NOT NULL,
+                email_key TEXT,
+                email_status TEXT,
+                email_id TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+        # Ledgers written before rows were scoped to a tenant
+        for table in ("decisions", "purchase_orders"):
+            columns = {row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if "tenant" not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN tenant TEXT")
+        self._conn.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_decisions_tenant ON decisions (tenant, id);
+            CREATE INDEX IF NOT EXISTS idx_decisions_item ON decisions (item);
+            CREATE INDEX IF NOT EXISTS idx_decisions_vendor ON decisions (vendor);
+            CREATE INDEX IF NOT EXISTS idx_decisions_decision ON decisions (decision);
+            CREATE INDEX IF NOT EXISTS idx_decisions_created ON decisions (created_at);
+            
+            CREATE INDEX IF NOT EXISTS idx_orders_tenant_item ON purchase_orders (tenant, item_id, status);
+            CREATE INDEX IF NOT EXISTS idx_orders_tenant ON purchase_orders (tenant, id);
+            CREATE INDEX IF NOT EXISTS idx_orders_vendor ON purchase_orders (vendor);
+            CREATE INDEX IF NOT EXISTS idx_orders_status ON purchase_orders (status);
+            CREATE INDEX IF NOT EXISTS idx_orders_created ON purchase_orders (created_at);
+            CREATE INDEX IF NOT EXISTS idx_orders_email_key ON purchase_orders (email_key);
+        """)
+        self._conn.commit()
+    
+    def record_decisions(self, tenant: str, decisions: List[Dict], source: str):
+        """Append decisions in one transaction and tag each with its decisionId"""
+        now = time.time()
+        with self._lock:
+            for decision in decisions:
+                decision["decisionId"] = self._conn.execute(
+                    "INSERT INTO decisions (tenant, item_id, item, vendor, decision, urgency, quantity, cost, "
+                    "decided_by, source, created_at, payload) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (tenant, decision.get("itemId"), decision["item"], decision.get("vendor"), decision["decision"],
+                     decision.get("urgency"), decision.get("quantity"), decision.get("cost"),
+                     decision.get("decidedBy"), source, now, json.dumps(decision))
+                ).lastrowid
+            self._conn.commit()
+    
+    def open_orders(self, tenant: str, item_ids: List[int]) -> Dict[int, Dict]:
+        """The tenant's open, not-failed purchase orders for the given item ids"""
+        ids = list(dict.fromkeys(item_ids))
+        found: Dict[int, Dict] = {}
+        with self._lock:
+            for start in range(0, len(ids), self.MAX_PARAMS):
+                chunk = ids[start:start + self.MAX_PARAMS]
+                rows = self._conn.execute(
+                    f"SELECT * FROM purchase_orders WHERE tenant = ? AND status = 'open' "
+                    f"AND COALESCE(email_status, '') != 'failed' "
+                    f"AND item_id IN ({', '.join('?' * len(chunk))}) ORDER BY id",
+                    [tenant] + chunk
+                ).fetchall()
+                found.update((row["item_id"], self.order_from_row(row)) for row in rows)
+        return found
+    
+    def last_closed_orders(self, tenant: str, item_ids: List[int]) -> Dict[int, int]:
+        """Id of the tenant's latest received or cancelled purchase order per item"""
+        ids = list(dict.fromkeys(item_ids))
+        found: Dict[int, int] = {}
+        with self._lock:
+            for start in range(0, len(ids), self.MAX_PARAMS):
+                chunk = ids[start:start + self.MAX_PARAMS]
+                rows = self._conn.execute(
+                    f"SELECT item_id, MAX(id) AS order_id FROM purchase_orders WHERE tenant = ? "
+                    f"AND status != 'open' AND item_id IN ({', '.join('?' * len(chunk))}) GROUP BY item_id",
+                    [tenant] + chunk
+                ).fetchall()
+                found.update((row["item_id"], row["order_id"]) for row in rows)
+        return found
+    
+    def open_item_ids(self, tenant: str) -> set:
+        """Ids of the items the tenant has an open purchase order for"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT item_id FROM purchase_orders WHERE tenant = ? AND status = 'open'", (tenant,)
+            ).fetchall()
+        return {row["item_id"] for row in rows}
+    
+    def receive_items(self, tenant: str, item_ids: List[int]) -> int:
+        """Mark the tenant's open orders for these items received; returns how many were"""
+        ids = list(dict.fromkeys(item_ids))
+        received = 0
+        with self._lock:
+            for start in range(0, len(ids), self.MAX_PARAMS):
+                chunk = ids[start:start + self.MAX_PARAMS]
+                received += self._conn.execute(
+                    f"UPDATE purchase_orders SET status = 'received', updated_at = ? "
+                    f"WHERE tenant = ? AND status = 'open' AND item_id IN ({', '.join('?' * len(chunk))})",
+                    [time.time(), tenant] + chunk
+                ).rowcount
+            self._conn.commit()
+        return received
+    
+    def create_orders(self, tenant: str, orders: List[tuple]):
+        """Open a purchase order per (decision, email status) pair in one transaction"""
+        now = time.time()
+        with self._lock:
+            for decision, email in orders:
+                decision["purchaseOrderId"] = self._conn.execute(
+                    "INSERT INTO purchase_orders (tenant, decision_id, item_id, item, vendor, vendor_email, "
+                    "quantity, cost, status, email_key, email_status, email_id, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'open', ?, ?, ?, ?, ?)",
+                    (tenant, decision.get("decisionId"), decision.get("itemId"), decision["item"], decision.get("vendor"),
+                     decision.get("vendorEmailAddress"), decision.get("quantity"), decision.get("cost"),
+                     email.get("idempotencyKey"), email.get("status"), email.get("emailId"), now, now)
+                ).lastrowid
+            self._conn.commit()
+    
+    def update_email_status(self, updates: List[tuple]):
+        """Apply (email key, status, provider id) updates to open orders"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE purchase_orders SET email_status = ?, email_id = COALESCE(?, email_id), updated_at = ? "
+                "WHERE email_key = ? AND status = 'open'",
+                [(status, email_id, time.time(), key) for key, status, email_id in updates]
+            )
+            self._conn.commit()
+    
+    def get_order(self, tenant: str, order_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM purchase_orders WHERE id = ? AND tenant = ?", (order_id, tenant)
+            ).fetchone()
+        return self.order_from_row(row) if row is not None else None
+    
+    def close_order(self, tenant: str, order_id: int, status: str) -> Optional[Dict]:
+        """Move an open order to received or cancelled; None if it is not open"""
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE purchase_orders SET status = ?, updated_at = ? "
+                "WHERE id = ? AND tenant = ? AND status = 'open'",
+                (status, time.time(), order_id, tenant)
+            ).rowcount
+            self._conn.commit()
+        return self.get_order(tenant, order_id) if updated else None
+    
+    def _page(self, table: str, filters: Dict, since: Optional[float], until: Optional[float],
+              cursor: Optional[int], limit: int) -> tuple:
+        clauses = [f"{column} = ?" for column, value in filters.items() if value is not None]
+        params: list = [value for value in filters.values() if value is not None]
+        for clause, value in (("created_at >= ?", since), ("created_at < ?", until), ("id < ?", cursor)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        limit = max(1, min(limit, LEDGER_PAGE_MAX))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM {table} {where} ORDER BY id DESC LIMIT ?", params + [limit + 1]
+            ).fetchall()
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return rows[:limit], next_cursor
+    
+    def list_decisions(self, tenant: str, item: Optional[str] = None, vendor: Optional[str] = None,
+                       decision: Optional[str] = None, since: Optional[float] = None,
+                       until: Optional[float] = None, cursor: Optional[int] = None,
+                       limit: int = 100) -> Dict:
+        rows, next_cursor = self._page(
+            "decisions", {"tenant": tenant, "item": item, "vendor": vendor, "decision": decision},
+            since, until, cursor, limit
+        )
+        return {
+            "decisions": [
+                {**json.loads(row["payload"]), "decisionId": row["id"], "source": row["source"],
+                 "recordedAt": datetime.fromtimestamp(row["created_at"]).isoformat()}
+                for row in rows
+            ],
+            "nextCursor": next_cursor
+        }
+    
+    def list_orders(self, tenant: str, status: Optional[str] = None, item: Optional[str] = None,
+                    vendor: Optional[str] = None, since: Optional[float] = None,
+                    until: Optional[float] = None, cursor: Optional[int] = None,
+                    limit: int = 100) -> Dict:
+        rows, next_cursor = self._page(
+            "purchase_orders", {"tenant": tenant, "status": status, "item": item, "vendor": vendor},
+            since, until, cursor, limit
+        )
+        return {"orders": [self.order_from_row(row) for row in rows], "nextCursor": next_cursor}
+    
+    @staticmethod
+    def order_from_row(row) -> Dict:
+        return {
+            "purchaseOrderId": row["id"],
+            "decisionId": row["decision_id"],
+            "itemId": row["item_id"],
+            "item": row["item"],
+            "vendor": row["vendor"],
+            "vendorEmailAddress": row["vendor_email"],
+            "quantity": row["quantity"],
+            "cost": row["cost"],
+            "status": row["status"],
+            "emailKey": row["email_key"],
+            "emailStatus": row["email_status"],
+            "emailId": row["email_id"],
+            "createdAt": datetime.fromtimestamp(row["created_at"]).isoformat(),
+            "updatedAt": datetime.fromtimestamp(row["updated_at"]).isoformat()
+        }
+
+
+procurement_ledger = ProcurementLedger(LEDGER_PATH) if LEDGER_PATH else None
+
+
+# ============================================================================
+# EMAIL DISPATCH QUEUE
+# ============================================================================
+
+class ResendTransport:
+    """Deliver queued messages through the Resend API"""
+    
+    def available(self, api_key: Optional[str]) -> bool:
+        return bool(api_key and resend_sdk())
+    
+    @instrumented("email_send")
+    def send_batch(self, api_key: str, messages: List[Dict]) -> List[Optional[str]]:
+        """Send messages in one call where possible; returns provider ids"""
+        resend = resend_sdk()
+        if len(messages) > 1 and hasattr(resend, "Batch"):
+            response = call_resend(api_key, resend.Batch.send, messages)
+            return [entry.get("id") for entry in response.get("data", [])]
+        return [call_resend(api_key, resend.Emails.send, message).get("id") for message in messages]
+
+
+class FileTransport:
+    """Local stand-in transport that appends messages to an NDJSON outbox"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+    
+    @instrumented("email_send")
+    def send_batch(self, api_key: str, messages: List[Dict]) -> List[Optional[str]]:
+        ids = [f"local-{uuid.uuid4().hex}" for _ in messages]
+        with self._lock, open(self.path, "a", encoding="utf-8") as outbox:
+            for email_id, message in zip(ids, messages):
+                outbox.write(json.dumps({"id": email_id, "sentAt": datetime.now().isoformat(), **message}) + "\n")
+        return ids
+    
+    def available(self, api_key: Optional[str]) -> bool:
+        return True
+
+
+class EmailDispatchQueue:
+    """Background delivery of PO emails with batching, retries and dedup.
+    
+    A message carries one vendor's PO, which may have several lines. Each
+    gets an idempotency key derived from the PO lines, the recipient and
+    the day, so re-running an analysis does not send the same
+    PO twice. Lines reordering an item whose earlier PO was closed carry
+    that PO's id (reorderOf) into the key, so the new order is sent. Workers drain the queue in batches per API key, send them on
+    the email thread pool and retry failures with exponential backoff.
+    """
+    
+    # Finished jobs kept for status lookups and deduplication
+    MAX_TRACKED_JOBS = 10000
+    
+    def __init__(self, transport, workers: int, batch_size: int,
+                 max_attempts: int, base_delay: float, ledger: Optional[ProcurementLedger] = None):
+        self.transport = transport
+        self.ledger = ledger
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.counters = {"submitted": 0, "deduplicated": 0, "sent": 0, "retried": 0, "failed": 0}
+    
+    @staticmethod
+    def make_key(order: Dict, user_email: str) -> str:
+        fields = {
+            "vendor": order["vendor"],
+            "lines": sorted([line["item"], line["quantity"], line["cost"]] for line in order["lines"]),
+            "to": user_email,
+            "day": datetime.now().date().isoformat()
+        }
+        reorder_of = sorted(line["reorderOf"] for line in order["lines"] if line.get("reorderOf") is not None)
+        if reorder_of:
+            fields["reorderOf"] = reorder_of
+        return DecisionCache.make_key(fields)
+    
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+    
+    def is_pending_or_sent(self, key: str) -> bool:
+        job = self._jobs.get(key)
+        return job is not None and job["status"] != "failed"
+    
+    def submit_order(self, order: Dict, user_email: str, api_key: Optional[str],
+                     key: Optional[str] = None, message: Optional[Dict] = None) -> Dict:
+        """Queue the PO email for a vendor order and return its current status"""
+        
+        key = key or self.make_key(order, user_email)
+        if self.is_pending_or_sent(key):
+            self.counters["deduplicated"] += 1
+            return {**self.public_status(self._jobs[key]), "deduplicated": True}
+        
+        job = {
+            "key": key,
+            "vendor": order["vendor"],
+            "items": [line["item"] for line in order["lines"]],
+            "to": user_email,
+            "status": "queued",
+            "attempts": 0,
+            "queuedAt": datetime.now().isoformat(),
+            "apiKey": api_key,
+            "message": message or po_email_templates.render_order(order, user_email)
+        }
+        self._jobs[key] = job
+        self._jobs.move_to_end(key)
+        self.counters["submitted"] += 1
+        self._trim()
+        
+        if not self.transport.available(api_key):
+            job["status"] = "simulated"
+            return self.public_status(job)
+        
+        self._ensure_started()
+        self._queue.put_nowait(job)
+        return self.public_status(job)
+    
+    def _trim(self):
+        """Forget the oldest finished jobs once too many are tracked"""
+        excess = len(self._jobs) - self.MAX_TRACKED_JOBS
+        for key in [k for k, job in self._jobs.items() if job["status"] in ("sent", "failed", "simulated")][:max(0, excess)]:
+            del self._jobs[key]
+    
+    def submit_orders(self, orders: List[Dict], user_email: str, api_key: Optional[str]) -> List[Dict]:
+        """Queue several vendor orders, rendering the emails not already queued in one batch"""
+        
+        keys = [self.make_key(order, user_email) for order in orders]
+        fresh = [i for i, key in enumerate(keys) if not self.is_pending_or_sent(key)]
+        messages = dict(zip(fresh, po_email_templates.render_batch([orders[i] for i in fresh], user_email)))
+        return [self.submit_order(order, user_email, api_key, keys[i], messages.get(i))
+                for i, order in enumerate(orders)]
+    
+    async def _worker(self):
+        current_trace.set(None)  # not part of the request that started the worker
+        while True:
+            job = await self._queue.get()
+            batch = [job]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            by_key: Dict[Optional[str], List[Dict]] = {}
+            for queued in batch:
+                by_key.setdefault(queued["apiKey"], []).append(queued)
+            try:
+                for api_key, jobs in by_key.items():
+                    await self._deliver(api_key, jobs)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    async def _deliver(self, api_key: Optional[str], jobs: List[Dict]):
+        for job in jobs:
+            job["status"] = "sending"
+            job["attempts"] += 1
+        try:
+            ids = await blocking_executor.run(
+                "email", self.transport.send_batch, api_key, [job["message"] for job in jobs]
+            )
+        except Exception as e:
+            await self._report([job for job in jobs if self._retry_or_fail(job, str(e))])
+            return
+        
+        for job, email_id in zip(jobs, list(ids) + [None] * (len(jobs) - len(ids))):
+            job["status"] = "sent"
+            job["emailId"] = email_id
+            job["sentAt"] = datetime.now().isoformat()
+            job.pop("error", None)
+            self.counters["sent"] += 1
+        await self._report(jobs)
+    
+    def _retry_or_fail(self, job: Dict, error: str) -> bool:
+        """Requeue a job after a backoff; returns True if it has failed for good instead"""
+        job["error"] = error
+        if job["attempts"] >= self.max_attempts:
+            job["status"] = "failed"
+            self.counters["failed"] += 1
+            return True
+        
+        job["status"] = "retrying"
+        self.counters["retried"] += 1
+        delay = min(60.0, self.base_delay * 2 ** (job["attempts"] - 1))
+        delay += random.uniform(0, self.base_delay)
+        job["nextAttemptAt"] = datetime.fromtimestamp(time.time() + delay).isoformat()
+        asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job)
+        return False
+    
+    async def _report(self, jobs: List[Dict]):
+        """Mirror final delivery states onto the ledger's purchase orders"""
+        if self.ledger is not None and jobs:
+            await blocking_executor.run("ledger", self.ledger.update_email_status,
+                                        [(job["key"], job["status"], job.get("emailId")) for job in jobs])
+    
+    @staticmethod
+    def public_status(job: Dict) -> Dict:
+        status = {k: v for k, v in job.items() if k not in ("apiKey", "message", "key")}
+        status["idempotencyKey"] = job["key"]
+        status["success"] = job["status"] != "failed"
+        status["simulated"] = job["status"] == "simulated"
+        return status
+    
+    def status(self, key: str) -> Optional[Dict]:
+        job = self._jobs.get(key)
+        return self.public_status(job) if job is not None else None
+    
+    def stats(self) -> Dict:
+        by_status: Dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job["status"]] = by_status.get(job["status"], 0) + 1
+        return {
+            "transport": type(self.transport).__name__,
+            "queueDepth": self._queue.qsize() if self._queue is not None else 0,
+            "byStatus": by_status,
+            **self.counters
+        }
+    
+    async def stop(self, grace: float = 5.0):
+        """Give queued sends a short grace period, then stop the workers"""
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), grace)
+            except asyncio.TimeoutError:
+                pass
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._queue = None
+
+
+def create_email_transport(name: str):
+    """Build the transport selected by AUTONOMOS_EMAIL_TRANSPORT"""
+    if name == "file":
+        return FileTransport(EMAIL_OUTBOX_PATH)
+    return ResendTransport()
+
+
+email_queue = EmailDispatchQueue(
+    create_email_transport(EMAIL_TRANSPORT),
+    workers=EMAIL_QUEUE_WORKERS,
+    batch_size=EMAIL_BATCH_SIZE,
+    max_attempts=EMAIL_MAX_ATTEMPTS,
+    base_delay=EMAIL_RETRY_BASE_DELAY,
+    ledger=procurement_ledger
+)
+
+
+def vendor_order(lines: List[Dict], message: Optional[str] = None) -> Dict:
+    """One vendor's purchase order made of approved decisions, with totals"""
+    return {
+        "vendor": lines[0]["vendor"],
+        "vendorEmailAddress": lines[0].get("vendorEmailAddress"),
+        "lines": lines,
+        "quantity": sum(line["quantity"] for line in lines),
+        "cost": round(sum(line["cost"] for line in lines), 2),
+        "urgency": min((line["urgency"] for line in lines), key=URGENCY_LEVELS.index),
+        "message": message if message is not None else lines[0]["vendorEmail"]
+    }
+
+
+async def consolidate_orders(decisions: List[Dict], agent=None) -> List[Dict]:
+    """Group approved decisions into one order per vendor and write their cover text.
+    
+    Multi-line orders get a templated message, or with AUTONOMOS_PO_MESSAGE=llm
+    and an agent, one LLM-written message per vendor (the template again if
+    that call fails). With consolidation off every decision is its own order.
+    """
+    
+    if not PO_CONSOLIDATION:
+        return [vendor_order([decision]) for decision in decisions]
+    
+    groups: Dict[tuple, List[Dict]] = {}
+    for decision in decisions:
+        groups.setdefault((decision["vendor"], decision.get("vendorEmailAddress")), []).append(decision)
+    orders = [vendor_order(lines) for lines in groups.values()]
+    
+    multi_line = [order for order in orders if len(order["lines"]) > 1]
+    for order in multi_line:
+        order["message"] = EmailAutomation.order_message(order)
+    if PO_MESSAGE_MODE == "llm" and agent is not None and multi_line:
+        messages = await asyncio.gather(
+            *(agent.acompose_po_message(order["vendor"], order["lines"]) for order in multi_line),
+            return_exceptions=True
+        )
+        for order, message in zip(multi_line, messages):
+            if isinstance(message, Exception):
+                logger.warning("PO message for %r fell back to the template: %s", order["vendor"], message)
+            else:
+                order["message"] = message
+    return orders
+
+
+async def record_decisions(decisions: List[Dict], tenant: str, source: str):
+    """Count decisions and append them to the tenant's ledger in one transaction"""
+    for decision in decisions:
+        metrics.inc("autonomos_decisions_total", decision=decision["decision"], decided_by=decision["decidedBy"])
+    if procurement_ledger is not None and decisions:
+        await blocking_executor.run("ledger", procurement_ledger.record_decisions, tenant, decisions, source)
+
+
+def restocked_items(inventory, item_ids: set) -> List[int]:
+    """Which of item_ids are in the inventory above their reorder point"""
+    if isinstance(inventory, list):
+        return [item.id for item in inventory if item.id in item_ids and item.stock > item.reorderPoint]
+    frame = inventory
+    above = frame["id"].isin(list(item_ids)) & (frame["stock"] > frame["reorderPoint"])
+    return [int(item_id) for item_id in frame.loc[above, "id"]]
+
+
+def receive_restocked_items(ledger: ProcurementLedger, tenant: str, inventory) -> int:
+    """Close the tenant's open POs for items restocked in the inventory; returns how many were"""
+    open_ids = ledger.open_item_ids(tenant)
+    return ledger.receive_items(tenant, restocked_items(inventory, open_ids)) if open_ids else 0
+
+
+async def receive_restocked(tenant: str, inventory):
+    """Close the tenant's open POs for items an analysis sees restocked, allowing reorders again"""
+    if procurement_ledger is None:
+        return
+    received = await blocking_executor.run("ledger", receive_restocked_items, procurement_ledger, tenant, inventory)
+    if received:
+        metrics.inc("autonomos_purchase_orders_total", received, kind="received")
+
+
+async def order_approved(decisions: List[Dict], tenant: str, user_email: Optional[str],
+                         api_key: Optional[str], agent=None):
+    """Order each auto-approved item with no PO in flight, one PO email per vendor.
+    
+    An order goes out (a PO per item line is opened and the vendor's email
+    queued) only when a user_email is given. Items that still have an open
+    purchase order of the same tenant are marked reorderSuppressed and
+    point at that order instead; items whose last PO was closed point at
+    it as reorderOf. Lines sharing an email share its emailStatus.
+    """
+    
+    approved = [decision for decision in decisions if decision["decision"] == "AUTO_APPROVE"]
+    if not approved:
+        return
+    
+    in_flight = (await blocking_executor.run("ledger", procurement_ledger.open_orders,
+                                             tenant, [d["itemId"] for d in approved])
+                 if procurement_ledger is not None else {})
+    to_order = []
+    for decision in approved:
+        open_order = in_flight.get(decision["itemId"])
+        if open_order is not None:
+            decision["reorderSuppressed"] = True
+            decision["openPurchaseOrder"] = open_order
+        else:
+            to_order.append(decision)
+    if not to_order or not user_email:
+        return
+    if procurement_ledger is not None:
+        closed = await blocking_executor.run("ledger", procurement_ledger.last_closed_orders,
+                                             tenant, [d["itemId"] for d in to_order])
+        for decision in to_order:
+            if decision["itemId"] in closed:
+                decision["reorderOf"] = closed[decision["itemId"]]
+    
+    ordered = []
+    orders = await consolidate_orders(to_order, agent)
+    for order, status in zip(orders, email_queue.submit_orders(orders, user_email, api_key)):
+        metrics.inc("autonomos_purchase_orders_total", kind="emails")
+        metrics.inc("autonomos_purchase_orders_total", len(order["lines"]), kind="lines")
+        for line in order["lines"]:
+            line["emailStatus"] = status
+            ordered.append((line, status))
+    if procurement_ledger is not None:
+        await blocking_executor.run("ledger", procurement_ledger.create_orders, tenant, ordered)
+
 
-Respond ONLY with valid JSON in this format:
-{
-  "decision": "AUTO_APPROVE" or "ESCALATE",
-  "reasoning": "brief 2-3 sentence explanation",
-  "vendorEmail": "professional email body for purchase order"
-}"""),
-            HumanMessage(content=f"""
-Analyze this inventory situation:
+async def place_orders(decisions: List[Dict], tenant: str, user_email: Optional[str],
+                       api_key: Optional[str], source: str, agent=None):
+    """Record decisions, then order what was auto-approved (see order_approved)"""
+    await record_decisions(decisions, tenant, source)
+    await order_approved(decisions, tenant, user_email, api_key, agent)
 
-Item: {item.name}
-Current Stock: {item.stock} units
-Reorder Point: {item.reorderPoint} units
-Daily Sales: {item.salesPerDay} units/day
-Days Until Stockout: {days_until_stockout:.1f} days
-Recommended Order: {recommended_quantity} units
-Total Cost: ${total_cost}
-Vendor: {item.vendor}
-Urgency: {urgency}
 
-Make your decision now.""")
-        ])
-        
-        response = self.llm.invoke(prompt.format_messages())
-        
-        # Parse JSON response
-        content = response.content.strip()
-        if content.startswith("```json"):
-            content = content.replace("```json", "").replace("```", "").strip()
-        
-        decision_data = json.loads(content)
-        
-        return {
-            "item": item.name,
-            "decision": decision_data["decision"],
-            "reasoning": decision_data["reasoning"],
-            "vendorEmail": decision_data["vendorEmail"],
-            "quantity": recommended_quantity,
-            "cost": total_cost,
-            "urgency": urgency,
-            "vendor": item.vendor,
-            "vendorEmailAddress": item.vendorEmail,
-            "daysUntilStockout": days_until_stockout
-        }
+# ============================================================================
+# BACKGROUND JOBS
+# ============================================================================
 
+class JobCancelled(Exception):
+    """Raised inside a job's worker thread once the job is cancelled or timed out"""
 
-class ProcurementCrew:
-    """CrewAI-based multi-agent system for procurement"""
+
+class BackgroundJobQueue:
+    """In-process queue that runs long analyses off the request path.
     
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        
-        # Define agents
-        self.inventory_analyst = Agent(
-            role='Inventory Analyst',
-            goal='Analyze inventory levels and predict stockouts',
-            backstory="""You are an expert in inventory management with 15 years 
-            of experience in retail operations. You excel at predicting demand 
-            and optimizing stock levels.""",
-            verbose=True,
-            allow_delegation=False,
-            llm=ChatOpenAI(model="gpt-4o-mini", openai_api_key=api_key)
-        )
-        
-        self.procurement_manager = Agent(
-            role='Procurement Manager',
-            goal='Make cost-effective purchasing decisions',
-            backstory="""You are a procurement specialist who negotiates with 
-            vendors and ensures timely deliveries while minimizing costs.""",
-            verbose=True,
-            allow_delegation=False,
-            llm=ChatOpenAI(model="gpt-4o-mini", openai_api_key=api_key)
-        )
-        
-        self.risk_assessor = Agent(
-            role='Risk Assessment Officer',
-            goal='Evaluate financial and operational risks',
-            backstory="""You assess risks in business decisions, focusing on 
-            cash flow, vendor reliability, and operational continuity.""",
-            verbose=True,
-            allow_delegation=False,
-            llm=ChatOpenAI(model="gpt-4o-mini", openai_api_key=api_key)
-        )
+    ``submit`` returns a job id right away; a fixed set of workers runs
+    queued jobs under a per-job timeout. Cancelling a queued job drops it.
+    Cancelling (or timing out) a running job cancels its task and sets its
+    cancel event, which the crew checks between agent steps. Finished jobs
+    are kept for status lookups until MAX_TRACKED_JOBS is exceeded.
+    """
     
-    def analyze_inventory_situation(self, items: List[InventoryItem]) -> Dict:
-        """Use crew to analyze entire inventory situation"""
-        
-        low_stock_items = [item for item in items if item.stock <= item.reorderPoint]
-        
-        if not low_stock_items:
-            return {
-                "summary": "All inventory levels are healthy",
-                "critical_items": [],
-                "recommended_actions": []
-            }
-        
-        # Create analysis task
-        analysis_task = Task(
-            description=f"""Analyze these low-stock items and provide recommendations:
-            
-            {json.dumps([item.dict() for item in low_stock_items], indent=2)}
-            
-            Provide:
-            1. Overall inventory health assessment
-            2. Critical items requiring immediate action
-            3. Recommended procurement strategy""",
-            agent=self.inventory_analyst,
-            expected_output="Detailed inventory analysis with recommendations"
-        )
-        
-        # Create procurement task
-        procurement_task = Task(
-            description="""Based on the inventory analysis, create a procurement plan with:
-            1. Items to order immediately
-            2. Quantities and estimated costs
-            3. Vendor communication strategy""",
-            agent=self.procurement_manager,
-            expected_output="Procurement plan with action items"
-        )
-        
-        # Create risk assessment task
-        risk_task = Task(
-            description="""Assess risks in the procurement plan:
-            1. Financial risks (cash flow impact)
-            2. Operational risks (stockout probability)
-            3. Vendor risks (reliability, delivery times)
-            
-            Recommend which decisions can be auto-approved vs need escalation.""",
-            agent=self.risk_assessor,
-            expected_output="Risk assessment with approval recommendations"
-        )
+    MAX_TRACKED_JOBS = 1000
+    FINISHED = ("succeeded", "failed", "cancelled", "timed_out")
+    
+    def __init__(self, workers: int, timeout: float):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.counters = {status: 0 for status in ("submitted", *self.FINISHED)}
+    
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+    
+    def submit(self, kind: str, run) -> Dict:
+        """Queue run(cancel_event), a coroutine function returning the job's result"""
         
-        # Create and run crew
-        crew = Crew(
-            agents=[self.inventory_analyst, self.procurement_manager, self.risk_assessor],
-            tasks=[analysis_task, procurement_task, risk_task],
-            process=Process.sequential,
-            verbose=True
-        )
+        job = {
+            "jobId": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "queued",
+            "createdAt": datetime.now().isoformat(),
+            "run": run,
+            "cancel": threading.Event(),
+            "task": None
+        }
+        self._jobs[job["jobId"]] = job
+        self.counters["submitted"] += 1
+        self._trim()
+        self._ensure_started()
+        self._queue.put_nowait(job)
+        return self.public_status(job)
+    
+    def _trim(self):
+        excess = len(self._jobs) - self.MAX_TRACKED_JOBS
+        for job_id in [k for k, job in self._jobs.items() if job["status"] in self.FINISHED][:max(0, excess)]:
+            del self._jobs[job_id]
+    
+    async def _worker(self):
+        current_trace.set(None)  # not part of the request that started the worker
+        queue = self._queue
+        while True:
+            job = await queue.get()
+            try:
+                if job["status"] == "queued":
+                    await self._execute(job)
+            finally:
+                queue.task_done()
+    
+    async def _execute(self, job: Dict):
+        job["status"] = "running"
+        job["startedAt"] = datetime.now().isoformat()
+        current_flow.set(f"job-{job['jobId']}")
+        trace = start_trace(f"job-{job['jobId']}", kind=job["kind"])
+        task = job["task"] = asyncio.create_task(job["run"](job["cancel"]))
+        try:
+            done, _ = await asyncio.wait({task}, timeout=self.timeout)
+        except asyncio.CancelledError:
+            task.cancel()
+            job["cancel"].set()
+            raise
+        finally:
+            current_trace.set(None)
         
-        result = crew.kickoff()
+        if not done:
+            task.cancel()
+            job["cancel"].set()
+            self._finish(job, "timed_out", error=f"Job did not finish within {self.timeout:g} seconds")
+        elif task.cancelled():
+            self._finish(job, "cancelled")
+        elif task.exception() is not None:
+            error = task.exception()
+            detail = error.detail if isinstance(error, HTTPException) else str(error)
+            self._finish(job, "failed", error=detail)
+        else:
+            self._finish(job, "succeeded", result=task.result())
+        finish_trace(trace, status=job["status"])
+    
+    def _finish(self, job: Dict, status: str, **fields):
+        job.update(fields)
+        job["status"] = status
+        job["finishedAt"] = datetime.now().isoformat()
+        job["task"] = job["run"] = None
+        self.counters[status] += 1
+    
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Cancel a queued or running job; None if the job is unknown"""
         
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job["status"] == "queued":
+            self._finish(job, "cancelled")
+        elif job["status"] == "running":
+            job["status"] = "cancelling"
+            job["cancel"].set()
+            job["task"].cancel()
+        return self.public_status(job)
+    
+    @staticmethod
+    def public_status(job: Dict) -> Dict:
+        return {k: v for k, v in job.items() if k not in ("run", "cancel", "task")}
+    
+    def status(self, job_id: str) -> Optional[Dict]:
+        job = self._jobs.get(job_id)
+        return self.public_status(job) if job is not None else None
+    
+    def stats(self) -> Dict:
+        by_status: Dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job["status"]] = by_status.get(job["status"], 0) + 1
         return {
-            "summary": str(result),
-            "critical_items": [item.name for item in low_stock_items],
-            "analysis_timestamp": datetime.now().isoformat()
+            "workers": self.workers,
+            "timeout": self.timeout,
+            "queueDepth": by_status.get("queued", 0),
+            "byStatus": by_status,
+            **self.counters
         }
+    
+    async def stop(self):
+        """Cancel running jobs and stop the workers"""
+        for job in self._jobs.values():
+            job["cancel"].set()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._queue = None
+
+
+crew_jobs = BackgroundJobQueue(CREW_JOB_WORKERS, CREW_JOB_TIMEOUT)
 
 
 # ============================================================================
-# EMAIL AUTOMATION
+# REORDER SCHEDULER
 # ============================================================================
 
-class EmailAutomation:
-    """Handle automated email sending via Resend"""
+class ReorderScheduler:
+    """Periodic reorder checks of server-side inventory snapshots.
     
-    def __init__(self, api_key: Optional[str] = None):
-        self.api_key = api_key
-        if api_key and resend:
-            resend.api_key = api_key
+    Each schedule belongs to one tenant (OpenAI API key) and snapshot and
+    keeps a next-due time per urgency tier: CRITICAL items are re-checked
+    every interval, lower tiers every interval times their multiplier, plus
+    random jitter. A check triages the snapshot, analyzes the low-stock
+    items in the due tiers and orders what is auto-approved. A schedule
+    never overlaps itself (a due run is skipped while the previous one is
+    still going) and holds the snapshot's lock, so it does not race delta
+    updates either.
+    """
     
-    def send_vendor_email(self, decision: Dict, user_email: str) -> Dict:
-        """Send email to vendor (or user for demo)"""
+    # Longest the loop sleeps before looking for due schedules again
+    TICK = 1.0
+    
+    def __init__(self, interval: float, min_interval: float, multipliers: List[float],
+                 jitter: float, max_concurrent: int):
+        if len(multipliers) != len(URGENCY_LEVELS):
+            raise ValueError(f"Expected {len(URGENCY_LEVELS)} tier multipliers, got {len(multipliers)}")
+        self.interval = interval
+        self.min_interval = min_interval
+        self.multipliers = dict(zip(URGENCY_LEVELS, multipliers))
+        self.jitter = jitter
+        self.max_concurrent = max(1, max_concurrent)
+        self._schedules: "OrderedDict[str, Dict]" = OrderedDict()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._runs: set = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.counters = {"runs": 0, "skippedOverlaps": 0, "failures": 0, "itemsAnalyzed": 0}
+    
+    def _ensure_started(self):
+        if self._loop_task is None:
+            self._wake = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+            self._loop_task = asyncio.create_task(self._loop())
+    
+    def next_due(self, schedule: Dict, tier: str, now: float) -> float:
+        period = schedule["interval"] * self.multipliers[tier]
+        return now + period * (1 + random.uniform(0, self.jitter))
+    
+    def create(self, request: ScheduleRequest) -> Dict:
+        """Add a schedule; its first check runs within the jitter window"""
         
-        if not self.api_key or not resend:
-            return {
-                "success": True,
-                "simulated": True,
-                "message": "Email simulated (Resend not configured)"
-            }
+        interval = request.interval if request.interval is not None else self.interval
+        if interval < self.min_interval:
+            raise HTTPException(status_code=400, detail=f"Interval must be at least {self.min_interval:g} seconds")
+        if inventory_snapshots.get(request.snapshot_id) is None:
+            raise HTTPException(status_code=404, detail=f"Unknown snapshot: {request.snapshot_id}")
+        tenant = key_fingerprint(request.openai_api_key)
+        for existing in self._schedules.values():
+            if existing["tenant"] == tenant and existing["snapshotId"] == request.snapshot_id:
+                raise HTTPException(status_code=409, detail=f"Snapshot already scheduled as {existing['scheduleId']}")
         
-        try:
-            email_html = f"""
-            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 20px; border-radius: 10px 10px 0 0;">
-                    <h1 style="color: white; margin: 0;">AUTONOMOS Purchase Order</h1>
-                </div>
-                <div style="background: white; padding: 30px; border: 1px solid #e5e7eb; border-top: none; border-radius: 0 0 10px 10px;">
-                    <h2 style="color: #1f2937;">Purchase Order Request</h2>
-                    <p style="color: #4b5563;">Dear {decision['vendor']},</p>
-                    
-                    <div style="background: #f3f4f6; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                        <table style="width: 100%; border-collapse: collapse;">
-                            <tr>
-                                <td style="padding: 10px 0; color: #6b7280; font-weight: bold;">Item:</td>
-                                <td style="padding: 10px 0; color: #1f2937;">{decision['item']}</td>
-                            </tr>
-                            <tr>
-                                <td style="padding: 10px 0; color: #6b7280; font-weight: bold;">Quantity:</td>
-                                <td style="padding: 10px 0; color: #1f2937;">{decision['quantity']} units</td>
-                            </tr>
-                            <tr>
-                                <td style="padding: 10px 0; color: #6b7280; font-weight: bold;">Estimated Cost:</td>
-                                <td style="padding: 10px 0; color: #1f2937; font-size: 18px; font-weight: bold;">${decision['cost']}</td>
-                            </tr>
-                            <tr>
-                                <td style="padding: 10px 0; color: #6b7280; font-weight: bold;">Urgency:</td>
-                                <td style="padding: 10px 0;">
-                                    <span style="background: #ef4444; color: white; padding: 4px 12px; border-radius: 12px; font-size: 12px;">
-                                        {decision['urgency']}
-                                    </span>
-                                </td>
-                            </tr>
-                        </table>
-                    </div>
-                    
-                    <div style="background: #eff6ff; padding: 15px; border-left: 4px solid #3b82f6; margin: 20px 0;">
-                        <p style="margin: 0; color: #1e40af; font-size: 14px;">
-                            <strong>Message:</strong><br>
-                            {decision['vendorEmail']}
-                        </p>
-                    </div>
-                    
-                    <p style="color: #4b5563; margin-top: 30px;">
-                        Please confirm availability and estimated delivery timeline at your earliest convenience.
-                    </p>
-                    
-                    <p style="color: #4b5563;">
-                        Best regards,<br>
-                        <strong>AUTONOMOS AI Operations Manager</strong>
-                    </p>
-                    
-                    <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 30px 0;">
-                    
-                    <p style="color: #9ca3af; font-size: 12px; text-align: center;">
-                        This email was automatically generated by AUTONOMOS<br>
-                        Agentic Operations Manager for MSMEs
-                    </p>
-                </div>
-            </div>
-            """
-            
-            params = {
-                "from": "AUTONOMOS <onboarding@resend.dev>",
-                "to": [user_email],
-                "subject": f"Purchase Order: {decision['item']} - {decision['urgency']} Priority",
-                "html": email_html
-            }
-            
-            email = resend.Emails.send(params)
-            
-            return {
-                "success": True,
-                "simulated": False,
-                "email_id": email.get('id'),
-                "message": "Email sent successfully"
-            }
+        now = time.time()
+        schedule = {
+            "scheduleId": uuid.uuid4().hex,
+            "tenant": tenant,
+            "snapshotId": request.snapshot_id,
+            "interval": interval,
+            "batch": request.batch,
+            "userEmail": request.user_email,
+            "active": True,
+            "running": False,
+            "createdAt": datetime.now().isoformat(),
+            "nextDue": {tier: now + interval * random.uniform(0, self.jitter) for tier in URGENCY_LEVELS},
+            "runs": 0,
+            "skippedOverlaps": 0,
+            "failures": 0,
+            "lastRun": None,
+            "openaiApiKey": request.openai_api_key,
+            "resendApiKey": request.resend_api_key
+        }
+        self._schedules[schedule["scheduleId"]] = schedule
+        self._ensure_started()
+        self._wake.set()
+        return self.public_status(schedule)
+    
+    def owned(self, schedule_id: str, tenant: str) -> Optional[Dict]:
+        """The schedule, if it exists and belongs to the tenant"""
+        schedule = self._schedules.get(schedule_id)
+        return schedule if schedule is not None and schedule["tenant"] == tenant else None
+    
+    def run_now(self, schedule_id: str, tenant: str) -> Optional[Dict]:
+        """Make every tier of a tenant's schedule due immediately"""
+        schedule = self.owned(schedule_id, tenant)
+        if schedule is None:
+            return None
+        schedule["active"] = True
+        schedule["nextDue"] = {tier: time.time() for tier in URGENCY_LEVELS}
+        self._ensure_started()
+        self._wake.set()
+        return self.public_status(schedule)
+    
+    def delete(self, schedule_id: str, tenant: str) -> bool:
+        if self.owned(schedule_id, tenant) is None:
+            return False
+        del self._schedules[schedule_id]
+        return True
+    
+    async def _loop(self):
+        current_trace.set(None)  # not part of the request that created the first schedule
+        while True:
+            self._wake.clear()
+            now = time.time()
+            for schedule in list(self._schedules.values()):
+                tiers = [tier for tier, due in schedule["nextDue"].items() if due <= now]
+                if not schedule["active"] or not tiers:
+                    continue
+                for tier in tiers:
+                    schedule["nextDue"][tier] = self.next_due(schedule, tier, now)
+                if schedule["running"]:
+                    schedule["skippedOverlaps"] += 1
+                    self.counters["skippedOverlaps"] += 1
+                    continue
+                schedule["running"] = True
+                task = asyncio.create_task(self._run(schedule, tiers))
+                self._runs.add(task)
+                task.add_done_callback(self._runs.discard)
             
+            upcoming = [min(s["nextDue"].values()) for s in self._schedules.values() if s["active"]]
+            sleep = min([self.TICK] + [due - time.time() for due in upcoming])
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(0.01, sleep))
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _run(self, schedule: Dict, tiers: List[str]):
+        current_flow.set(f"schedule-{schedule['scheduleId']}")
+        trace = start_trace(f"schedule-{schedule['scheduleId']}", kind="schedule", tiers=tiers)
+        started = time.perf_counter()
+        run = {"startedAt": datetime.now().isoformat(), "tiers": tiers}
+        try:
+            snapshot = inventory_snapshots.get(schedule["snapshotId"])
+            if snapshot is None:
+                schedule["active"] = False
+                raise LookupError(f"Snapshot {schedule['snapshotId']} no longer exists; schedule paused")
+            async with self._slots, snapshot["lock"]:
+                run.update(await self.check(schedule, snapshot, tiers))
+            schedule["runs"] += 1
+            self.counters["runs"] += 1
+            self.counters["itemsAnalyzed"] += run["analyzed"]
         except Exception as e:
-            return {
-                "success": False,
-                "simulated": False,
-                "error": str(e),
-                "message": f"Email failed: {str(e)}"
-            }
+            run["error"] = str(e)
+            schedule["failures"] += 1
+            self.counters["failures"] += 1
+            logger.warning("Scheduled check %s failed: %s", schedule["scheduleId"], e)
+        finally:
+            run["durationMs"] = round((time.perf_counter() - started) * 1000, 1)
+            schedule["lastRun"] = run
+            schedule["running"] = False
+            finish_trace(trace, status="failed" if "error" in run else "succeeded")
+    
+    async def check(self, schedule: Dict, snapshot: Dict, tiers: List[str]) -> Dict:
+        """Analyze and order the snapshot's low-stock items in the given tiers"""
+        
+        frame = snapshot["frame"]
+        await receive_restocked(schedule["tenant"], frame)
+        if len(frame) >= TRIAGE_VECTORIZE_MIN:
+            worklist = await blocking_executor.run("agent", build_worklist, frame)
+        else:
+            worklist = build_worklist(frame)
+        due = [item for item in worklist if InventoryAnalysisAgent.compute_metrics(item)["urgency"] in tiers]
+        
+        decisions: List[Dict] = []
+        if due:
+            agent = agent_factory.inventory_agent(schedule["openaiApiKey"])
+            decisions = await run_item_analysis(agent, due, schedule["batch"])
+            await place_orders(decisions, schedule["tenant"], schedule["userEmail"], schedule["resendApiKey"],
+                               "scheduler", agent)
+            inventory_snapshots.record_decisions(snapshot, decisions)
+        return {
+            "lowStock": len(worklist),
+            "analyzed": len(due),
+            "autoApproved": sum(d["decision"] == "AUTO_APPROVE" for d in decisions),
+            "ordered": sum("emailStatus" in d for d in decisions),
+            "suppressed": sum(bool(d.get("reorderSuppressed")) for d in decisions)
+        }
+    
+    @staticmethod
+    def public_status(schedule: Dict) -> Dict:
+        status = {k: v for k, v in schedule.items() if k not in ("openaiApiKey", "resendApiKey")}
+        status["nextDue"] = {tier: datetime.fromtimestamp(due).isoformat() for tier, due in schedule["nextDue"].items()}
+        return status
+    
+    def status(self, schedule_id: str, tenant: str) -> Optional[Dict]:
+        schedule = self.owned(schedule_id, tenant)
+        return self.public_status(schedule) if schedule is not None else None
+    
+    def list(self, tenant: str) -> List[Dict]:
+        return [self.public_status(schedule) for schedule in self._schedules.values()
+                if schedule["tenant"] == tenant]
+    
+    def stats(self) -> Dict:
+        return {
+            "total": len(self._schedules),
+            "active": sum(schedule["active"] for schedule in self._schedules.values()),
+            "running": len(self._runs),
+            "tierMultipliers": self.multipliers,
+            **self.counters
+        }
+    
+    async def stop(self):
+        """Stop the loop and cancel checks in progress"""
+        tasks = [task for task in (self._loop_task, *self._runs) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+        self._runs = set()
+
+
+reorder_scheduler = ReorderScheduler(
+    SCHEDULE_INTERVAL, SCHEDULE_MIN_INTERVAL, SCHEDULE_TIER_MULTIPLIERS, SCHEDULE_JITTER, SCHEDULE_MAX_CONCURRENT
+)
 
 
 # ============================================================================
 # API ENDPOINTS
 # ============================================================================
 
+def request_tenant(x_openai_api_key: str = Header(...)) -> str:
+    """Tenant of the caller: the fingerprint of the OpenAI key its analyses and schedules use"""
+    return key_fingerprint(x_openai_api_key)
+
 @app.get("/")
 async def root():
     return {
@@ -390,25 +4154,34 @@ async def root():
         ]
     }
 
+def request_fingerprint(kind: str, request: AnalysisRequest) -> str:
+    """Key an analysis request on its inventory state, options and recipients"""
+    
+    fields = request.dict()
+    if request.snapshot_id is not None:
+        snapshot = inventory_snapshots.get(request.snapshot_id)
+        if snapshot is not None:
+            fields["snapshot"] = [snapshot["createdAt"], snapshot["updatedAt"], snapshot["rows"]]
+    return DecisionCache.make_key({"kind": kind, **fields})
+
 @app.post("/analyze/simple")
 async def analyze_inventory_simple(request: AnalysisRequest):
-    """Simple LangChain-based analysis (faster for demos)"""
-    try:
-        agent = InventoryAnalysisAgent(request.openai_api_key)
-        email_automation = EmailAutomation(request.resend_api_key)
+    """Simple LangChain-based analysis (faster for demos).
+    
+    Identical requests arriving while one is running wait for it and get
+    its response (marked coalesced) instead of analyzing and ordering again.
+    """
+    
+    async def analyze() -> Dict:
+        agent = agent_factory.inventory_agent(request.openai_api_key)
         
-        results = []
-        low_stock_items = [item for item in request.inventory if item.stock <= item.reorderPoint]
+        _, low_stock_items = await load_worklist(request)
+        results = await run_item_analysis(agent, low_stock_items, request.batch)
+        await record_snapshot_decisions(request, results)
         
-        for item in low_stock_items:
-            decision = agent.analyze_item(item)
-            
-            # Send email if auto-approved
-            if decision["decision"] == "AUTO_APPROVE" and request.user_email:
-                email_result = email_automation.send_vendor_email(decision, request.user_email)
-                decision["emailStatus"] = email_result
-            
-            results.append(decision)
+        # Record decisions and order what was auto-approved
+        await place_orders(results, key_fingerprint(request.openai_api_key), request.user_email,
+                           request.resend_api_key, "langchain", agent)
         
         return {
             "success": True,
@@ -416,57 +4189,429 @@ async def analyze_inventory_simple(request: AnalysisRequest):
             "decisions": results,
             "timestamp": datetime.now().isoformat()
         }
+    
+    try:
+        result, shared = await inflight_requests.do(request_fingerprint("simple", request), analyze)
+        return {**result, "coalesced": True} if shared else result
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def run_crew_workflow(request: AnalysisRequest, low_stock_items: List[InventoryItem],
+                            cancel_event: Optional[threading.Event] = None) -> Dict:
+    """Crew analysis of a worklist, with agent fallback, recording and ordering"""
+    
+    # Get high-level analysis and per-item decisions from crew
+    crew_analysis = await blocking_executor.run(
+        "agent", run_crew_analysis, request.openai_api_key, low_stock_items, cancel_event
+    )
+    crew_decisions = crew_analysis.pop("item_decisions", {})
+    
+    # Only items the crew did not decide go through the LangChain agent
+    agent = agent_factory.inventory_agent(request.openai_api_key)
+    
+    decisions = await merge_crew_decisions(agent, low_stock_items, crew_decisions, request.batch)
+    await record_snapshot_decisions(request, decisions)
+    
+    await place_orders(decisions, key_fingerprint(request.openai_api_key), request.user_email,
+                       request.resend_api_key, "crewai", agent)
+    
+    return {
+        "success": True,
+        "method": "crewai",
+        "crew_analysis": crew_analysis,
+        "decisions": decisions,
+        "timestamp": datetime.now().isoformat()
+    }
+
 @app.post("/analyze/crew")
-async def analyze_inventory_crew(request: AnalysisRequest):
-    """CrewAI-based multi-agent analysis (more thorough, slower)"""
+async def analyze_inventory_crew(request: AnalysisRequest, mode: Optional[str] = None):
+    """CrewAI-based multi-agent analysis (more thorough, slower).
+    
+    With mode=job the crew runs in the background and the response (202)
+    carries a jobId; poll /jobs/{jobId} for its status and result.
+    """
     try:
-        crew = ProcurementCrew(request.openai_api_key)
-        
-        # Get high-level analysis from crew
-        crew_analysis = crew.analyze_inventory_situation(request.inventory)
+        _, low_stock_items = await load_worklist(request)
         
-        # Then get individual decisions using LangChain agent
-        agent = InventoryAnalysisAgent(request.openai_api_key)
-        email_automation = EmailAutomation(request.resend_api_key)
+        if mode == "job":
+            job = crew_jobs.submit(
+                "crew", lambda cancel_event: run_crew_workflow(request, low_stock_items, cancel_event)
+            )
+            return JSONResponse(status_code=202, content={**job, "statusUrl": f"/jobs/{job['jobId']}"})
         
-        decisions = []
-        low_stock_items = [item for item in request.inventory if item.stock <= item.reorderPoint]
+        return await run_crew_workflow(request, low_stock_items)
         
-        for item in low_stock_items:
-            decision = agent.analyze_item(item)
-            
-            if decision["decision"] == "AUTO_APPROVE" and request.user_email:
-                email_result = email_automation.send_vendor_email(decision, request.user_email)
-                decision["emailStatus"] = email_result
-            
-            decisions.append(decision)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/jobs")
+async def job_stats():
+    """Depth and outcome counters for background analysis jobs"""
+    return crew_jobs.stats()
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Status of a background job, with its result once it has succeeded"""
+    status = crew_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return status
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    status = crew_jobs.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return status
+
+@app.post("/schedules", status_code=201)
+async def create_schedule(request: ScheduleRequest):
+    """Check a snapshot for reorders periodically instead of re-posting the catalog"""
+    return reorder_scheduler.create(request)
+
+@app.get("/schedules")
+async def list_schedules(tenant: str = Depends(request_tenant)):
+    """The caller's schedules and scheduler counters"""
+    return {"schedules": reorder_scheduler.list(tenant), **reorder_scheduler.stats()}
+
+@app.get("/schedules/{schedule_id}")
+async def schedule_status(schedule_id: str, tenant: str = Depends(request_tenant)):
+    status = reorder_scheduler.status(schedule_id, tenant)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown schedule")
+    return status
+
+@app.post("/schedules/{schedule_id}/run")
+async def run_schedule(schedule_id: str, tenant: str = Depends(request_tenant)):
+    """Run a schedule's check for every tier now"""
+    status = reorder_scheduler.run_now(schedule_id, tenant)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown schedule")
+    return status
+
+@app.delete("/schedules/{schedule_id}")
+async def delete_schedule(schedule_id: str, tenant: str = Depends(request_tenant)):
+    if not reorder_scheduler.delete(schedule_id, tenant):
+        raise HTTPException(status_code=404, detail="Unknown schedule")
+    return {"success": True, "scheduleId": schedule_id}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the decision cache, and calls that shared in-flight work"""
+    coalescing = {"requests": inflight_requests.stats(), "items": inflight_items.stats()}
+    if decision_cache is None:
+        return {"enabled": False, "coalescing": coalescing}
+    return {"enabled": True, **decision_cache.stats(), "coalescing": coalescing}
+
+@app.get("/cascade/stats")
+async def cascade_tier_stats():
+    """Share of decisions made by each cascade tier, tier latency and escalation reasons"""
+    return cascade_stats.stats()
+
+@app.get("/prompts/stats")
+async def prompt_stats():
+    """Prompts built so far and their input-token counts"""
+    return prompt_compiler.stats()
+
+@app.get("/llm/limits")
+async def llm_limits():
+    """Per-API-key rate limiter state, including how many LLM calls are queued"""
+    return llm_governor.stats()
+
+@app.get("/pool/stats")
+async def pool_stats():
+    """Reuse counters for pooled LLM clients, agents and crews"""
+    return {
+        "llmClients": llm_client_pool.stats(),
+        "agents": agent_factory.stats()
+    }
+
+@app.get("/email/queue")
+async def email_queue_stats():
+    """Depth and delivery counters for the outbound email queue"""
+    return email_queue.stats()
+
+@app.get("/email/status/{idempotency_key}")
+async def email_status(idempotency_key: str):
+    """Delivery status of one queued PO email"""
+    status = email_queue.status(idempotency_key)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown email")
+    return status
+
+@app.post("/inventory/snapshots")
+async def ingest_inventory(http_request: Request, format: Optional[str] = None):
+    """Ingest a CSV, Parquet or NDJSON inventory file sent as the raw request body.
+    
+    The body is streamed to a spool file (never held in memory as JSON) and
+    loaded into a columnar snapshot. Pass the returned snapshotId to the
+    analyze endpoints instead of an inline inventory.
+    """
+    content_type = http_request.headers.get("content-type", "").split(";")[0].strip()
+    file_format = INGEST_FORMATS.get((format or content_type).lower())
+    if file_format is None:
+        raise HTTPException(status_code=415, detail="Send csv, parquet or ndjson (use ?format=...)")
+    
+    spool = tempfile.NamedTemporaryFile(suffix=f".{file_format}", dir=INGEST_SPOOL_DIR, delete=False)
+    try:
+        received = 0
+        with spool:
+            async for chunk in http_request.stream():
+                received += len(chunk)
+                if received > INGEST_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail="Inventory file too large")
+                spool.write(chunk)
         
-        return {
-            "success": True,
-            "method": "crewai",
-            "crew_analysis": crew_analysis,
-            "decisions": decisions,
-            "timestamp": datetime.now().isoformat()
-        }
+        try:
+            frame = await blocking_executor.run("agent", load_inventory_file, spool.name, file_format)
+        except (ValueError, KeyError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
+        return {**inventory_snapshots.add(frame, file_format), "bytes": received}
+    finally:
+        os.unlink(spool.name)
+
+@app.get("/inventory/snapshots")
+async def list_inventory_snapshots():
+    """Snapshots currently held in memory"""
+    return {"snapshots": inventory_snapshots.list()}
+
+@app.get("/inventory/snapshots/{snapshot_id}")
+async def get_inventory_snapshot(snapshot_id: str):
+    snapshot = inventory_snapshots.get(snapshot_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Unknown snapshot")
+    return inventory_snapshots.describe(snapshot)
+
+@app.post("/inventory/snapshots/{snapshot_id}/deltas")
+async def apply_inventory_deltas(snapshot_id: str, request: DeltaRequest):
+    """Apply stock/field updates to a snapshot and analyze only what changed"""
+    snapshot = inventory_snapshots.get(snapshot_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Unknown snapshot")
+    try:
+        return await analyze_snapshot_deltas(snapshot, request)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.delete("/inventory/snapshots/{snapshot_id}")
+async def delete_inventory_snapshot(snapshot_id: str):
+    if not inventory_snapshots.delete(snapshot_id):
+        raise HTTPException(status_code=404, detail="Unknown snapshot")
+    return {"success": True}
+
+@app.delete("/cache")
+async def clear_cache():
+    """Drop every cached decision"""
+    if decision_cache is not None:
+        decision_cache.clear()
+    return {"success": True}
+
+def format_stream_event(event: Dict, sse: bool) -> str:
+    """Encode one stream event as an NDJSON line or a Server-Sent Event"""
+    payload = json.dumps(event)
+    if sse:
+        return f"event: {event['type']}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+@app.post("/analyze/stream")
+async def analyze_inventory_stream(request: AnalysisRequest, http_request: Request, format: Optional[str] = None):
+    """Stream each decision as soon as it is ready (NDJSON, or SSE with format=sse).
+    
+    With batch, decisions arrive a batched reply at a time. Email and
+    suppressed events follow once every item is decided, so that orders
+    can be consolidated per vendor; a completed run on a snapshot also
+    becomes its baseline for deltas.
+    """
+    sse = format == "sse" or (
+        format is None and "text/event-stream" in http_request.headers.get("accept", "")
+    )
+    agent = agent_factory.inventory_agent(request.openai_api_key)
+    tenant = key_fingerprint(request.openai_api_key)
+    inventory_size, low_stock_items = await load_worklist(request)
+    
+    async def events():
+        total = len(low_stock_items)
+        yield format_stream_event({"type": "start", "total": total, "inventorySize": inventory_size}, sse)
+        
+        completed = 0
+        streamed: List[tuple] = []
+        recorded = False
+        try:
+            async for index, decision in iter_item_analyses(agent, low_stock_items, batch=request.batch):
+                completed += 1
+                yield format_stream_event({
+                    "type": "decision",
+                    "index": index,
+                    "completed": completed,
+                    "total": total,
+                    "decision": decision
+                }, sse)
+                streamed.append((index, decision))
+            
+            # One ledger transaction for the whole run rather than one per decision;
+            # if the run fails first, the decisions already sent are recorded below
+            recorded = True
+            await record_decisions([decision for _, decision in streamed], tenant, "stream")
+            await record_snapshot_decisions(request, [decision for _, decision in streamed])
+            
+            # Order once everything is decided so each vendor gets one PO email
+            await order_approved([decision for _, decision in streamed], tenant,
+                                 request.user_email, request.resend_api_key, agent)
+            for index, decision in streamed:
+                if "emailStatus" in decision:
+                    yield format_stream_event({"type": "email", "index": index, "emailStatus": decision["emailStatus"]}, sse)
+                elif decision.get("reorderSuppressed"):
+                    yield format_stream_event({
+                        "type": "suppressed",
+                        "index": index,
+                        "openPurchaseOrder": decision["openPurchaseOrder"]
+                    }, sse)
+            
+            yield format_stream_event({
+                "type": "done",
+                "completed": completed,
+                "total": total,
+                "timestamp": datetime.now().isoformat()
+            }, sse)
+        except Exception as e:
+            if not recorded:
+                await record_decisions([decision for _, decision in streamed], tenant, "stream")
+            yield format_stream_event({"type": "error", "completed": completed, "total": total, "detail": str(e)}, sse)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/email/send")
-async def send_email(decision: Dict, user_email: str, resend_api_key: Optional[str] = None):
-    """Send vendor email manually"""
+async def send_email(decision: Dict, user_email: str, resend_api_key: Optional[str] = None,
+                     x_openai_api_key: Optional[str] = Header(None)):
+    """Send vendor email manually (recorded as a PO of the X-OpenAI-Api-Key tenant, if given)"""
     try:
         email_automation = EmailAutomation(resend_api_key)
-        result = email_automation.send_vendor_email(decision, user_email)
+        result = await blocking_executor.run(
+            "email", email_automation.send_vendor_email, decision, user_email
+        )
+        if procurement_ledger is not None and x_openai_api_key and result["success"]:
+            email = {"status": "simulated" if result["simulated"] else "sent", "emailId": result.get("email_id")}
+            await blocking_executor.run("ledger", procurement_ledger.create_orders,
+                                        key_fingerprint(x_openai_api_key), [(decision, email)])
+            result["purchaseOrderId"] = decision["purchaseOrderId"]
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def require_ledger() -> ProcurementLedger:
+    if procurement_ledger is None:
+        raise HTTPException(status_code=503, detail="Procurement ledger is disabled")
+    return procurement_ledger
+
+@app.get("/decisions")
+async def list_decisions(item: Optional[str] = None, vendor: Optional[str] = None,
+                         decision: Optional[str] = None, since: Optional[str] = None,
+                         until: Optional[str] = None, cursor: Optional[int] = None, limit: int = 100,
+                         tenant: str = Depends(request_tenant)):
+    """The caller's recorded decisions, newest first; pass nextCursor back as cursor for the next page"""
+    return await blocking_executor.run(
+        "ledger", require_ledger().list_decisions,
+        tenant, item, vendor, decision, parse_timestamp(since), parse_timestamp(until), cursor, limit
+    )
+
+@app.get("/orders")
+async def list_orders(status: Optional[str] = None, item: Optional[str] = None,
+                      vendor: Optional[str] = None, since: Optional[str] = None,
+                      until: Optional[str] = None, cursor: Optional[int] = None, limit: int = 100,
+                      tenant: str = Depends(request_tenant)):
+    """The caller's purchase orders, newest first; pass nextCursor back as cursor for the next page"""
+    return await blocking_executor.run(
+        "ledger", require_ledger().list_orders,
+        tenant, status, item, vendor, parse_timestamp(since), parse_timestamp(until), cursor, limit
+    )
+
+@app.get("/orders/{order_id}")
+async def get_order(order_id: int, tenant: str = Depends(request_tenant)):
+    order = await blocking_executor.run("ledger", require_ledger().get_order, tenant, order_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Unknown purchase order")
+    return order
+
+@app.post("/orders/{order_id}/{action}")
+async def close_order(order_id: int, action: str, tenant: str = Depends(request_tenant)):
+    """Mark an open purchase order as received or cancel it, allowing reorders again"""
+    statuses = {"receive": "received", "cancel": "cancelled"}
+    if action not in statuses:
+        raise HTTPException(status_code=404, detail="Use /receive or /cancel")
+    ledger = require_ledger()
+    order = await blocking_executor.run("ledger", ledger.close_order, tenant, order_id, statuses[action])
+    if order is None:
+        if await blocking_executor.run("ledger", ledger.get_order, tenant, order_id) is None:
+            raise HTTPException(status_code=404, detail="Unknown purchase order")
+        raise HTTPException(status_code=409, detail="Purchase order is not open")
+    return order
+
+
+def service_gauges() -> List[tuple]:
+    """Cache, queue and limiter state read when /metrics is scraped"""
+    gauges = [
+        ("autonomos_email_queue_depth", "gauge", "PO emails waiting to be sent", email_queue.stats()["queueDepth"]),
+        ("autonomos_llm_queue_depth", "gauge", "LLM calls waiting for rate-limit budget", llm_governor.stats()["queueDepth"]),
+        ("autonomos_jobs_queue_depth", "gauge", "Background jobs waiting for a worker", crew_jobs.stats()["queueDepth"]),
+        ("autonomos_scheduled_checks_running", "gauge", "Scheduled reorder checks in progress", len(reorder_scheduler._runs)),
+        ("autonomos_scheduled_checks_skipped_total", "counter", "Scheduled checks skipped because the last one was still running",
+         reorder_scheduler.counters["skippedOverlaps"]),
+        ("autonomos_prompt_tokens_total", "counter", "Input tokens in prompts built", prompt_compiler.prompt_tokens)
+    ]
+    if decision_cache is not None:
+        cache = decision_cache.stats()
+        gauges += [
+            ("autonomos_cache_hits_total", "counter", "Decision cache hits", cache["hits"]),
+            ("autonomos_cache_misses_total", "counter", "Decision cache misses", cache["misses"]),
+            ("autonomos_cache_hit_ratio", "gauge", "Decision cache hits per lookup", cache["hitRate"]),
+            ("autonomos_cache_entries", "gauge", "Decisions held in the cache", cache["size"])
+        ]
+    return gauges
+
+
+metrics.register_collector(service_gauges)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Stage latencies, tokens, cache and queue state in Prometheus text format"""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health/startup")
+async def startup_report():
+    """Module import time against its budget, plus lazy SDK load times"""
+    return {
+        "importMs": STARTUP_IMPORT_MS,
+        "budgetMs": IMPORT_TIME_BUDGET_MS,
+        "withinBudget": STARTUP_IMPORT_MS <= IMPORT_TIME_BUDGET_MS,
+        "lazyImports": lazy_import_timings
+    }
+
+
+STARTUP_IMPORT_MS = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
+if STARTUP_IMPORT_MS > IMPORT_TIME_BUDGET_MS:
+    logger.warning(
+        "autonomos_backend imported in %.0f ms, over the %.0f ms budget",
+        STARTUP_IMPORT_MS, IMPORT_TIME_BUDGET_MS
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
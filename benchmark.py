@@ -0,0 +1,506 @@
+"""
+Offline load benchmark for the AUTONOMOS backend.
+
+Starts an OpenAI-compatible mock LLM and a Resend stand-in in this
+process, launches the backend (uvicorn) against them, then drives
+/analyze/simple, /analyze/crew and /email/send with synthetic catalogs.
+Reports p50/p95/p99 latency, throughput, backend memory and token counts.
+The "render" scenario times PO email rendering in-process, without servers.
+No OpenAI or Resend account is needed and nothing leaves the machine.
+
+Usage:
+   python benchmark.py
+   python benchmark.py --sizes 10,1000,10000 --requests 20 --concurrency 4
+   python benchmark.py --sizes 100000 --snapshot --batch --scenarios simple
+   python benchmark.py --llm-latency-ms 800 --llm-error-rate 0.02 --json results.json
+   python benchmark.py --scenarios render --sizes 1000,100000
+
+Run it before and after a change with the same arguments (and --seed) to
+catch regressions, or vary --concurrency and --llm-rpm to size a deployment.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+AGENT_PROMPT_MARKER = "AUTONOMOS, an AI operations manager"
+
+
+# ============================================================================
+# SYNTHETIC CATALOGS
+# ============================================================================
+
+def generate_catalog(size: int, seed: int = 7, low_stock_ratio: float = 0.2) -> List[Dict]:
+    """Deterministic inventory of `size` SKUs, about low_stock_ratio of them below reorder point"""
+
+    rng = random.Random(seed * 1_000_003 + size)
+    vendors = [(f"Vendor {i}", f"orders@vendor{i}.example") for i in range(max(1, min(200, size // 50)))]
+    items = []
+    for i in range(size):
+        reorder_point = rng.randint(10, 100)
+        if rng.random() < low_stock_ratio:
+            stock = rng.randint(0, reorder_point)
+        else:
+            stock = rng.randint(reorder_point + 1, reorder_point * 4)
+        vendor, vendor_email = vendors[i % len(vendors)]
+        items.append({
+            "id": i + 1,
+            "name": f"SKU-{i + 1:06d}",
+            "stock": stock,
+            "reorderPoint": reorder_point,
+            "price": round(rng.uniform(0.5, 40.0), 2),
+            "vendor": vendor,
+            "vendorEmail": vendor_email,
+            "lastOrder": "" if rng.random() < 0.05 else "2026-01-01",
+            "salesPerDay": round(rng.uniform(0.2, 8.0), 1)
+        })
+    return items
+
+
+# ============================================================================
+# MOCK OPENAI AND RESEND
+# ============================================================================
+
+class MockSettings:
+    """Behaviour of the mock provider plus what it has served so far"""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float,
+                 rate_limit_rate: float, reasoning_tokens: int, email_latency_ms: float, seed: int):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.reasoning_tokens = reasoning_tokens
+        self.email_latency_ms = email_latency_ms
+        self.rng = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        self.counters = {
+            "llmCalls": 0, "promptTokens": 0, "completionTokens": 0,
+            "injectedErrors": 0, "injected429s": 0, "emails": 0
+        }
+
+    async def delay(self, base_ms: float):
+        jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        await asyncio.sleep(max(0.0, base_ms + jitter) / 1000)
+
+
+def table_rows(text: str) -> List[List[str]]:
+    """Item rows of the backend's "|"-separated prompt table"""
+    return [line.split("|") for line in text.splitlines() if re.match(r"^\d+\|", line)]
+
+
+def decide_row(row: List[str], reasoning: str) -> Dict:
+    """Approve rows whose totalCost (column 8) is routine, escalate the rest"""
+    try:
+        cost = float(row[7])
+    except (IndexError, ValueError):
+        cost = 0.0
+    return {
+        "decision": "AUTO_APPROVE" if cost < 450 else "ESCALATE",
+        "reasoning": reasoning,
+        "confidence": 0.9,
+        "vendorEmail": f"Please ship the usual quantity of {row[1] if len(row) > 1 else 'this item'}."
+    }
+
+
+def mock_reply(messages: List[Dict], reasoning: str) -> str:
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    user = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+    rows = table_rows(user)
+
+    if AGENT_PROMPT_MARKER not in system:
+        # A CrewAI agent: give a final answer the risk task can parse
+        decisions = [{"id": int(row[0]), **decide_row(row, reasoning), "quantity": 1, "cost": 0.0,
+                      "urgency": row[-1]} for row in rows]
+        return "Thought: I now know the final answer\nFinal Answer: " + json.dumps(
+            {"summary": f"{len(rows)} low-stock items reviewed.", "decisions": decisions}
+        )
+    if '"message"' in system:
+        return json.dumps({"message": f"Please supply the listed items. {reasoning}"})
+    if '"decisions"' in system:
+        return json.dumps({"decisions": [{"ref": int(row[0]), **decide_row(row, reasoning)} for row in rows]})
+    return json.dumps(decide_row(rows[0] if rows else [], reasoning))
+
+
+def mock_app(settings: MockSettings) -> FastAPI:
+    app = FastAPI(title="AUTONOMOS benchmark mocks")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await settings.delay(settings.latency_ms)
+
+        roll = settings.rng.random()
+        if roll < settings.rate_limit_rate:
+            settings.counters["injected429s"] += 1
+            return JSONResponse(status_code=429, headers={"retry-after-ms": "200"},
+                                content={"error": {"message": "Mock rate limit", "type": "rate_limit_exceeded"}})
+        if roll < settings.rate_limit_rate + settings.error_rate:
+            settings.counters["injectedErrors"] += 1
+            return JSONResponse(status_code=500, content={"error": {"message": "Mock failure", "type": "server_error"}})
+
+        messages = body.get("messages", [])
+        content = mock_reply(messages, " ".join(["Routine reorder."] * max(1, settings.reasoning_tokens // 4)))
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        settings.counters["llmCalls"] += 1
+        settings.counters["promptTokens"] += prompt_tokens
+        settings.counters["completionTokens"] += completion_tokens
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}
+        }
+
+    @app.post("/emails")
+    async def send_email():
+        await settings.delay(settings.email_latency_ms)
+        settings.counters["emails"] += 1
+        return {"id": f"mock-{uuid.uuid4().hex}"}
+
+    @app.post("/emails/batch")
+    async def send_email_batch(request: Request):
+        messages = await request.json()
+        await settings.delay(settings.email_latency_ms)
+        settings.counters["emails"] += len(messages)
+        return {"data": [{"id": f"mock-{uuid.uuid4().hex}"} for _ in messages]}
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(settings: MockSettings, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(mock_app(settings), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+# ============================================================================
+# BACKEND UNDER TEST
+# ============================================================================
+
+def start_backend(port: int, mock_url: str, args, workdir: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "AUTONOMOS_OPENAI_BASE_URL": f"{mock_url}/v1",
+        "RESEND_API_URL": mock_url,
+        "AUTONOMOS_EMAIL_TRANSPORT": "resend",
+        "AUTONOMOS_CACHE_BACKEND": "memory" if args.cache else "none",
+        "AUTONOMOS_LEDGER_PATH": os.path.join(workdir, "ledger.sqlite3"),
+        "AUTONOMOS_LLM_RPM": str(args.llm_rpm),
+        "AUTONOMOS_TOKENIZER": "estimate",
+        "AUTONOMOS_CREW_TOKEN_BUDGET": str(args.crew_token_budget)
+    }
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "autonomos_backend:app",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=env
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if backend.poll() is not None:
+            raise SystemExit("Backend exited during startup")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health/startup", timeout=1).status_code == 200:
+                return backend
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    backend.terminate()
+    raise SystemExit("Backend did not start within 60 seconds")
+
+
+def process_memory_mb(pid: int) -> Dict[str, Optional[float]]:
+    """Current and peak resident memory of a process (Linux /proc only)"""
+    memory = {"rssMb": None, "peakRssMb": None}
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    memory["rssMb"] = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith("VmHWM:"):
+                    memory["peakRssMb"] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return memory
+
+
+# ============================================================================
+# LOAD DRIVER
+# ============================================================================
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def drive(client: httpx.AsyncClient, send, total: int, concurrency: int) -> Dict:
+    """Issue `total` requests, at most `concurrency` at a time; send() performs one"""
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await send(client)
+                ok = response.status_code < 400
+                error = f"HTTP {response.status_code}: {response.text[:120]}"
+            except httpx.HTTPError as e:
+                ok, error = False, f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - started
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors[error] = errors.get(error, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    wall = time.perf_counter() - started
+    return {
+        "requests": total,
+        "ok": len(latencies),
+        "errors": sum(errors.values()),
+        "errorSamples": dict(list(errors.items())[:3]),
+        "wallSeconds": round(wall, 3),
+        "throughputRps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "meanMs": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+        "p50Ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95Ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99Ms": round(percentile(latencies, 99) * 1000, 1)
+    }
+
+
+async def upload_snapshot(client: httpx.AsyncClient, catalog: List[Dict]) -> str:
+    body = "".join(json.dumps(item) + "\n" for item in catalog).encode("utf-8")
+    response = await client.post("/inventory/snapshots", params={"format": "ndjson"}, content=body)
+    response.raise_for_status()
+    return response.json()["snapshotId"]
+
+
+async def run_scenarios(args, api_url: str, settings: MockSettings, backend_pid: int) -> List[Dict]:
+    results = []
+    timeout = httpx.Timeout(args.request_timeout)
+    async with httpx.AsyncClient(base_url=api_url, timeout=timeout) as client:
+        for scenario in args.scenarios:
+            sizes = [1] if scenario == "email" else args.sizes
+            for size in sizes:
+                if scenario == "email":
+                    decision = {"item": "SKU-000001", "vendor": "Vendor 0", "quantity": 30,
+                                "cost": 120.0, "urgency": "HIGH",
+                                "vendorEmail": "Please ship 30 units of SKU-000001 this week."}
+
+                    async def send(c):
+                        return await c.post("/email/send", json=decision,
+                                            params={"user_email": "bench@example.com", "resend_api_key": "re_bench"})
+                else:
+                    catalog = generate_catalog(size, args.seed, args.low_stock_ratio)
+                    body = {"openai_api_key": "sk-bench", "batch": args.batch}
+                    if args.snapshot:
+                        body["snapshot_id"] = await upload_snapshot(client, catalog)
+                    else:
+                        body["inventory"] = catalog
+                    path = f"/analyze/{scenario}"
+
+                    async def send(c, path=path, body=body):
+                        return await c.post(path, json=body)
+
+                for _ in range(args.warmup):
+                    await send(client)
+                settings.reset()
+                print(f"▶ {scenario:<6} size={size:<7} requests={args.requests} concurrency={args.concurrency}",
+                      flush=True)
+                result = await drive(client, send, args.requests, args.concurrency)
+                result.update({
+                    "scenario": scenario,
+                    "size": size,
+                    "itemsPerSecond": round(result["throughputRps"] * size, 1) if scenario != "email" else None,
+                    **settings.counters,
+                    **process_memory_mb(backend_pid)
+                })
+                results.append(result)
+    return results
+
+
+# ============================================================================
+# EMAIL RENDERING
+# ============================================================================
+
+def render_benchmark(args) -> List[Dict]:
+    """Time PO email rendering for each catalog's low-stock items (no servers involved)"""
+
+    os.environ.setdefault("AUTONOMOS_LEDGER_PATH", "")
+    os.environ.setdefault("AUTONOMOS_CACHE_BACKEND", "none")
+    sys.path.insert(0, HERE)
+    import autonomos_backend as backend
+
+    results = []
+    for size in args.sizes:
+        decisions = []
+        for entry in generate_catalog(size, args.seed, args.low_stock_ratio):
+            item = backend.InventoryItem(**entry)
+            if item.stock > item.reorderPoint:
+                continue
+            metrics = backend.InventoryAnalysisAgent.compute_metrics(item)
+            decisions.append({
+                "item": item.name,
+                "vendor": item.vendor,
+                "vendorEmailAddress": item.vendorEmail,
+                "quantity": metrics["recommended_quantity"],
+                "cost": metrics["total_cost"],
+                "urgency": metrics["urgency"],
+                "vendorEmail": f"Please ship {metrics['recommended_quantity']} units of {item.name} & confirm."
+            })
+        by_vendor: Dict[str, List[Dict]] = {}
+        for decision in decisions:
+            by_vendor.setdefault(decision["vendor"], []).append(decision)
+        orders = [backend.vendor_order(lines) for lines in by_vendor.values()]
+        for order in orders:
+            if len(order["lines"]) > 1:
+                order["message"] = backend.EmailAutomation.order_message(order)
+
+        templates = backend.po_email_templates
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            for decision in decisions:
+                templates.render_item(decision, "bench@example.com")
+        per_item = (time.perf_counter() - started) / max(1, args.requests * len(decisions))
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            templates.render_batch(orders, "bench@example.com")
+        per_order = (time.perf_counter() - started) / max(1, args.requests * len(orders))
+        results.append({
+            "scenario": "render",
+            "size": size,
+            "decisions": len(decisions),
+            "vendorOrders": len(orders),
+            "usPerItemEmail": round(per_item * 1e6, 2),
+            "usPerVendorEmail": round(per_order * 1e6, 2),
+            "usPerOrderLine": round(per_order * len(orders) / max(1, len(decisions)) * 1e6, 2)
+        })
+        print(f"▶ render size={size:<7} {len(decisions)} item emails: {results[-1]['usPerItemEmail']} µs each, "
+              f"{len(orders)} vendor emails: {results[-1]['usPerVendorEmail']} µs each", flush=True)
+    return results
+
+
+def print_report(results: List[Dict]):
+    columns = [("scenario", 8), ("size", 7), ("ok", 5), ("errors", 6), ("p50Ms", 9), ("p95Ms", 9),
+               ("p99Ms", 9), ("throughputRps", 13), ("itemsPerSecond", 14), ("llmCalls", 8),
+               ("promptTokens", 12), ("completionTokens", 16), ("emails", 6), ("rssMb", 7), ("peakRssMb", 9)]
+    results = [result for result in results if result["scenario"] != "render"]
+    if not results:
+        return
+    print()
+    print(" ".join(name.rjust(width) for name, width in columns))
+    for result in results:
+        print(" ".join(str(result.get(name) if result.get(name) is not None else "-").rjust(width)
+                       for name, width in columns))
+    for result in results:
+        for error, count in result.get("errorSamples", {}).items():
+            print(f"  {result['scenario']} size={result['size']}: {count}× {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AUTONOMOS against a local mock LLM and Resend")
+    parser.add_argument("--scenarios", default="simple,crew,email",
+                        help="comma-separated: simple, crew, email, render (default: simple,crew,email)")
+    parser.add_argument("--sizes", default="10,100,1000", help="catalog sizes in SKUs (default: 10,100,1000)")
+    parser.add_argument("--requests", type=int, default=10, help="requests per scenario and size")
+    parser.add_argument("--concurrency", type=int, default=2, help="requests in flight at once")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed requests before each measurement")
+    parser.add_argument("--low-stock-ratio", type=float, default=0.2, help="share of SKUs below reorder point")
+    parser.add_argument("--batch", action="store_true", help="use batched multi-item prompts")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="upload each catalog once as a snapshot instead of sending it inline")
+    parser.add_argument("--cache", action="store_true", help="keep the decision cache on (off by default)")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="mock LLM response time")
+    parser.add_argument("--llm-jitter-ms", type=float, default=50, help="± random spread on the latency")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="share of LLM calls failing with 500")
+    parser.add_argument("--llm-429-rate", type=float, default=0.0, help="share of LLM calls rejected with 429")
+    parser.add_argument("--reasoning-tokens", type=int, default=40, help="approximate reasoning length per decision")
+    parser.add_argument("--email-latency-ms", type=float, default=80, help="mock Resend response time")
+    parser.add_argument("--llm-rpm", type=float, default=0,
+                        help="backend AUTONOMOS_LLM_RPM (default 0: no client-side rate limit)")
+    parser.add_argument("--crew-token-budget", type=int, default=6000)
+    parser.add_argument("--request-timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    args.sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    unknown = set(args.scenarios) - {"simple", "crew", "email", "render"}
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = render_benchmark(args) if "render" in args.scenarios else []
+    args.scenarios = [scenario for scenario in args.scenarios if scenario != "render"]
+    if args.scenarios:
+        results += run_load_benchmark(args)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"arguments": {k: v for k, v in vars(args).items() if k != "json"},
+                       "results": results}, output, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+def run_load_benchmark(args) -> List[Dict]:
+    settings = MockSettings(args.llm_latency_ms, args.llm_jitter_ms, args.llm_error_rate,
+                            args.llm_429_rate, args.reasoning_tokens, args.email_latency_ms, args.seed)
+    mock_port, backend_port = free_port(), free_port()
+    mock_server = start_mock_server(settings, mock_port)
+    print(f"Mock OpenAI/Resend on http://127.0.0.1:{mock_port}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        backend = start_backend(backend_port, f"http://127.0.0.1:{mock_port}", args, workdir)
+        print(f"Backend on http://127.0.0.1:{backend_port} (pid {backend.pid}), "
+              f"idle memory {process_memory_mb(backend.pid)['rssMb']} MB")
+        try:
+            results = asyncio.run(run_scenarios(args, f"http://127.0.0.1:{backend_port}", settings, backend.pid))
+        finally:
+            backend.terminate()
+            backend.wait(timeout=30)
+            mock_server.should_exit = True
+    return results
+
+
+if __name__ == "__main__":
+    main()
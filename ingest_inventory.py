@@ -0,0 +1,71 @@
+"""
+Upload an inventory export (CSV, Parquet or NDJSON) to the AUTONOMOS
+backend as a server-side snapshot, then optionally run an analysis on it.
+
+Usage:
+   python ingest_inventory.py inventory.csv
+   python ingest_inventory.py inventory.parquet --analyze
+
+The file is streamed to the server, so large catalogs are never loaded
+into memory or converted to a JSON request body on this side.
+"""
+
+import argparse
+import json
+import os
+
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+API_URL = os.getenv("AUTONOMOS_API_URL", "http://localhost:8000")
+
+FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson"
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest an inventory file into AUTONOMOS")
+    parser.add_argument("path", help="CSV, Parquet or NDJSON inventory file")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())),
+                        help="file format (default: from the file extension)")
+    parser.add_argument("--analyze", action="store_true",
+                        help="run /analyze/simple on the snapshot after ingesting")
+    parser.add_argument("--api-url", default=API_URL)
+    args = parser.parse_args()
+
+    file_format = args.format or FORMATS.get(os.path.splitext(args.path)[1].lower())
+    if file_format is None:
+        parser.error("cannot tell the file format from its extension; pass --format")
+
+    with open(args.path, "rb") as inventory_file:
+        response = requests.post(
+            f"{args.api_url}/inventory/snapshots",
+            params={"format": file_format},
+            data=inventory_file
+        )
+    response.raise_for_status()
+    snapshot = response.json()
+    print(f"✅ Ingested {snapshot['rows']} items ({snapshot['bytes']} bytes)")
+    print(f"Snapshot ID: {snapshot['snapshotId']}")
+
+    if args.analyze:
+        response = requests.post(f"{args.api_url}/analyze/simple", json={
+            "snapshot_id": snapshot["snapshotId"],
+            "openai_api_key": os.getenv("OPENAI_API_KEY", ""),
+            "resend_api_key": os.getenv("RESEND_API_KEY"),
+            "user_email": os.getenv("USER_EMAIL")
+        })
+        response.raise_for_status()
+        print(json.dumps(response.json(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
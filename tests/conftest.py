@@ -0,0 +1,65 @@
+"""Shared fixtures for the backend tests.
+
+No network access or API keys are needed: LLM clients are replaced with a
+fake that counts its calls, and the ledger and cache are off unless a test
+builds its own.
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+os.environ.setdefault("AUTONOMOS_LEDGER_PATH", "")
+os.environ.setdefault("AUTONOMOS_CACHE_BACKEND", "none")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import autonomos_backend as backend
+
+
+class FakeResponse:
+    def __init__(self, content: str):
+        self.content = content
+        self.usage_metadata = {"input_tokens": 100, "output_tokens": 20, "total_tokens": 120}
+
+
+class FakeLLM:
+    """Stands in for ChatOpenAI; every call approves after a short delay, or raises error"""
+
+    def __init__(self, delay: float = 0.05, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return FakeResponse(json.dumps({
+            "decision": "AUTO_APPROVE", "reasoning": "Routine reorder.", "vendorEmail": "Please ship."
+        }))
+
+
+def make_item(**fields) -> backend.InventoryItem:
+    values = dict(id=1, name="Coffee Beans", stock=5, reorderPoint=20, price=4.0, vendor="Acme",
+                  vendorEmail="orders@acme.test", lastOrder="2024-01-01", salesPerDay=2.0)
+    values.update(fields)
+    return backend.InventoryItem(**values)
+
+
+@pytest.fixture
+def fake_llms(monkeypatch):
+    """One FakeLLM per API key, created on first use; returns the key -> client dict"""
+    clients = {}
+    monkeypatch.setattr(backend.llm_client_pool, "get",
+                        lambda api_key, *args, **kwargs: clients.setdefault(api_key, FakeLLM()))
+    return clients
+
+
+@pytest.fixture
+def fake_llm(fake_llms):
+    """The FakeLLM used for the API key "test-key" """
+    return fake_llms.setdefault("test-key", FakeLLM())
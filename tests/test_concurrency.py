@@ -0,0 +1,119 @@
+"""Tests for the backend's in-process concurrency primitives.
+
+Run with ``python -m pytest tests``.
+"""
+
+import asyncio
+
+import autonomos_backend as backend
+from conftest import FakeLLM, make_item
+
+
+# ============================================================================
+# REQUEST COALESCING
+# ============================================================================
+
+def test_follower_survives_leader_cancellation():
+    async def scenario():
+        flight = backend.SingleFlight()
+        runs = []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert await follower == ("done", True)
+        assert leader.cancelled()
+        assert len(runs) == 1
+
+    asyncio.run(scenario())
+
+
+def test_work_is_cancelled_once_every_caller_has_gone():
+    async def scenario():
+        flight = backend.SingleFlight()
+        started, cancelled = asyncio.Event(), asyncio.Event()
+
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+        await started.wait()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+
+        # A later caller starts fresh work instead of joining the cancelled one
+        async def fresh():
+            return "fresh"
+        assert await flight.do("key", fresh) == ("fresh", False)
+        assert flight.stats()["inFlight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_caller():
+    async def scenario():
+        flight = backend.SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flight.stats() == {"inFlight": 0, "leaders": 1, "coalesced": 2}
+
+    asyncio.run(scenario())
+
+
+def test_coalesced_item_analyses_share_one_cache_miss_and_llm_call(fake_llm):
+    async def scenario():
+        cache = backend.DecisionCache(backend.InMemoryCacheBackend(100), ttl=3600)
+        agent = backend.InventoryAnalysisAgent("test-key", rules=None, cache=cache, large_model=None)
+        item = make_item()
+
+        decisions = await asyncio.gather(*(agent.aanalyze_item(item) for _ in range(5)))
+
+        assert fake_llm.calls == 1
+        assert cache.misses == 1
+        assert sum(bool(decision.get("coalesced")) for decision in decisions) == 4
+        assert {decision["decision"] for decision in decisions} == {"AUTO_APPROVE"}
+
+        # A first-time order is a different cache entry
+        await agent.aanalyze_item(make_item(lastOrder=""))
+        assert fake_llm.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_item_analyses_are_not_shared_across_api_keys(fake_llms):
+    async def scenario():
+        fake_llms["bad-key"] = FakeLLM(error=PermissionError("Incorrect API key provided"))
+        fake_llms["good-key"] = FakeLLM()
+        bad = backend.InventoryAnalysisAgent("bad-key", rules=None, cache=None, large_model=None)
+        good = backend.InventoryAnalysisAgent("good-key", rules=None, cache=None, large_model=None)
+        item = make_item()
+
+        failed, decided = await asyncio.gather(
+            backend.analyze_items_concurrently(bad, [item]),
+            backend.analyze_items_concurrently(good, [item])
+        )
+
+        assert failed[0]["decidedBy"] == "error"
+        assert decided[0]["decision"] == "AUTO_APPROVE" and "coalesced" not in decided[0]
+        assert fake_llms["bad-key"].calls >= 1 and fake_llms["good-key"].calls == 1
+
+    asyncio.run(scenario())
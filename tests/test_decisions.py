@@ -0,0 +1,93 @@
+"""Tests for how item decisions are reached: rules, crew and agent"""
+
+import asyncio
+import json
+
+import autonomos_backend as backend
+from conftest import FakeLLM, FakeResponse, make_item
+
+
+CREW_APPROVAL = {"decision": "AUTO_APPROVE", "reasoning": "Crew approved.", "vendorEmail": "Please ship."}
+
+
+def test_rules_take_precedence_over_the_crew(fake_llm):
+    async def scenario():
+        rules = backend.DecisionRules(auto_approve_limit=500, ambiguity_band=0.1)
+        agent = backend.InventoryAnalysisAgent("test-key", rules=rules, cache=None, large_model=None)
+        first_order = make_item(id=1, lastOrder="")
+        expensive = make_item(id=2, price=100.0)  # 60 units for $6000
+        near_limit = make_item(id=3, price=8.0)  # $480, inside the ambiguity band
+        uncovered = make_item(id=4, price=8.1)  # the crew left this one out
+
+        decisions = await backend.merge_crew_decisions(
+            agent, [first_order, expensive, near_limit, uncovered],
+            {item_id: CREW_APPROVAL for item_id in (1, 2, 3)}
+        )
+
+        assert [(d["decision"], d["decidedBy"]) for d in decisions] == [
+            ("ESCALATE", "rules"), ("ESCALATE", "rules"), ("AUTO_APPROVE", "crew"), ("AUTO_APPROVE", "llm")
+        ]
+        assert fake_llm.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_rules_settle_only_unambiguous_items():
+    rules = backend.DecisionRules(auto_approve_limit=500, ambiguity_band=0.1)
+
+    def decide(**fields):
+        item = make_item(**fields)
+        decision = rules.decide(item, backend.InventoryAnalysisAgent.compute_metrics(item))
+        return decision and decision["decision"]
+
+    # make_item orders 60 units (2/day for 30 days), with 2.5 days of stock (HIGH)
+    assert decide(price=7.0) == "AUTO_APPROVE"  # $420
+    assert decide(price=7.6) is None  # $456, inside the band below the limit
+    assert decide(price=9.1) is None  # $546, inside the band above it
+    assert decide(price=9.2) == "ESCALATE"  # $552
+    assert decide(lastOrder=" ") == "ESCALATE"  # first-time order
+    assert decide(stock=3) is None  # CRITICAL, deferred to the LLM
+    assert decide(salesPerDay=0.0) is None  # no sales history
+
+
+class ScriptedLLM(FakeLLM):
+    """Replies with the given strings in order"""
+
+    def __init__(self, replies: list):
+        super().__init__(delay=0)
+        self.replies = list(replies)
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        return FakeResponse(self.replies.pop(0))
+
+
+def reply(**fields) -> dict:
+    return {"decision": "AUTO_APPROVE", "reasoning": "Routine reorder.", "vendorEmail": "Please ship.", **fields}
+
+
+def test_items_left_out_of_a_batched_reply_are_retried_alone(fake_llms):
+    fake_llms["test-key"] = ScriptedLLM([
+        json.dumps({"decisions": [reply(ref=0), {"ref": 1, "decision": "MAYBE"}, reply(ref=2, decision="ESCALATE")]}),
+        json.dumps(reply(reasoning="Decided on its own."))
+    ])
+    agent = backend.InventoryAnalysisAgent("test-key", rules=None, cache=None, large_model=None)
+    items = [make_item(id=item_id) for item_id in (1, 2, 3)]
+
+    decisions = asyncio.run(backend.run_item_analysis(agent, items, batch=True))
+
+    assert [(d["itemId"], d["decision"]) for d in decisions] == [
+        (1, "AUTO_APPROVE"), (2, "AUTO_APPROVE"), (3, "ESCALATE")
+    ]
+    assert decisions[1]["reasoning"] == "Decided on its own."
+    assert fake_llms["test-key"].calls == 2
+
+
+def test_invalid_replies_are_sent_back_for_repair(fake_llms):
+    fake_llms["test-key"] = ScriptedLLM(["Sure! I would approve this.", json.dumps(reply())])
+    agent = backend.InventoryAnalysisAgent("test-key", rules=None, cache=None, large_model=None)
+
+    decision = asyncio.run(agent.aanalyze_item(make_item()))
+
+    assert (decision["decision"], decision["decidedBy"]) == ("AUTO_APPROVE", "llm")
+    assert fake_llms["test-key"].calls == 2
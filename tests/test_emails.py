@@ -0,0 +1,48 @@
+"""Tests for purchase order emails: vendor consolidation and template rendering"""
+
+import asyncio
+
+import autonomos_backend as backend
+
+
+def approval(item_id: int, vendor: str = "Acme", **fields) -> dict:
+    decision = {"itemId": item_id, "item": f"Item {item_id}", "vendor": vendor,
+                "vendorEmailAddress": f"orders@{vendor.lower()}.test", "decision": "AUTO_APPROVE",
+                "urgency": "MEDIUM", "quantity": 10, "cost": 40.0, "vendorEmail": "Please ship."}
+    decision.update(fields)
+    return decision
+
+
+def test_orders_are_consolidated_per_vendor():
+    decisions = [approval(1), approval(2, "Globex", urgency="HIGH"), approval(3, urgency="CRITICAL", cost=12.5)]
+
+    orders = asyncio.run(backend.consolidate_orders(decisions))
+
+    acme, globex = orders
+    assert [line["itemId"] for line in acme["lines"]] == [1, 3]
+    assert (acme["quantity"], acme["cost"], acme["urgency"]) == (20, 52.5, "CRITICAL")
+    assert "2 items" in acme["message"]
+    assert [line["itemId"] for line in globex["lines"]] == [2]
+    assert globex["message"] == "Please ship."
+
+
+def test_interpolated_values_are_escaped_for_their_context():
+    decision = approval(1, item="<script>alert(1)</script>", vendorEmail="Thanks & regards\nBuyer",
+                        vendor="Acme\r\nBcc: attacker@evil.test")
+
+    email = backend.po_email_templates.render_item(decision, "buyer@shop.test")
+
+    assert "<script>" not in email["html"] and "&lt;script&gt;alert(1)&lt;/script&gt;" in email["html"]
+    assert "Thanks &amp; regards<br>\nBuyer" in email["html"]
+    assert "\n" not in email["subject"] and "\r" not in email["subject"]
+    assert "Thanks & regards\nBuyer" in email["text"]
+
+
+def test_order_rows_are_escaped_once():
+    order = backend.vendor_order([approval(1, item="Nuts & Bolts"), approval(2, item="<Washers>")], "Ship soon.")
+
+    email = backend.po_email_templates.render_order(order, "buyer@shop.test")
+
+    assert "Nuts &amp; Bolts" in email["html"] and "&amp;amp;" not in email["html"]
+    assert "&lt;Washers&gt;" in email["html"]
+    assert "- Nuts & Bolts: 10 units, $40.00 (MEDIUM)" in email["text"]
@@ -0,0 +1,62 @@
+"""Tests for the background job queue behind /analyze/crew?mode=job"""
+
+import asyncio
+import threading
+
+import autonomos_backend as backend
+
+
+async def wait_for_status(jobs: backend.BackgroundJobQueue, job_id: str, status: str):
+    while jobs.status(job_id)["status"] != status:
+        await asyncio.sleep(0.01)
+    return jobs.status(job_id)
+
+
+def test_cancelling_jobs():
+    async def scenario():
+        jobs = backend.BackgroundJobQueue(workers=1, timeout=10)
+        started = asyncio.Event()
+        events = []
+
+        async def long_job(cancel_event: threading.Event):
+            events.append(cancel_event)
+            started.set()
+            await asyncio.sleep(10)
+
+        running = jobs.submit("test", long_job)
+        queued = jobs.submit("test", long_job)
+        await started.wait()
+
+        assert jobs.cancel(queued["jobId"])["status"] == "cancelled"
+        jobs.cancel(running["jobId"])
+        await wait_for_status(jobs, running["jobId"], "cancelled")
+
+        assert len(events) == 1 and events[0].is_set()
+        assert jobs.stats()["cancelled"] == 2
+        await jobs.stop()
+
+    asyncio.run(scenario())
+
+
+def test_job_timeout_sets_its_cancel_event():
+    async def scenario():
+        jobs = backend.BackgroundJobQueue(workers=1, timeout=0.05)
+        events = []
+
+        async def slow_job(cancel_event: threading.Event):
+            events.append(cancel_event)
+            await asyncio.sleep(10)
+
+        async def quick_job(cancel_event: threading.Event):
+            return {"ok": True}
+
+        slow = jobs.submit("test", slow_job)
+        quick = jobs.submit("test", quick_job)
+
+        status = await wait_for_status(jobs, slow["jobId"], "timed_out")
+        assert "0.05 seconds" in status["error"]
+        assert events[0].is_set()
+        assert (await wait_for_status(jobs, quick["jobId"], "succeeded"))["result"] == {"ok": True}
+        await jobs.stop()
+
+    asyncio.run(scenario())
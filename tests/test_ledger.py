@@ -0,0 +1,91 @@
+"""Tests for the procurement ledger and the reorder suppression built on it"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import autonomos_backend as backend
+from conftest import make_item
+
+
+def approval(item_id: int) -> dict:
+    return {"itemId": item_id, "item": f"Item {item_id}", "vendor": "Acme", "vendorEmailAddress": "orders@acme.test",
+            "decision": "AUTO_APPROVE", "decidedBy": "rules", "urgency": "HIGH", "quantity": 10, "cost": 40.0,
+            "vendorEmail": "Please ship."}
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    """A fresh ledger in place of the module's; PO emails are recorded as queued, not sent"""
+    ledger = backend.ProcurementLedger(str(tmp_path / "ledger.sqlite3"))
+    monkeypatch.setattr(backend, "procurement_ledger", ledger)
+    monkeypatch.setattr(backend.email_queue, "submit_orders", lambda orders, user_email, api_key: [
+        {"idempotencyKey": f"email-{order['lines'][0]['itemId']}", "status": "queued"} for order in orders
+    ])
+    return ledger
+
+
+def place(decisions: list, tenant: str) -> list:
+    asyncio.run(backend.place_orders(decisions, tenant, "buyer@shop.test", None, "test"))
+    return decisions
+
+
+def test_open_orders_suppress_reorders_of_the_same_tenant_only(ledger):
+    [first] = place([approval(1)], "tenant-a")
+    assert first["decisionId"] and first["purchaseOrderId"]
+
+    [again] = place([approval(1)], "tenant-a")
+    assert again["reorderSuppressed"]
+    assert again["openPurchaseOrder"]["purchaseOrderId"] == first["purchaseOrderId"]
+    assert "purchaseOrderId" not in again
+
+    [other] = place([approval(1)], "tenant-b")
+    assert "reorderSuppressed" not in other and other["purchaseOrderId"] != first["purchaseOrderId"]
+
+    assert len(ledger.list_decisions("tenant-a")["decisions"]) == 2
+    assert len(ledger.list_orders("tenant-a")["orders"]) == 1
+
+
+def test_failed_emails_do_not_suppress_reorders(ledger):
+    [first] = place([approval(1)], "tenant-a")
+    ledger.update_email_status([("email-1", "failed", None)])
+
+    [again] = place([approval(1)], "tenant-a")
+    assert "reorderSuppressed" not in again and again["purchaseOrderId"] != first["purchaseOrderId"]
+
+
+def test_restocked_items_close_their_orders_and_reorders_point_at_them(ledger):
+    [first, still_low] = place([approval(1), approval(2)], "tenant-a")
+
+    asyncio.run(backend.receive_restocked("tenant-a", [make_item(id=1, stock=50), make_item(id=2, stock=5)]))
+    assert ledger.get_order("tenant-a", first["purchaseOrderId"])["status"] == "received"
+    assert ledger.get_order("tenant-a", still_low["purchaseOrderId"])["status"] == "open"
+
+    [reorder, suppressed] = place([approval(1), approval(2)], "tenant-a")
+    assert reorder["reorderOf"] == first["purchaseOrderId"] and "reorderSuppressed" not in reorder
+    assert suppressed["reorderSuppressed"]
+
+
+def test_streamed_decisions_are_recorded_in_one_batch_off_the_event_loop(ledger, fake_llm, monkeypatch):
+    batches = []
+    record = ledger.record_decisions
+
+    def recording(tenant, decisions, source):
+        batches.append((threading.current_thread().name, len(decisions), source))
+        record(tenant, decisions, source)
+
+    monkeypatch.setattr(ledger, "record_decisions", recording)
+    inventory = [make_item(id=item_id).dict() for item_id in range(1, 4)]
+
+    response = TestClient(backend.app).post(
+        "/analyze/stream", json={"inventory": inventory, "openai_api_key": "test-key"}
+    )
+
+    assert response.status_code == 200
+    assert [json.loads(line)["type"] for line in response.text.splitlines()].count("decision") == 3
+    assert len(batches) == 1
+    thread_name, count, source = batches[0]
+    assert thread_name.startswith("autonomos-ledger") and (count, source) == (3, "stream")
@@ -0,0 +1,83 @@
+"""Tests for the per-API-key rate limiter and the LLM rate governor"""
+
+import asyncio
+import time
+
+import autonomos_backend as backend
+from conftest import FakeLLM, FakeResponse, make_item
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_limiter_grants_flows_in_turn():
+    limiter = backend.TenantRateLimiter(rpm=600, tpm=0)
+    limiter._join("batch")
+    limiter._join("small")
+
+    assert limiter._try_acquire("batch", 0) == 0.0
+    # The batch flow is ahead, so it waits until the small one has had a turn
+    assert limiter._try_acquire("batch", 0) == limiter.POLL_SECONDS
+    assert limiter._try_acquire("small", 0) == 0.0
+    assert limiter._try_acquire("batch", 0) == 0.0
+
+
+def test_limiter_pauses_and_slows_down_after_a_429():
+    limiter = backend.TenantRateLimiter(rpm=600, tpm=0)
+    limiter._join("flow")
+
+    limiter.rate_limited(0.5)
+    assert limiter._try_acquire("flow", 0) > 0.4
+    assert limiter.scale < 1.0
+
+    scale = limiter.scale
+    limiter.succeeded(0, None)
+    assert limiter.scale > scale
+
+
+def test_governor_retries_transient_errors_but_not_client_errors():
+    async def scenario():
+        governor = backend.LLMRateGovernor(rpm=600, tpm=0, max_retries=3, max_tenants=10)
+        outcomes = [StatusError(503), ConnectionResetError(), FakeResponse("{}")]
+
+        async def flaky():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        assert (await governor.call("key", 10, flaky)).content == "{}"
+        assert outcomes == []
+
+        calls = []
+
+        async def rejected():
+            calls.append(1)
+            raise StatusError(400)
+
+        try:
+            await governor.call("key", 10, rejected)
+        except StatusError:
+            pass
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+
+
+def test_item_timeout_is_not_retried(fake_llms):
+    async def scenario():
+        fake_llms["slow-key"] = FakeLLM(delay=10)
+        agent = backend.InventoryAnalysisAgent("slow-key", rules=None, cache=None, large_model=None)
+
+        started = time.monotonic()
+        decision, = await backend.analyze_items_concurrently(agent, [make_item()], timeout=0.2)
+
+        assert time.monotonic() - started < 1.0
+        assert decision["decidedBy"] == "timeout"
+        assert "0.2 seconds" in decision["reasoning"]
+        assert fake_llms["slow-key"].calls == 1
+
+    asyncio.run(scenario())
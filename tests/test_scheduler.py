@@ -0,0 +1,77 @@
+"""Tests for periodic reorder checks of inventory snapshots"""
+
+import asyncio
+
+import autonomos_backend as backend
+from conftest import make_item
+
+
+def make_scheduler() -> backend.ReorderScheduler:
+    return backend.ReorderScheduler(interval=60, min_interval=0, multipliers=[1, 2, 4, 8], jitter=0, max_concurrent=2)
+
+
+def test_scheduler_skips_runs_that_would_overlap(monkeypatch):
+    async def scenario():
+        scheduler = make_scheduler()
+        release = asyncio.Event()
+        checks = []
+
+        async def slow_check(schedule, snapshot, tiers):
+            checks.append(tiers)
+            await release.wait()
+            return {"lowStock": 0, "analyzed": 0, "autoApproved": 0, "ordered": 0, "suppressed": 0}
+
+        monkeypatch.setattr(scheduler, "check", slow_check)
+        snapshot = backend.inventory_snapshots.add(backend.inventory_frame([make_item()]), "test")
+        try:
+            schedule = scheduler.create(backend.ScheduleRequest(
+                snapshot_id=snapshot["snapshotId"], openai_api_key="test-key"
+            ))
+            while not checks:
+                await asyncio.sleep(0.01)
+
+            scheduler.run_now(schedule["scheduleId"], schedule["tenant"])
+            while scheduler.stats()["skippedOverlaps"] == 0:
+                await asyncio.sleep(0.01)
+            assert len(checks) == 1
+
+            release.set()
+            while scheduler.status(schedule["scheduleId"], schedule["tenant"])["running"]:
+                await asyncio.sleep(0.01)
+            assert scheduler.status(schedule["scheduleId"], schedule["tenant"])["runs"] == 1
+        finally:
+            await scheduler.stop()
+            backend.inventory_snapshots.delete(snapshot["snapshotId"])
+
+    asyncio.run(scenario())
+
+
+def test_schedules_are_visible_only_to_their_tenant(monkeypatch):
+    async def scenario():
+        scheduler = make_scheduler()
+
+        async def quick_check(schedule, snapshot, tiers):
+            return {"lowStock": 0, "analyzed": 0, "autoApproved": 0, "ordered": 0, "suppressed": 0}
+
+        monkeypatch.setattr(scheduler, "check", quick_check)
+        snapshot = backend.inventory_snapshots.add(backend.inventory_frame([make_item()]), "test")
+        try:
+            schedule = scheduler.create(backend.ScheduleRequest(
+                snapshot_id=snapshot["snapshotId"], openai_api_key="owner-key"
+            ))
+            owner, other = backend.key_fingerprint("owner-key"), backend.key_fingerprint("other-key")
+            schedule_id = schedule["scheduleId"]
+
+            assert [s["scheduleId"] for s in scheduler.list(owner)] == [schedule_id]
+            assert scheduler.list(other) == []
+            assert scheduler.status(schedule_id, other) is None
+            assert scheduler.run_now(schedule_id, other) is None
+            assert not scheduler.delete(schedule_id, other)
+
+            assert scheduler.status(schedule_id, owner)["snapshotId"] == snapshot["snapshotId"]
+            assert scheduler.delete(schedule_id, owner)
+        finally:
+            await scheduler.stop()
+            backend.inventory_snapshots.delete(snapshot["snapshotId"])
+
+    asyncio.run(scenario())
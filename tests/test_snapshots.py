@@ -0,0 +1,79 @@
+"""Tests for server-side inventory snapshots and delta re-analysis"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import autonomos_backend as backend
+from conftest import make_item
+
+
+def delta_request(*updates: dict) -> backend.DeltaRequest:
+    return backend.DeltaRequest(updates=[backend.InventoryDelta(**update) for update in updates],
+                                openai_api_key="test-key")
+
+
+def test_deltas_reanalyze_only_changed_low_stock_items(fake_llm):
+    async def scenario():
+        items = [make_item(id=1), make_item(id=2, stock=50), make_item(id=3), make_item(id=4), make_item(id=6)]
+        snapshot = backend.inventory_snapshots.get(
+            backend.inventory_snapshots.add(backend.inventory_frame(items), "test")["snapshotId"]
+        )
+        try:
+            baseline = await backend.analyze_snapshot_deltas(
+                snapshot, delta_request(*({"id": item_id, "stock": 5} for item_id in (1, 3, 4, 6)))
+            )
+            assert sorted(d["itemId"] for d in baseline["added"]) == [1, 3, 4, 6]
+
+            diff = await backend.analyze_snapshot_deltas(snapshot, delta_request(
+                {"id": 1, "stock": 5},  # no change
+                {"id": 2, "stock": 3},  # now below its reorder point
+                {"id": 3, "stock": 100},  # restocked
+                {"id": 4, "remove": True},
+                {**make_item(id=5).dict(), "stock": 1},  # new item
+                {"id": 6, "salesPerDay": 3.0}  # larger order
+            ))
+
+            assert diff["analyzed"] == 3
+            assert sorted(d["itemId"] for d in diff["added"]) == [2, 5]
+            assert [(c["before"]["quantity"], c["after"]["quantity"]) for c in diff["changed"]] == [(60, 90)]
+            assert sorted(r["itemId"] for r in diff["resolved"]) == [3, 4]
+            assert diff["unchanged"] == 1
+            assert diff["rows"] == 5
+            assert sorted(snapshot["decisions"]) == [1, 2, 5, 6]
+        finally:
+            backend.inventory_snapshots.delete(snapshot["snapshotId"])
+
+    asyncio.run(scenario())
+
+
+def test_bad_additions_leave_the_snapshot_unchanged():
+    snapshot = backend.inventory_snapshots.get(
+        backend.inventory_snapshots.add(backend.inventory_frame([make_item()]), "test")["snapshotId"]
+    )
+    try:
+        with pytest.raises(backend.HTTPException) as raised:
+            backend.inventory_snapshots.apply_deltas(snapshot, delta_request(
+                {"id": 1, "stock": 0}, {"id": 2, "stock": 3}  # item 2 has no name, price, ...
+            ).updates)
+        assert raised.value.status_code == 400
+        assert snapshot["rows"] == 1
+        assert int(snapshot["frame"].loc[0, "stock"]) == 5
+    finally:
+        backend.inventory_snapshots.delete(snapshot["snapshotId"])
+
+
+def test_ingest_rejects_duplicate_item_ids(tmp_path):
+    rows = [make_item(id=item_id).dict() for item_id in (1, 2, 2, 3, 3)]
+    body = "\n".join([",".join(rows[0])] + [",".join(str(value) for value in row.values()) for row in rows])
+    path = tmp_path / "inventory.csv"
+    path.write_text(body)
+
+    with pytest.raises(ValueError, match="2 duplicate item ids: 2, 3"):
+        backend.load_inventory_file(str(path), "csv")
+
+    before = len(backend.inventory_snapshots.list())
+    response = TestClient(backend.app).post("/inventory/snapshots?format=csv", content=body)
+    assert response.status_code == 400
+    assert len(backend.inventory_snapshots.list()) == before
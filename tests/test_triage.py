@@ -0,0 +1,46 @@
+"""Tests for low-stock triage: the vectorized path must match the per-item one"""
+
+import random
+
+import autonomos_backend as backend
+from conftest import make_item
+
+
+def random_inventory(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    return [
+        make_item(id=item_id, stock=rng.randint(0, 40), reorderPoint=rng.randint(0, 30),
+                  price=round(rng.uniform(0.5, 50), 2), salesPerDay=rng.choice([0.0, 0.5, 1.0, 2.5, 4.0, 7.3]))
+        for item_id in range(1, count + 1)
+    ]
+
+
+def priority(item: backend.InventoryItem) -> tuple:
+    metrics = backend.InventoryAnalysisAgent.compute_metrics(item)
+    return backend.URGENCY_LEVELS.index(metrics["urgency"]), metrics["days_until_stockout"]
+
+
+def test_vectorized_triage_matches_per_item_metrics():
+    inventory = random_inventory(300)
+
+    expected = backend.build_worklist(inventory)  # below TRIAGE_VECTORIZE_MIN: plain Python
+    worklist = backend.triage_inventory(inventory)
+
+    assert [item.id for item in expected] == worklist["id"].tolist()
+    for item, row in zip(expected, worklist.to_dict("records")):
+        metrics = backend.InventoryAnalysisAgent.compute_metrics(item)
+        assert row["daysUntilStockout"] == metrics["days_until_stockout"]
+        assert row["recommendedQuantity"] == metrics["recommended_quantity"]
+        assert abs(row["totalCost"] - metrics["total_cost"]) < 1e-9
+        assert row["urgency"] == metrics["urgency"]
+
+
+def test_frames_and_large_lists_yield_the_same_worklist():
+    inventory = random_inventory(backend.TRIAGE_VECTORIZE_MIN + 50)
+    expected = sorted(backend.get_low_stock_items(inventory), key=priority)
+
+    from_list = backend.build_worklist(inventory)
+    from_frame = backend.build_worklist(backend.inventory_frame(inventory))
+
+    assert from_list == expected
+    assert from_frame == expected